@@ -0,0 +1,37 @@
+"""
+Memindahkan baris trx_pertanyaan lama ke tabel arsip bulanan (lihat src/db/audit_retention.py).
+
+Jalankan terjadwal (mis. harian):
+    python scripts/archive_audit.py
+    python scripts/archive_audit.py --months 12 --dry-run
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db.audit_retention import AUDIT_ARCHIVE_BATCH, AUDIT_RETENTION_MONTHS, archive_old_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retensi trx_pertanyaan ke tabel arsip per bulan.")
+    parser.add_argument("--months", type=int, default=AUDIT_RETENTION_MONTHS,
+                        help="Jumlah bulan penuh yang tetap di tabel utama (selain bulan berjalan)")
+    parser.add_argument("--batch-size", type=int, default=AUDIT_ARCHIVE_BATCH, help="Baris per transaksi")
+    parser.add_argument("--dry-run", action="store_true", help="Hanya hitung baris yang akan dipindahkan")
+    parser.add_argument("--url", help="SQLAlchemy URL (default: DATABASE_URL / DB_*)")
+    args = parser.parse_args()
+
+    engine = None
+    if args.url:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.url)
+
+    summary = archive_old_rows(args.months, engine, batch_size=args.batch_size, dry_run=args.dry_run)
+    print(json.dumps(summary, ensure_ascii=False, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
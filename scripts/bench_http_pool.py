@@ -0,0 +1,131 @@
+"""
+Benchmark koneksi HTTP ke OpenRouter: client baru per panggilan vs HTTP client bersama.
+
+Menjalankan stub server lokal (respons chat completion ala OpenAI) lalu mengirim
+N request untuk tiap skenario, mencatat waktu total dan jumlah koneksi TCP yang dibuka.
+
+    python scripts/bench_http_pool.py --requests 300 --latency-ms 5
+    python scripts/bench_http_pool.py --fail-every 10   # uji retry 429
+    python scripts/bench_http_pool.py --langchain       # lewat create_openrouter_llm
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubState:
+    def __init__(self, latency_ms: float, fail_every: int):
+        self.latency = latency_ms / 1000
+        self.fail_every = fail_every
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def setup(self):
+            super().setup()
+            # Header dan body ditulis terpisah; tanpa NODELAY, Nagle + delayed ACK menambah ~40 ms
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with state.lock:
+                state.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with state.lock:
+                state.requests += 1
+                fail = state.fail_every and state.requests % state.fail_every == 0
+            time.sleep(state.latency)
+
+            if fail:
+                body = b'{"error": {"message": "rate limited"}}'
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+            else:
+                body = json.dumps({
+                    "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": "stub",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "SELECT SUM(Jumlah) FROM drauk_unit"}}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 8, "total_tokens": 18},
+                }).encode()
+                self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def run_scenario(name: str, state: StubState, n: int, call):
+    state.connections = state.requests = 0
+    start = time.perf_counter()
+    for _ in range(n):
+        call()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed * 1000:>9.0f} ms  {n / elapsed:>8.1f} req/s  "
+          f"{state.connections:>5} koneksi TCP  {state.requests:>5} request diterima")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTTP client bersama untuk OpenRouter.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Latensi buatan stub server")
+    parser.add_argument("--fail-every", type=int, default=0, help="Balas 429 setiap N request")
+    parser.add_argument("--langchain", action="store_true", help="Benchmark lewat ChatOpenAI/create_openrouter_llm")
+    args = parser.parse_args()
+
+    state = StubState(args.latency_ms, args.fail_every)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "halo"}]}
+
+    os.environ["BASE_URL_OPEN_ROUTER"] = base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub-key")
+    os.environ.setdefault("OPENROUTER_HTTP_BACKOFF_BASE", "0.01")
+
+    import httpx
+    from src.utils.http_client import build_http_client
+
+    print(f"Stub server: {base_url}  ({args.requests} request per skenario)\n")
+
+    def fresh_client_call():
+        with httpx.Client(timeout=10) as client:
+            client.post(f"{base_url}/chat/completions", json=payload)
+
+    shared = build_http_client()
+
+    def shared_client_call():
+        shared.post(f"{base_url}/chat/completions", json=payload)
+
+    run_scenario("client baru per panggilan", state, args.requests, fresh_client_call)
+    run_scenario("HTTP client bersama", state, args.requests, shared_client_call)
+
+    if args.langchain:
+        from langchain_openai import ChatOpenAI
+        from src.services.openrouter_service import create_openrouter_llm
+
+        run_scenario("ChatOpenAI baru per stage", state, args.requests,
+                     lambda: ChatOpenAI(model="stub", base_url=base_url, api_key="stub-key", max_retries=0).invoke("halo"))
+        run_scenario("create_openrouter_llm", state, args.requests,
+                     lambda: create_openrouter_llm("stub").invoke("halo"))
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Benchmark search skema dua tahap (tabel lalu kolom, filter payload) per jenis client Qdrant:
+client sync REST (jalur lama lewat LangChain) vs client async bersama per worker (src/db/config_qdrant.py)
+lewat REST dan gRPC, dengan HNSW ef tetap.
+
+Koleksi sintetis dibuat dengan struktur yang sama dengan scripts/ingest_schema.py (point kind=table dan kind=column
+dengan metadata.table). Diukur: latensi query pertama pada client baru (tanpa warmup), p50/p95 setelah warmup,
+throughput dengan beberapa thread request, dan recall tahap kolom terhadap exact search.
+
+    python scripts/bench_qdrant_clients.py                          # mode in-memory qdrant-client (tanpa server)
+    python scripts/bench_qdrant_clients.py --url http://localhost:6333 --grpc-port 6334 --tables 500
+
+Mode in-memory tidak memakai transport (REST/gRPC) maupun HNSW (selalu exact), jadi hanya mengukur overhead client
+sync vs async dan filter payload; perbandingan transport dan ef butuh server Qdrant (mis. docker qdrant/qdrant).
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Paket src.db membuat engine saat diimpor; benchmark ini tidak memakai database
+_empty_db = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='qdrant-bench-'), 'empty.db')}"
+os.environ.setdefault("DATABASE_URL", _empty_db)
+os.environ.setdefault("READONLY_DATABASE_URL", _empty_db)
+
+from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
+
+from src.db.config_qdrant import QDRANT_METADATA_KEY, QDRANT_SEARCH_EF, AsyncQdrantRunner, payload_filter
+
+TABLES_K = 3
+COLUMNS_PER_TABLE = 15
+
+
+class SyncSearcher:
+    def __init__(self, name: str, ef: int, **client_kwargs):
+        self.name, self.ef = name, ef
+        self.client = QdrantClient(**client_kwargs)
+
+    def call(self, method: str, **kwargs):
+        return getattr(self.client, method)(**kwargs)
+
+    def search(self, collection, vector, limit, must, exact=False):
+        params = rest.SearchParams(exact=True) if exact else (rest.SearchParams(hnsw_ef=self.ef) if self.ef > 0 else None)
+        return self.client.query_points(collection_name=collection, query=vector, query_filter=payload_filter(must),
+                                        search_params=params, limit=limit, with_payload=True).points
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncSearcher:
+    def __init__(self, name: str, ef: int, **client_kwargs):
+        self.name, self.ef = name, ef
+        self.runner = AsyncQdrantRunner(**client_kwargs)
+
+    def call(self, method: str, **kwargs):
+        return self.runner.run(getattr(self.runner.client, method)(**kwargs), timeout=None)
+
+    def search(self, collection, vector, limit, must, exact=False):
+        if exact:
+            return self.runner.run(self.runner.client.query_points(
+                collection_name=collection, query=vector, query_filter=payload_filter(must),
+                search_params=rest.SearchParams(exact=True), limit=limit, with_payload=True), timeout=None).points
+        return self.runner.search(collection, vector, limit, must, ef=self.ef, timeout=None)
+
+    def close(self):
+        self.runner.close()
+
+
+def unit_vectors(rng, count: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def populate(searcher, collection: str, tables: int, columns: int, dim: int, seed: int, server: bool):
+    if searcher.call("collection_exists", collection_name=collection):
+        searcher.call("delete_collection", collection_name=collection)
+    searcher.call("create_collection", collection_name=collection,
+                  vectors_config=rest.VectorParams(size=dim, distance=rest.Distance.COSINE))
+    if server:
+        for field in ("kind", "table"):
+            searcher.call("create_payload_index", collection_name=collection, field_name=f"{QDRANT_METADATA_KEY}.{field}",
+                          field_schema=rest.PayloadSchemaType.KEYWORD)
+
+    rng = np.random.default_rng(seed)
+    points = []
+    for t in range(tables):
+        table = f"tabel_{t:04d}"
+        vectors = unit_vectors(rng, columns + 1, dim)
+        points.append(rest.PointStruct(id=len(points), vector=vectors[0].tolist(),
+                                       payload={QDRANT_METADATA_KEY: {"kind": "table", "table": table}}))
+        for c in range(columns):
+            points.append(rest.PointStruct(id=len(points), vector=vectors[c + 1].tolist(),
+                                           payload={QDRANT_METADATA_KEY: {"kind": "column", "table": table,
+                                                                          "column": f"Kolom_{c}"}}))
+    for start in range(0, len(points), 256):
+        searcher.call("upsert", collection_name=collection, points=points[start:start + 256], wait=True)
+    return len(points)
+
+
+def two_stage(searcher, collection: str, vector):
+    hits = searcher.search(collection, vector, TABLES_K, {"kind": "table"})
+    tables = [point.payload[QDRANT_METADATA_KEY]["table"] for point in hits]
+    return searcher.search(collection, vector, COLUMNS_PER_TABLE * len(tables), {"kind": "column", "table": tables})
+
+
+def column_recall(searcher, collection: str, queries) -> float:
+    """Recall tahap kolom (filter kind=column saja, limit besar) dengan ef terhadap exact search."""
+    found = total = 0
+    limit = TABLES_K * COLUMNS_PER_TABLE
+    for vector in queries:
+        expected = {p.id for p in searcher.search(collection, vector, limit, {"kind": "column"}, exact=True)}
+        got = {p.id for p in searcher.search(collection, vector, limit, {"kind": "column"})}
+        found += len(expected & got)
+        total += len(expected)
+    return found / total if total else 1.0
+
+
+def measure(searcher, collection: str, queries, requests: int, threads: int):
+    start = time.perf_counter()
+    two_stage(searcher, collection, queries[0])  # query pertama pada client baru (tanpa warmup)
+    cold_ms = (time.perf_counter() - start) * 1000
+    for vector in queries[1:6]:
+        two_stage(searcher, collection, vector)
+
+    timings = []
+    for i in range(requests):
+        start = time.perf_counter()
+        two_stage(searcher, collection, queries[i % len(queries)])
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: two_stage(searcher, collection, queries[i % len(queries)]), range(requests)))
+    qps = requests / (time.perf_counter() - start)
+    return cold_ms, statistics.median(timings), timings[int(len(timings) * 0.95) - 1], qps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark client Qdrant sync REST vs async REST/gRPC.")
+    parser.add_argument("--url", help="URL REST server Qdrant (default: mode in-memory)")
+    parser.add_argument("--grpc-port", type=int, default=6334)
+    parser.add_argument("--api-key", default=os.getenv("QDRANT_API_KEY"))
+    parser.add_argument("--tables", type=int, default=300)
+    parser.add_argument("--columns", type=int, default=20, help="Kolom per tabel")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--ef", type=int, default=QDRANT_SEARCH_EF, help="HNSW ef client async (0 = default koleksi)")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    collection = f"bench_schema_{uuid.uuid4().hex[:8]}"
+    if args.url:
+        common = {"url": args.url, "api_key": args.api_key, "grpc_port": args.grpc_port}
+        variants = [
+            (SyncSearcher, "sync REST (jalur lama)", 0, {**common, "prefer_grpc": False}),
+            (SyncSearcher, f"sync gRPC, ef={args.ef}", args.ef, {**common, "prefer_grpc": True}),
+            (AsyncSearcher, f"async REST, ef={args.ef}", args.ef, {**common, "prefer_grpc": False}),
+            (AsyncSearcher, f"async gRPC, ef={args.ef}", args.ef, {**common, "prefer_grpc": True}),
+        ]
+    else:
+        variants = [
+            (SyncSearcher, "sync in-memory", 0, {"location": ":memory:"}),
+            (AsyncSearcher, "async in-memory", 0, {"location": ":memory:"}),
+        ]
+
+    queries = [v.tolist() for v in unit_vectors(np.random.default_rng(1), 200, args.dim)]
+    print(f"{args.tables} tabel x {args.columns} kolom, dim {args.dim}, {args.requests} request, {args.threads} thread")
+    print(f"{'client':<26} {'cold ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'qps':>8} {'recall':>7}")
+    populated = False
+    for factory, name, ef, kwargs in variants:
+        searcher = factory(name, ef, **kwargs)
+        try:
+            if not populated:
+                points = populate(searcher, collection, args.tables, args.columns, args.dim, 7, server=bool(args.url))
+                # Server: satu koleksi dipakai semua client; in-memory: setiap client punya storage sendiri
+                populated = bool(args.url)
+                if args.url:
+                    print(f"Koleksi {collection}: {points} point")
+                    # Client baru agar query pertama tidak diuntungkan koneksi yang dibuka saat populate
+                    searcher.close()
+                    searcher = factory(name, ef, **kwargs)
+            cold_ms, p50, p95, qps = measure(searcher, collection, queries, args.requests, args.threads)
+            recall = column_recall(searcher, collection, queries[:30])
+            print(f"{name:<26} {cold_ms:>8.1f} {p50:>8.2f} {p95:>8.2f} {qps:>8.0f} {recall:>7.3f}")
+            if not args.url:
+                searcher.call("delete_collection", collection_name=collection)
+        finally:
+            searcher.close()
+
+    if args.url:
+        cleanup = SyncSearcher("cleanup", 0, url=args.url, api_key=args.api_key)
+        cleanup.call("delete_collection", collection_name=collection)
+        cleanup.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark retrieval skema dua tahap (src/search/table_index.py) saat jumlah tabel bertambah.
+
+Skema diperbesar dengan tabel anggaran sintetis (jenis anggaran x unit) di samping tabel asli dari
+schema_description.yml. Untuk setiap ukuran diukur: waktu build index, latensi pilih tabel + urutkan kolom,
+ukuran prompt (whitelist + konteks skema, perkiraan token = karakter / 4), dan apakah tabel yang dimaksud
+pertanyaan ikut terpilih. Exit code 1 jika ada pertanyaan yang tabelnya tidak terpilih.
+
+    python scripts/bench_schema_retrieval.py
+    python scripts/bench_schema_retrieval.py --sizes 10,100,500,1000 --repeat 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.search.table_index import SCHEMA_COLUMNS_PER_TABLE, SCHEMA_TABLES_K, SchemaTableIndex, format_joins
+from src.utils.schema_spec import load_schema_spec
+
+KINDS = [
+    ("pendapatan", "Penerimaan", ["penerimaan", "income"]),
+    ("hibah", "Hibah", ["bantuan", "donasi"]),
+    ("beasiswa", "Beasiswa", ["bantuan studi", "scholarship"]),
+    ("penelitian", "Dana_Penelitian", ["riset", "research"]),
+    ("pengabdian", "Dana_Pengabdian", ["abdimas", "pengabdian masyarakat"]),
+    ("aset", "Nilai_Aset", ["inventaris", "barang milik negara"]),
+    ("piutang", "Piutang", ["tagihan", "receivable"]),
+    ("utang", "Kewajiban", ["hutang", "liabilitas"]),
+    ("pajak", "Pajak", ["PPh", "PPN"]),
+    ("investasi", "Investasi", ["penyertaan modal", "deposito"]),
+    ("kontrak", "Nilai_Kontrak", ["perjanjian", "SPK"]),
+    ("honorarium", "Honor", ["honor", "insentif"]),
+    ("listrik", "Biaya_Listrik", ["PLN", "daya"]),
+    ("gaji", "Gaji_Pokok", ["penghasilan", "payroll"]),
+    ("pemeliharaan", "Biaya_Pemeliharaan", ["perawatan", "perbaikan"]),
+    ("perjalanan", "Biaya_Perjalanan", ["dinas luar", "SPPD"]),
+    ("konsumsi", "Biaya_Konsumsi", ["makan minum", "katering"]),
+    ("sewa", "Biaya_Sewa", ["rental", "kontrak sewa"]),
+    ("publikasi", "Biaya_Publikasi", ["jurnal", "artikel"]),
+    ("akreditasi", "Biaya_Akreditasi", ["BAN-PT", "sertifikasi"]),
+]
+UNITS = [
+    "fakultas", "prodi", "rumahsakit", "asrama", "perpustakaan", "laboratorium", "rektorat", "pascasarjana",
+    "klinik", "museum", "kebun", "koperasi", "poliklinik", "stadion", "auditorium", "percetakan", "bengkel",
+    "observatorium", "pesantren", "kantin", "gudang", "masjid", "galeri", "herbarium", "inkubator",
+]
+
+
+def synthetic_table(kind: str, measure: str, synonyms, unit: str, variant: int) -> dict:
+    suffix = f" (wilayah {variant})" if variant else ""
+    return {
+        "description": f"Data anggaran {kind} untuk setiap {unit}{suffix}, per tahun anggaran.",
+        "business_rules": [f"Kolom `{measure}` adalah nilai utama {kind}."],
+        "common_questions": [{"question": f"Berapa total {kind} {unit} tahun ini?"}],
+        "columns": [
+            {"name": "Tahun_Anggaran", "data_type": "int(11)", "description": "Tahun fiskal.", "synonyms": ["tahun"]},
+            {"name": "Kode_Unit", "data_type": "varchar(50)", "description": "Kode unit kerja.", "synonyms": ["kode unit"]},
+            {"name": f"Nama_{unit.title()}", "data_type": "varchar(255)", "description": f"Nama {unit}.",
+             "synonyms": [unit]},
+            {"name": measure, "data_type": "decimal(18,2)", "description": f"Nilai {kind}.", "synonyms": list(synonyms)},
+            {"name": f"Target_{measure}", "data_type": "decimal(18,2)", "description": f"Target {kind}.",
+             "synonyms": ["target", "rencana"]},
+            {"name": "Keterangan", "data_type": "text", "description": "Catatan tambahan.", "synonyms": ["catatan"]},
+        ],
+        "joins": [{"table": "drauk_unit", "on": f"{kind}_{unit}.Kode_Unit = drauk_unit.Kode_Unit",
+                   "description": "Unit kerja pemilik anggaran."}] if not variant else [],
+    }
+
+
+def build_spec(size: int) -> dict:
+    spec = dict(load_schema_spec())
+    variant = 0
+    while len(spec) < size:
+        for kind, measure, synonyms in KINDS:
+            for unit in UNITS:
+                if len(spec) >= size:
+                    break
+                name = f"{kind}_{unit}" + (f"_w{variant}" if variant else "")
+                spec[name] = synthetic_table(kind, measure, synonyms, unit, variant)
+        variant += 1
+    return spec
+
+
+# (pertanyaan, tabel yang harus terpilih)
+QUESTIONS = [
+    ("Berapa total pagu anggaran per unit tahun 2024?", "drauk_unit"),
+    ("Realisasi dan sisa anggaran program strategis", "drauk_unit"),
+    ("berapa total hibah fakultas tahun 2023", "hibah_fakultas"),
+    ("total beasiswa untuk prodi", "beasiswa_prodi"),
+    ("dana riset di laboratorium tahun 2024", "penelitian_laboratorium"),
+    ("honorarium pegawai rektorat", "honorarium_rektorat"),
+]
+
+
+def prompt_chars(index: SchemaTableIndex, question: str) -> int:
+    tables = [match.table for match in index.select_tables(question)]
+    context = [index.format_table(table, index.rank_columns(table, question)) for table in tables]
+    joins = index.join_paths(tables)
+    if joins:
+        context.append(format_joins(joins))
+    return len(index.format_whitelist(tables)) + len("\n---\n".join(context))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval skema dua tahap terhadap jumlah tabel.")
+    parser.add_argument("--sizes", default="1,20,100,300,500", help="Jumlah tabel, dipisah koma")
+    parser.add_argument("--repeat", type=int, default=100, help="Pengulangan per pertanyaan")
+    args = parser.parse_args()
+
+    print(f"SCHEMA_TABLES_K={SCHEMA_TABLES_K}, SCHEMA_COLUMNS_PER_TABLE={SCHEMA_COLUMNS_PER_TABLE}")
+    print(f"{'tabel':>6} {'build ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'prompt tok':>11} {'tepat':>6}")
+    failures = 0
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        spec = build_spec(size)
+        start = time.perf_counter()
+        index = SchemaTableIndex(spec)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        timings, tokens, hits, total = [], [], 0, 0
+        for question, expected in QUESTIONS:
+            if expected not in spec:
+                continue
+            total += 1
+            tables = [match.table for match in index.select_tables(question)]
+            if expected in tables:
+                hits += 1
+            else:
+                failures += 1
+                print(f"       ✗ {question!r}: {tables}")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for table in index.select_tables(question):
+                    index.rank_columns(table.table, question)
+                timings.append((time.perf_counter() - start) * 1000)
+            tokens.append(prompt_chars(index, question) / 4)
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"{len(index):>6} {build_ms:>9.1f} {statistics.median(timings):>8.3f} {p95:>8.3f} "
+              f"{statistics.mean(tokens):>11.0f} {hits:>3}/{total:<2}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Evaluasi offline intent classifier lokal terhadap router LLM.
+
+Contoh:
+    python scripts/evaluate_intent_classifier.py --limit 300
+    python scripts/evaluate_intent_classifier.py --file pertanyaan.txt --router gemini
+
+Pertanyaan diambil dari riwayat `trx_pertanyaan.user_promt` (default) atau dari file
+(satu pertanyaan per baris). Pertanyaan yang dievaluasi dikeluarkan dari contoh
+berlabel classifier agar hasilnya tidak bocor.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db.trx_pertanyaan_repo import get_recent_user_prompts
+from src.retrieval.dependencies import get_shared_embedding_function
+from src.retrieval.intent_classifier import LABEL_DATA, LABEL_GENERAL, build_intent_classifier
+
+
+def make_llm_router(kind: str, model_name: str):
+    if kind == "gemini":
+        from src.nl2sql_service import create_router_chain
+        chain = create_router_chain(model_name)
+        return lambda q: chain.invoke({"question": q})
+
+    from langchain_core.output_parsers import StrOutputParser
+    from src.services.openrouter_service import ROUTER_PROMPT, create_openrouter_llm
+    chain = ROUTER_PROMPT | create_openrouter_llm(model_name, temperature=0.0) | StrOutputParser()
+    return lambda q: chain.invoke({"question": q})
+
+
+def to_label(raw: str) -> str:
+    return LABEL_GENERAL if "pengetahuan_umum" in raw.lower() else LABEL_DATA
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bandingkan intent classifier lokal dengan router LLM.")
+    parser.add_argument("--file", help="File berisi pertanyaan, satu per baris")
+    parser.add_argument("--limit", type=int, default=300, help="Jumlah pertanyaan dari riwayat")
+    parser.add_argument("--router", choices=["openrouter", "gemini"], default="openrouter")
+    parser.add_argument("--model", default=None, help="Model router LLM (default: claude-3-haiku / gemini-2.5-flash)")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = get_recent_user_prompts(args.limit)
+    if not questions:
+        raise SystemExit("Tidak ada pertanyaan untuk dievaluasi.")
+
+    evaluated = set(questions)
+    history = [q for q in get_recent_user_prompts(args.limit * 2) if q not in evaluated]
+    classifier = build_intent_classifier(get_shared_embedding_function(), history)
+
+    model = args.model or ("gemini-2.5-flash" if args.router == "gemini" else "anthropic/claude-3-haiku")
+    llm_router = make_llm_router(args.router, model)
+
+    confusion = Counter()
+    confident_total = confident_agree = 0
+    local_ms, llm_ms = [], []
+
+    for question in questions:
+        start = time.perf_counter()
+        result = classifier.classify(question)
+        local_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        expected = to_label(llm_router(question))
+        llm_ms.append((time.perf_counter() - start) * 1000)
+
+        confusion[(expected, result.label)] += 1
+        if not result.escalate:
+            confident_total += 1
+            confident_agree += int(result.label == expected)
+
+    total = len(questions)
+    agree = sum(n for (expected, got), n in confusion.items() if expected == got)
+    pct = lambda values, p: sorted(values)[min(len(values) - 1, int(p / 100 * (len(values) - 1)))]
+
+    print(f"\n--- Evaluasi intent classifier ({total} pertanyaan, router={args.router}:{model}) ---")
+    print(f"Agreement total           : {agree / total:.1%}")
+    if confident_total:
+        print(f"Agreement (tanpa eskalasi): {confident_agree / confident_total:.1%} dari {confident_total} pertanyaan")
+    print(f"Tingkat eskalasi ke LLM   : {(total - confident_total) / total:.1%}")
+    print(f"Latensi lokal  p50/p99    : {pct(local_ms, 50):.2f} / {pct(local_ms, 99):.2f} ms")
+    print(f"Latensi router p50/p99    : {pct(llm_ms, 50):.0f} / {pct(llm_ms, 99):.0f} ms")
+    print("\nConfusion (LLM -> lokal):")
+    for (expected, got), n in sorted(confusion.items()):
+        print(f"  {expected:>17} -> {got:<17} {n}")
+
+
+if __name__ == "__main__":
+    main()
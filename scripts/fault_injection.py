@@ -0,0 +1,435 @@
+"""
+Uji deadline, circuit breaker, dan fallback pipeline OpenRouter (lihat src/utils/resilience.py) dengan stub lokal
+yang bisa disuntik gangguan:
+  - stub LLM (API chat completion ala OpenAI): per model / per stage bisa `ok`, `error` (503), `bad_request` (400), `hang`
+  - stub Qdrant: `down` (503) atau `hang`
+  - MySQL read-only: SQLite sintetis dengan hook yang membuat query `down` (error koneksi 2003) atau `hang`
+Setiap skenario menjalankan `openrouter_nl_to_sql_workflow` di proses ini lalu memeriksa tipe response, latensi,
+dan state breaker. Exit code 1 jika ada skenario yang gagal.
+
+    python scripts/fault_injection.py
+    python scripts/fault_injection.py --only sql_model_hang,mysql_down --json hasil.json
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PRIMARY_MODEL = "stub/primary"
+FALLBACK_MODEL = "stub/fallback"
+ROUTER_MODEL = "anthropic/claude-3-haiku"  # model router di openrouter_service
+HANG_S = 10.0
+STUB_SQL = "SELECT Nama_Unit, SUM(Jumlah) AS total FROM drauk_unit GROUP BY Nama_Unit ORDER BY total DESC LIMIT 5"
+
+# Deadline dan breaker dibuat pendek agar skenario cepat
+SETTINGS = {
+    "REQUEST_DEADLINE_MS": "8000",
+    "STAGE_DEADLINE_ROUTER_MS": "1000",
+    "STAGE_DEADLINE_RETRIEVE_MS": "1000",
+    "STAGE_DEADLINE_SQL_MS": "1500",
+    "STAGE_DEADLINE_EXECUTE_MS": "1000",
+    "STAGE_DEADLINE_ANALYSIS_MS": "1500",
+    "BREAKER_FAILURE_THRESHOLD": "3",
+    "BREAKER_RESET_TIMEOUT_S": "2",
+    "BREAKER_FALLBACK_MODEL_SQL": FALLBACK_MODEL,
+    "BREAKER_FALLBACK_MODEL_ANALYSIS": FALLBACK_MODEL,
+    "OPENROUTER_HTTP_MAX_RETRIES": "0",
+    "SQL_CASCADE_MODELS": "",
+    "HEDGE_STAGES": "",
+    "INTENT_CLASSIFIER_ENABLED": "false",
+    "ANSWER_TEMPLATES_OPENROUTER": "false",
+    "ROLLUP_REWRITE_ENABLED": "false",
+    "SEARCH_SYNC_ENABLED": "false",
+    "TRACING_ENABLED": "false",
+    "LOG_LEVEL": "error",
+    "OPENROUTER_API_KEY": "stub",
+}
+
+# Penanda stage dari isi prompt (lihat prompt di src/services/openrouter_service.py)
+_STAGE_MARKERS = (("Kategori:", "router"), ("Query SQL:", "sql"), ("Jawaban Analisis:", "analysis"))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve(handler_cls) -> Tuple[ThreadingHTTPServer, int]:
+    server = ThreadingHTTPServer(("127.0.0.1", _free_port()), handler_cls)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+class FaultyLLM:
+    """Stub chat completion; gangguan per model (`faults["stub/primary"]`) atau per stage (`faults["stage:sql"]`)."""
+
+    def __init__(self):
+        self.faults: Dict[str, str] = {}
+        self.calls: Counter = Counter()
+        self.lock = threading.Lock()
+
+    def mode(self, model: str, stage: str) -> str:
+        return self.faults.get(model) or self.faults.get(f"stage:{stage}") or self.faults.get("*", "ok")
+
+    def handle(self, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        model = payload.get("model", "")
+        prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages", []))
+        stage = next((name for marker, name in _STAGE_MARKERS if marker in prompt), "other")
+        with self.lock:
+            self.calls[model] += 1
+        mode = self.mode(model, stage)
+        if mode == "hang":
+            time.sleep(HANG_S)
+            return 503, {"error": {"message": "stub hang"}}
+        if mode == "error":
+            return 503, {"error": {"message": "stub unavailable"}}
+        if mode == "bad_request":
+            return 400, {"error": {"message": "stub bad request"}}
+        content = {"router": "data_perusahaan", "sql": STUB_SQL}.get(stage, "Jawaban stub fault injection.")
+        return 200, {
+            "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+
+    def serve(self) -> int:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                status, body = stub.handle(payload)
+                data = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except OSError:
+                    pass  # client sudah meninggalkan panggilan (deadline)
+
+        return _serve(Handler)[1]
+
+
+class FaultyQdrant:
+    """Stub REST Qdrant yang selalu bermasalah: `down` (503) atau `hang`."""
+
+    def __init__(self):
+        self.mode = "down"
+
+    def serve(self) -> int:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self):
+                if stub.mode == "hang":
+                    time.sleep(HANG_S)
+                data = b'{"status": {"error": "stub unavailable"}}'
+                try:
+                    self.send_response(503)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except OSError:
+                    pass
+
+            do_GET = do_POST = do_PUT = _reply
+
+        return _serve(Handler)[1]
+
+
+class FaultyDatabase:
+    """Hook `before_cursor_execute` di engine read-only: `down` = error koneksi MySQL 2003, `hang` = query macet."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.mode = "ok"
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        from sqlalchemy.exc import OperationalError
+        if self.mode == "hang":
+            time.sleep(HANG_S)
+        elif self.mode == "down":
+            raise OperationalError(statement, parameters, Exception(2003, "Can't connect to MySQL server (stub)"))
+
+
+# ======================================================================
+# ========== SKENARIO ==========
+# ======================================================================
+class Harness:
+    def __init__(self, llm: FaultyLLM, qdrant: FaultyQdrant, database: FaultyDatabase):
+        from src.services import openrouter_service
+        from src.services.openrouter_service import NLToSQLRequest, openrouter_nl_to_sql_workflow
+        from src.utils import metrics, resilience
+        self.llm, self.qdrant, self.database = llm, qdrant, database
+        self.service = openrouter_service
+        self.metrics = metrics
+        self.resilience = resilience
+        self._workflow = openrouter_nl_to_sql_workflow
+        self._request = NLToSQLRequest
+        self._seq = 0
+
+    def reset(self):
+        self.llm.faults.clear()
+        self.llm.calls.clear()
+        self.qdrant.mode = "down"
+        self.database.mode = "ok"
+        self.service.SQL_CASCADE_MODELS = []  # SETTINGS: tanpa cascade kecuali skenario memasang sendiri
+        self.resilience.reset_breakers()
+
+    def ask(self, question: Optional[str] = None) -> Tuple[Dict[str, Any], float]:
+        # Pertanyaan unik per panggilan agar tidak di-coalesce / tidak kena precomputed answer
+        self._seq += 1
+        payload = self._request(question=question or f"Berapa total anggaran per unit? #{self._seq}",
+                                model_name=PRIMARY_MODEL, unit="U01", nip="fault-injection")
+        start = time.perf_counter()
+        with self.resilience.request_deadline():
+            response = self._workflow(payload)
+        return response, time.perf_counter() - start
+
+    def state(self, name: str) -> str:
+        return self.resilience.breaker_states().get(name, {}).get("state", "closed")
+
+    def counter(self, name: str) -> float:
+        return self.metrics.snapshot()["counters"].get(name, 0)
+
+
+def check(results: List[Tuple[str, bool]]) -> Tuple[bool, str]:
+    failed = [label for label, ok in results if not ok]
+    return not failed, "ok" if not failed else "gagal: " + "; ".join(failed)
+
+
+def scenario_qdrant_hang(h: Harness):
+    h.qdrant.mode = "hang"
+    before = h.counter("retrieve.fallback_local")
+    response, elapsed = h.ask()
+    return check([
+        ("SUCCESS", response.get("type") == "SUCCESS"),
+        ("retriever lokal dipakai", h.counter("retrieve.fallback_local") == before + 1),
+        ("berhenti di deadline retrieve", 0.9 <= elapsed < 4),
+    ]), elapsed
+
+
+def scenario_qdrant_down(h: Harness):
+    responses = [h.ask() for _ in range(5)]
+    return check([
+        ("semua SUCCESS", all(r.get("type") == "SUCCESS" for r, _ in responses)),
+        ("breaker qdrant terbuka", h.state("qdrant") == "open"),
+    ]), responses[-1][1]
+
+
+def scenario_sql_model_error(h: Harness):
+    h.llm.faults[PRIMARY_MODEL] = "error"
+    responses = [h.ask() for _ in range(4)]
+    return check([
+        ("semua SUCCESS lewat model alternatif", all(r.get("type") == "SUCCESS" for r, _ in responses)),
+        ("model utama dipanggil 3x lalu ditolak breaker", h.llm.calls[PRIMARY_MODEL] == 3),
+        ("breaker model terbuka", h.state(f"llm.openrouter.{PRIMARY_MODEL}") == "open"),
+        ("breaker provider tetap tertutup", h.state("llm.openrouter") == "closed"),
+    ]), responses[-1][1]
+
+
+def scenario_model_bad_request(h: Harness):
+    h.llm.faults[PRIMARY_MODEL] = "bad_request"
+    responses = [h.ask() for _ in range(4)]
+    return check([
+        ("semua SUCCESS lewat model alternatif", all(r.get("type") == "SUCCESS" for r, _ in responses)),
+        ("400 tidak membuka breaker provider", h.state("llm.openrouter") == "closed"),
+    ]), responses[-1][1]
+
+
+def scenario_sql_model_hang(h: Harness):
+    h.llm.faults[PRIMARY_MODEL] = "hang"
+    response, elapsed = h.ask()
+    return check([
+        ("SUCCESS lewat model alternatif", response.get("type") == "SUCCESS"),
+        ("deadline sql + analysis (~3 detik)", 2.5 <= elapsed < 6),
+    ]), elapsed
+
+
+def scenario_analysis_hang(h: Harness):
+    h.llm.faults["stage:analysis"] = "hang"
+    response, elapsed = h.ask()
+    return check([
+        ("SUCCESS", response.get("type") == "SUCCESS"),
+        ("jawaban tanpa analisis LLM", response.get("answer_source") == "fallback"),
+        ("data tetap dikembalikan", bool(response.get("raw_data"))),
+    ]), elapsed
+
+
+def scenario_provider_down(h: Harness):
+    h.llm.faults["*"] = "error"
+    responses = [h.ask() for _ in range(5)]
+    last, elapsed = responses[-1]
+    return check([
+        ("DEPENDENCY_UNAVAILABLE", last.get("type") == "DEPENDENCY_UNAVAILABLE"),
+        ("breaker provider terbuka", h.state("llm.openrouter") == "open"),
+        ("gagal cepat", elapsed < 1.0),
+    ]), elapsed
+
+
+def scenario_cached_answer(h: Harness):
+    from src.services.precompute_service import _ensure_tables, _store_answer
+    question = "Berapa total pagu anggaran?"
+    _ensure_tables()
+    _store_answer(question, "fault_injection", PRIMARY_MODEL,
+                  {"generated_sql": "SELECT SUM(Jumlah) FROM drauk_unit", "answer": "Jawaban tersimpan.", "raw_data": [],
+                   "data_count": 0}, {"output_data_raw": ""}, data_version="versi-lama")
+    h.llm.faults["*"] = "error"
+    response, elapsed = h.ask(question)
+    return check([
+        ("jawaban tersimpan dipakai", response.get("fallback") == "cached_answer"),
+        ("ditandai basi", response.get("stale") is True),
+    ]), elapsed
+
+
+def scenario_mysql_down(h: Harness):
+    h.database.mode = "down"
+    # Cascade default (tier murah lalu model yang diminta): error koneksi tidak boleh dieskalasi ke LLM lain
+    h.service.SQL_CASCADE_MODELS = [ROUTER_MODEL]
+    responses, calls_at_open = [], None
+    for _ in range(5):
+        responses.append(h.ask())
+        if calls_at_open is None and h.state("mysql.readonly") == "open":
+            calls_at_open = sum(h.llm.calls.values())
+    last, elapsed = responses[-1]
+    return check([
+        ("DEPENDENCY_UNAVAILABLE", last.get("type") == "DEPENDENCY_UNAVAILABLE"),
+        ("breaker mysql.readonly terbuka", h.state("mysql.readonly") == "open"),
+        ("tidak ada panggilan LLM setelah breaker terbuka",
+         calls_at_open is not None and sum(h.llm.calls.values()) == calls_at_open),
+        ("gagal cepat", elapsed < 1.0),
+    ]), elapsed
+
+
+def scenario_mysql_hang(h: Harness):
+    h.database.mode = "hang"
+    response, elapsed = h.ask()
+    return check([
+        ("DEPENDENCY_UNAVAILABLE", response.get("type") == "DEPENDENCY_UNAVAILABLE"),
+        ("berhenti di deadline execute", 0.9 <= elapsed < 4),
+    ]), elapsed
+
+
+def scenario_recovery(h: Harness):
+    h.llm.faults["*"] = "error"
+    h.database.mode = "down"
+    for _ in range(4):
+        h.ask()
+    opened = h.state("llm.openrouter") == "open" and h.state("mysql.readonly") == "open"
+    h.llm.faults.clear()
+    h.database.mode = "ok"
+    time.sleep(float(SETTINGS["BREAKER_RESET_TIMEOUT_S"]) + 0.2)
+    response, elapsed = h.ask()
+    return check([
+        ("breaker sempat terbuka", opened),
+        ("SUCCESS setelah pulih", response.get("type") == "SUCCESS"),
+        ("breaker LLM tertutup kembali", h.state("llm.openrouter") == "closed"),
+        ("breaker MySQL tertutup kembali", h.state("mysql.readonly") == "closed"),
+    ]), elapsed
+
+
+SCENARIOS: List[Tuple[str, Callable[[Harness], Any]]] = [
+    ("qdrant_hang", scenario_qdrant_hang),
+    ("qdrant_down", scenario_qdrant_down),
+    ("sql_model_error", scenario_sql_model_error),
+    ("model_bad_request", scenario_model_bad_request),
+    ("sql_model_hang", scenario_sql_model_hang),
+    ("analysis_hang", scenario_analysis_hang),
+    ("provider_down", scenario_provider_down),
+    ("cached_answer", scenario_cached_answer),
+    ("mysql_down", scenario_mysql_down),
+    ("mysql_hang", scenario_mysql_hang),
+    ("recovery", scenario_recovery),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fault injection untuk deadline, circuit breaker, dan fallback.")
+    parser.add_argument("--only", default="", help="Nama skenario dipisah koma (default: semua)")
+    parser.add_argument("--rows", type=int, default=5000, help="Jumlah baris drauk_unit sintetis")
+    parser.add_argument("--json", help="Simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="fault-injection-")
+    llm, qdrant = FaultyLLM(), FaultyQdrant()
+    llm_port, qdrant_port = llm.serve(), qdrant.serve()
+
+    db_path = os.path.join(workdir, "drauk.db")
+    db_url = f"sqlite:///{db_path}"
+
+    # Environment harus di-set sebelum modul src diimpor (konfigurasi dibaca saat import)
+    os.environ.update(SETTINGS)
+    os.environ.update({
+        "BASE_URL_OPEN_ROUTER": f"http://127.0.0.1:{llm_port}/v1",
+        "QDRANT_URL": f"http://127.0.0.1:{qdrant_port}",
+        "QDRANT_PREFER_GRPC": "false",  # stub hanya REST
+        "QDRANT_WARMUP_ENABLED": "false",
+        "DATABASE_URL": db_url,
+        "READONLY_DATABASE_URL": db_url,
+        "LOCAL_STORE_PATH": os.path.join(workdir, "local_store.sqlite3"),
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search_index.sqlite3"),
+    })
+
+    from sqlalchemy import create_engine, text
+    from replay_load_test import TRX_PERTANYAAN_DDL  # scripts/ ada di sys.path saat dijalankan langsung
+    from verify_rollups import build_synthetic_db
+
+    build_synthetic_db(db_path, args.rows)
+    engine = create_engine(db_url)
+    with engine.begin() as connection:
+        connection.execute(text(TRX_PERTANYAAN_DDL))
+    engine.dispose()
+
+    from src.db.config_mysql import get_readonly_engine
+
+    harness = Harness(llm, qdrant, FaultyDatabase(get_readonly_engine()))
+    selected = {name.strip() for name in args.only.split(",") if name.strip()}
+
+    results = []
+    for name, scenario in SCENARIOS:
+        if selected and name not in selected:
+            continue
+        harness.reset()
+        try:
+            (passed, detail), elapsed = scenario(harness)
+        except Exception as e:
+            passed, detail, elapsed = False, f"exception: {type(e).__name__}: {e}", 0.0
+        results.append({"scenario": name, "passed": passed, "detail": detail, "last_request_s": round(elapsed, 2),
+                        "breakers": {k: v["state"] for k, v in harness.resilience.breaker_states().items()}})
+        print(f"{'✅' if passed else '❌'} {name:<20} {elapsed:6.2f}s  {detail}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": SETTINGS, "results": results}, f, ensure_ascii=False, indent=2)
+    failed = [r["scenario"] for r in results if not r["passed"]]
+    print(f"\n{len(results) - len(failed)}/{len(results)} skenario lulus")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -84,99 +84,89 @@
 # print("\n--- ✅ Proses Ingest Selesai ---")
 # print(f"Database vektor berhasil dibuat dan disimpan di direktori: {DB_PATH}")
 
-import yaml
 import os
+import sys
 from dotenv import load_dotenv
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Qdrant
 from qdrant_client import QdrantClient
+from qdrant_client.http import models as rest
 from langchain_community.embeddings import HuggingFaceEmbeddings
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.search.table_index import SchemaTableIndex, format_column
+from src.utils.schema_spec import SCHEMA_YAML_PATH, load_schema_spec
+
 # --- 1. KONFIGURASI ---
 print("Memulai proses ingest data skema...")
 load_dotenv()
 
-# Path ke file YML
-YAML_PATH = "data/schema_description.yml"
+# Path ke file YML (SCHEMA_YAML_PATH, default data/schema_description.yml)
+YAML_PATH = SCHEMA_YAML_PATH
 
 # Nama model embedding yang dipilih
-EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-base-en-v1.5")
 
 # Nama koleksi di Qdrant
-COLLECTION_NAME = "schema_vectors"
+COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "schema_vectors")
 
 # Qdrant URL dari environment variable
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 
 # --- 2. FORMATTER ---
-def format_schema_from_yaml(yaml_data: dict) -> str:
-    """
-    Mengubah data YML terstruktur menjadi satu blok teks kaya deskripsi untuk RAG.
-    Fungsi ini menyertakan tipe data, deskripsi, dan sinonim untuk setiap kolom.
-    """
-    formatted_texts = []
-    spec = yaml_data.get('spec', {})
-
-    for table_name, table_details in spec.items():
-        table_description = table_details.get('description', 'Tidak ada deskripsi.')
-        text = f"Informasi detail untuk tabel database bernama '{table_name}':\n"
-        text += f"Deskripsi umum tabel: {table_description}\n"
-        text += "Tabel ini memiliki kolom-kolom sebagai berikut:\n\n"
-        
-        for column in table_details.get('columns', []):
-            col_name = column.get('name')
-            col_type = column.get('data_type', 'tipe tidak diketahui')
-            col_desc = column.get('description')
-            col_synonyms = ", ".join(column.get('synonyms', []))
-            
-            text += (
-                f"- Kolom `{col_name}` (tipe data: {col_type}): {col_desc}. "
-                f"Pengguna mungkin menyebut kolom ini sebagai: '{col_synonyms}'.\n"
-            )
-        
-        formatted_texts.append(text)
-        
-    return "\n---\n".join(formatted_texts)
+# Dua jenis point untuk retrieval dua tahap (src/retrieval/schema_retriever.py):
+# - kind=table : ringkasan satu tabel (deskripsi, aturan bisnis, nama & sinonim kolom, contoh pertanyaan) untuk memilih tabel
+# - kind=column: satu kolom, difilter ke tabel terpilih lewat metadata.table
+def build_documents(index: SchemaTableIndex) -> list:
+    documents = []
+    for table in index.tables:
+        documents.append(Document(
+            page_content=index.table_summary(table),
+            metadata={"source": YAML_PATH, "kind": "table", "table": table},
+        ))
+        for column in index.columns(table):
+            documents.append(Document(
+                page_content=f"Tabel `{table}`. " + format_column(column).lstrip("- "),
+                metadata={"source": YAML_PATH, "kind": "column", "table": table, "column": column["name"]},
+            ))
+    return documents
 
 # --- 3. LOAD & TRANSFORM ---
 print(f"Membaca dan memformat skema dari: {YAML_PATH}...")
 try:
-    with open(YAML_PATH, 'r', encoding='utf-8') as f:
-        yaml_content = yaml.safe_load(f)
+    index = SchemaTableIndex(load_schema_spec())
 except FileNotFoundError:
     print(f"Error: File tidak ditemukan di {YAML_PATH}. Pastikan path dan nama file sudah benar.")
     exit()
 
-schema_text = format_schema_from_yaml(yaml_content)
-print("Berhasil memformat YML menjadi teks.")
-
-documents = [Document(page_content=schema_text, metadata={"source": YAML_PATH})]
-
-# --- 4. SPLIT ---
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-chunks = text_splitter.split_documents(documents)
-print(f"Teks skema dipecah menjadi {len(chunks)} chunk.")
+documents = build_documents(index)
+print(f"Berhasil memformat YML: {len(index)} tabel, {len(documents) - len(index)} kolom.")
 
-# --- 5. EMBEDDINGS ---
+# --- 4. EMBEDDINGS ---
 print(f"Memuat model embedding: {EMBEDDING_MODEL}...")
 embeddings = HuggingFaceEmbeddings(
     model_name=EMBEDDING_MODEL,
     model_kwargs={'device': 'cpu'}  # force pakai CPU
 )
 
-# --- 6. CONNECT KE QDRANT ---
-print(f"Menyambungkan ke Qdrant di {QDRANT_URL}...")
-qdrant = QdrantClient(url=QDRANT_URL)
-
-# --- 7. INGEST KE QDRANT ---
-print(f"Menyimpan embeddings ke Qdrant collection: {COLLECTION_NAME}...")
+# --- 5. INGEST KE QDRANT ---
+# Koleksi dibuat ulang: format point lama (potongan teks seluruh skema) tidak dipakai lagi
+print(f"Menyimpan embeddings ke Qdrant collection: {COLLECTION_NAME} di {QDRANT_URL}...")
 db = Qdrant.from_documents(
-    chunks,
+    documents,
     embeddings,
     url=QDRANT_URL,
-    collection_name=COLLECTION_NAME
+    api_key=os.getenv("QDRANT_API_KEY"),
+    collection_name=COLLECTION_NAME,
+    force_recreate=True,
 )
 
+# --- 6. PAYLOAD INDEX ---
+# Filter tahap 1 (kind) dan tahap 2 (kind + table) tetap cepat walaupun jumlah tabel ratusan
+qdrant = QdrantClient(url=QDRANT_URL, api_key=os.getenv("QDRANT_API_KEY"))
+for field in ("kind", "table"):
+    qdrant.create_payload_index(COLLECTION_NAME, field_name=f"metadata.{field}", field_schema=rest.PayloadSchemaType.KEYWORD)
+
 print("\n--- ✅ Proses Ingest Selesai ---")
-print(f"Data berhasil disimpan ke collection '{COLLECTION_NAME}' di Qdrant.")
+print(f"{len(documents)} point berhasil disimpan ke collection '{COLLECTION_NAME}' di Qdrant.")
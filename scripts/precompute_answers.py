@@ -0,0 +1,52 @@
+"""
+Precompute jawaban untuk common_questions (schema_description.yml) dan pertanyaan
+yang paling sering ditanyakan di trx_pertanyaan.
+
+Jalankan terjadwal (mis. cron tiap 15 menit). Pertanyaan yang jawabannya masih sesuai
+versi data drauk_unit dilewati; jika data berubah, semua jawaban dihitung ulang.
+
+    python scripts/precompute_answers.py
+    python scripts/precompute_answers.py --top-n 100 --min-count 5 --model openai/gpt-4o
+    python scripts/precompute_answers.py --watch 900   # loop tanpa cron
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.precompute_service import (
+    PRECOMPUTE_MIN_COUNT,
+    PRECOMPUTE_MODEL_NAME,
+    PRECOMPUTE_TOP_N,
+    refresh_precomputed_answers,
+)
+
+
+def run_once(args):
+    start = time.perf_counter()
+    summary = refresh_precomputed_answers(args.model, args.top_n, args.min_count, force=args.force)
+    summary["elapsed_s"] = round(time.perf_counter() - start, 1)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute jawaban pertanyaan umum dan populer.")
+    parser.add_argument("--model", default=PRECOMPUTE_MODEL_NAME)
+    parser.add_argument("--top-n", type=int, default=PRECOMPUTE_TOP_N, help="Jumlah pertanyaan terpopuler dari riwayat")
+    parser.add_argument("--min-count", type=int, default=PRECOMPUTE_MIN_COUNT, help="Frekuensi minimal pertanyaan riwayat")
+    parser.add_argument("--force", action="store_true", help="Hitung ulang walaupun data tidak berubah")
+    parser.add_argument("--watch", type=float, default=0, help="Ulangi setiap N detik")
+    args = parser.parse_args()
+
+    while True:
+        run_once(args)
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
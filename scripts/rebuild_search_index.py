@@ -0,0 +1,35 @@
+"""
+Mengisi / membangun ulang indeks pencarian riwayat pertanyaan (src/search/index.py) dari trx_pertanyaan.
+
+    python scripts/rebuild_search_index.py            # inkremental: id > id terakhir di indeks
+    python scripts/rebuild_search_index.py --full     # hapus indeks lalu bangun ulang
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.search.index import get_search_index, last_indexed_id, sync_search_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sinkronisasi indeks full-text trx_pertanyaan.")
+    parser.add_argument("--full", action="store_true", help="Kosongkan indeks sebelum sinkronisasi")
+    args = parser.parse_args()
+
+    index = get_search_index()
+    if args.full:
+        index.execute("DELETE FROM search_docs")
+        index.execute("DELETE FROM search_fts")
+        print("Indeks dikosongkan.")
+
+    start = time.perf_counter()
+    total = sync_search_index()
+    index.execute("INSERT INTO search_fts (search_fts) VALUES ('optimize')")
+    print(f"✅ {total} baris diindeks dalam {time.perf_counter() - start:.1f} detik (id terakhir {last_indexed_id()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Membangun ulang tabel rollup drauk_unit (lihat src/db/rollups.py) jika datanya berubah. Satu-satunya tempat
+pengecekan fingerprint dan rebuild: rollup basi ditandai di tabel meta (worker API berhenti memakainya) lalu dibangun
+ulang. Di MySQL, proses refresh lain yang berjalan bersamaan dilewati (GET_LOCK).
+
+Jalankan setelah load data / terjadwal:
+    python scripts/refresh_rollups.py
+    python scripts/refresh_rollups.py --force
+    python scripts/refresh_rollups.py --watch 600
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.db.rollups import refresh_rollups
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh tabel rollup drauk_unit.")
+    parser.add_argument("--force", action="store_true", help="Bangun ulang walaupun data tidak berubah")
+    parser.add_argument("--url", help="SQLAlchemy URL (default: DATABASE_URL / DB_*)")
+    parser.add_argument("--watch", type=float, default=0, help="Ulangi setiap N detik")
+    args = parser.parse_args()
+
+    engine = None
+    if args.url:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.url)
+
+    while True:
+        print(json.dumps(refresh_rollups(engine, force=args.force), ensure_ascii=False, indent=2, default=str))
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+"""
+Load test berbasis replay: pertanyaan asli dari trx_pertanyaan (atau dump) dikirim ke aplikasi FastAPI
+dengan arrival rate target (open-loop, Poisson), memakai stub LLM yang menjawab dengan SQL yang tercatat
+dan DB lokal pengganti. Hasil: throughput, p50/p95/p99 per endpoint dan per stage, serta komposisi error,
+untuk menentukan jumlah worker sebelum deploy.
+
+Secara default script menjalankan:
+  1. stub LLM (API chat completion ala OpenAI) untuk OPENROUTER, latensi per stage sesuai --latency,
+  2. database SQLite sintetis (drauk_unit + trx_pertanyaan) sebagai pengganti MySQL, atau --db-url,
+  3. `uvicorn src.main:app --workers N` dengan environment yang diarahkan ke stub di atas.
+Retrieval (Qdrant + embedding) tetap memakai konfigurasi .env.
+
+    python scripts/replay_load_test.py --rate 5 --duration 120 --workers 4
+    python scripts/replay_load_test.py --dump trx_pertanyaan.jsonl --rate 10 --latency "sql=lognormal:2500:0.6"
+    python scripts/replay_load_test.py --target http://127.0.0.1:8000 --stub-port 9100   # app sudah berjalan
+    python scripts/replay_load_test.py --mix "openrouter=0.8,dashboard=0.2" --json report.json
+
+Endpoint Gemini (/generate-sql-execute-analyze, /context-nl-to-sql) tidak diikutkan karena client Gemini
+tidak bisa diarahkan ke stub.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.question import normalize_question
+
+DEFAULT_LATENCY = "router=lognormal:400:0.4,sql=lognormal:1500:0.5,analysis=lognormal:1200:0.5,other=lognormal:800:0.5"
+DEFAULT_MIX = "openrouter=1"
+FALLBACK_SQL = "SELECT SUM(Jumlah) FROM drauk_unit"
+
+# Penanda stage dari isi prompt (lihat prompt di src/services/openrouter_service.py)
+_STAGE_MARKERS = (("Kategori:", "router"), ("Query SQL:", "sql"), ("Jawaban Analisis:", "analysis"))
+_QUESTION = re.compile(r"Pertanyaan Pengguna:\s*(.+)")
+
+TRX_PERTANYAAN_DDL = """
+CREATE TABLE IF NOT EXISTS trx_pertanyaan (
+    id_pertanyaan INTEGER PRIMARY KEY AUTOINCREMENT,
+    unit TEXT, nip TEXT, user_promt TEXT,
+    token_in INTEGER, token_out INTEGER, token_total INTEGER,
+    output_query TEXT, output_data_raw TEXT, output_analisa TEXT,
+    apps TEXT, udcr DATETIME
+)
+"""
+
+
+# ======================================================================
+# ========== SAMPEL ==========
+# ======================================================================
+def load_samples(args) -> List[Dict[str, Any]]:
+    """Record {user_promt, output_query, unit, nip} dari dump (.jsonl/.json/.csv) atau trx_pertanyaan."""
+    if args.dump:
+        with open(args.dump, "r", encoding="utf-8") as f:
+            if args.dump.endswith(".csv"):
+                records = list(csv.DictReader(f))
+            elif args.dump.endswith(".jsonl"):
+                records = [json.loads(line) for line in f if line.strip()]
+            else:
+                records = json.load(f)
+    else:
+        from src.db.trx_pertanyaan_repo import get_replay_samples
+        records = get_replay_samples(args.limit)
+    samples = [r for r in records if (r.get("user_promt") or "").strip()]
+    if not samples:
+        sys.exit("❌ Tidak ada sampel user_promt untuk di-replay.")
+    return samples[: args.limit]
+
+
+# ======================================================================
+# ========== STUB LLM ==========
+# ======================================================================
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """`fixed:MS`, `uniform:MIN:MAX`, `exp:MEAN`, atau `lognormal:MEDIAN:SIGMA` -> sampler detik."""
+    kind, *params = spec.split(":")
+    values = [float(p) for p in params]
+    if kind == "fixed":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / values[0]) / 1000
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1]) / 1000
+    raise ValueError(f"Distribusi latensi tidak dikenal: {spec}")
+
+
+def parse_pairs(spec: str) -> Dict[str, str]:
+    return dict(part.split("=", 1) for part in spec.split(",") if part.strip())
+
+
+class StubLLM:
+    """Server chat completion lokal: SQL diambil dari output_query yang tercatat untuk pertanyaan yang sama."""
+
+    def __init__(self, samples: List[Dict[str, Any]], latency: Dict[str, Callable], error_rate: float, seed: int):
+        self.sql_by_question = {
+            normalize_question(s["user_promt"]): s.get("output_query") or FALLBACK_SQL for s in samples
+        }
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.errors = Counter()
+
+    def answer(self, prompt: str):
+        stage = next((name for marker, name in _STAGE_MARKERS if marker in prompt), "other")
+        with self.lock:
+            delay = self.latency.get(stage, self.latency["other"])(self.rng)
+            fail = self.rng.random() < self.error_rate
+            self.calls[stage] += 1
+            if fail:
+                self.errors[stage] += 1
+        time.sleep(delay)
+        if fail:
+            return 500, None
+        if stage == "router":
+            return 200, "data_perusahaan"
+        if stage == "sql":
+            match = _QUESTION.search(prompt)
+            question = normalize_question(match.group(1)) if match else ""
+            return 200, self.sql_by_question.get(question, FALLBACK_SQL)
+        return 200, "Jawaban stub untuk load test."
+
+    def serve(self, port: int) -> ThreadingHTTPServer:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages", []))
+                status, content = stub.answer(prompt)
+                if status != 200:
+                    body = b'{"error": {"message": "stub error"}}'
+                else:
+                    body = json.dumps({
+                        "id": "stub", "object": "chat.completion", "created": int(time.time()),
+                        "model": payload.get("model", "stub"),
+                        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                                  "total_tokens": (len(prompt) + len(content)) // 4},
+                    }).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# ======================================================================
+# ========== DB PENGGANTI & APLIKASI ==========
+# ======================================================================
+def prepare_database(args, workdir: str) -> str:
+    if args.db_url:
+        return args.db_url
+    from sqlalchemy import create_engine, text
+    from verify_rollups import build_synthetic_db  # scripts/ ada di sys.path saat dijalankan langsung
+
+    url = build_synthetic_db(os.path.join(workdir, "drauk.db"), args.rows)
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(text(TRX_PERTANYAAN_DDL))
+    engine.dispose()
+    return url
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(args, stub_port: int, db_url: str, workdir: str):
+    port = args.app_port or _free_port()
+    env = {
+        **os.environ,
+        "BASE_URL_OPEN_ROUTER": f"http://127.0.0.1:{stub_port}/v1",
+        "OPENROUTER_API_KEY": "stub",
+        "DATABASE_URL": db_url,
+        "READONLY_DATABASE_URL": db_url,
+        "LOCAL_STORE_PATH": os.path.join(workdir, "local_store.sqlite3"),
+    }
+    command = [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(args.workers), "--log-level", "warning"]
+    process = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"❌ uvicorn berhenti saat startup (exit {process.returncode}).")
+        try:
+            if httpx.get(base_url + "/", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    sys.exit("❌ Aplikasi tidak siap dalam --startup-timeout.")
+
+
+# ======================================================================
+# ========== GENERATOR BEBAN (OPEN-LOOP) ==========
+# ======================================================================
+def build_request(endpoint: str, sample: Dict[str, Any], model: str):
+    if endpoint == "openrouter":
+        return "POST", "/openrouter/nl-to-sql", {
+            "question": sample["user_promt"], "model_name": model,
+            "unit": str(sample.get("unit") or "loadtest"), "nip": str(sample.get("nip") or "0"),
+        }
+    if endpoint == "dashboard":
+        return "GET", "/dashboard/getall?limit=100", None
+    raise ValueError(f"Endpoint tidak dikenal: {endpoint}")
+
+
+def run_load(args, base_url: str, samples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Kedatangan Poisson dijadwalkan di muka; latensi dihitung dari waktu kedatangan terjadwal
+    sehingga antrean di sisi client ikut terukur (tanpa coordinated omission).
+    """
+    rng = random.Random(args.seed)
+    mix = {name: float(weight) for name, weight in parse_pairs(args.mix).items()}
+    endpoints, weights = list(mix), list(mix.values())
+
+    arrivals, t = [], 0.0
+    while True:
+        t += rng.expovariate(args.rate)
+        if t >= args.duration:
+            break
+        arrivals.append((t, rng.choices(endpoints, weights)[0], rng.choice(samples)))
+
+    results: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    inflight = 0
+    client = httpx.Client(
+        base_url=base_url, timeout=args.timeout,
+        limits=httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight),
+    )
+
+    def fire(scheduled: float, endpoint: str, sample: Dict[str, Any]):
+        nonlocal inflight
+        method, path, body = build_request(endpoint, sample, args.model)
+        record = {"endpoint": endpoint, "scheduled": scheduled}
+        try:
+            response = client.request(method, path, json=body)
+            record["status"] = response.status_code
+            try:
+                content = response.json()
+                record["type"] = content.get("type", "OK") if isinstance(content, dict) else "OK"
+                record["step"] = content.get("step") if isinstance(content, dict) else None
+            except ValueError:
+                record["type"] = "NON_JSON"
+        except httpx.TimeoutException:
+            record.update(status=0, type="CLIENT_TIMEOUT")
+        except httpx.HTTPError as e:
+            record.update(status=0, type=f"CLIENT_{type(e).__name__.upper()}")
+        record["latency_ms"] = (time.perf_counter() - start - scheduled) * 1000
+        with lock:
+            inflight -= 1
+            results.append(record)
+
+    pool = ThreadPoolExecutor(max_workers=args.max_inflight, thread_name_prefix="replay")
+    start = time.perf_counter()
+    for scheduled, endpoint, sample in arrivals:
+        delay = scheduled - (time.perf_counter() - start)
+        if delay > 0:
+            time.sleep(delay)
+        with lock:
+            if inflight >= args.max_inflight:
+                # Open-loop: kedatangan tidak ditunda; kelebihan dicatat sebagai drop di sisi client
+                results.append({"endpoint": endpoint, "scheduled": scheduled, "status": 0, "type": "CLIENT_DROPPED"})
+                continue
+            inflight += 1
+        pool.submit(fire, scheduled, endpoint, sample)
+    pool.shutdown(wait=True)
+    client.close()
+    return results
+
+
+# ======================================================================
+# ========== LAPORAN ==========
+# ======================================================================
+def _pct(values: List[float], pct: float) -> float:
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def collect_worker_metrics(base_url: str, workers: int, attempts: int = 50) -> Dict[int, Dict[str, Any]]:
+    """Snapshot /metrics dari setiap worker (dibedakan lewat worker_pid)."""
+    snapshots: Dict[int, Dict[str, Any]] = {}
+    with httpx.Client(base_url=base_url, timeout=5) as client:
+        for _ in range(attempts):
+            try:
+                snapshot = client.get("/metrics", headers={"Connection": "close"}).json()
+            except (httpx.HTTPError, ValueError):
+                continue
+            snapshots[snapshot.get("worker_pid", len(snapshots))] = snapshot
+            if len(snapshots) >= workers:
+                break
+    return snapshots
+
+
+def build_report(results: List[Dict[str, Any]], duration: float, snapshots: Dict[int, Dict[str, Any]], stub: Optional[StubLLM]):
+    by_endpoint = defaultdict(list)
+    for record in results:
+        by_endpoint[record["endpoint"]].append(record)
+
+    endpoints = {}
+    for endpoint, records in by_endpoint.items():
+        latencies = sorted(r["latency_ms"] for r in records if "latency_ms" in r)
+        is_ok = lambda r: r.get("status") == 200 and r.get("type") in ("SUCCESS", "OK")
+        ok = [r for r in records if is_ok(r)]
+        endpoints[endpoint] = {
+            "requests": len(records),
+            "success": len(ok),
+            "throughput_rps": round(len(latencies) / duration, 2),
+            "goodput_rps": round(len(ok) / duration, 2),
+            "p50_ms": round(_pct(latencies, 50)), "p95_ms": round(_pct(latencies, 95)),
+            "p99_ms": round(_pct(latencies, 99)), "max_ms": round(latencies[-1]) if latencies else 0,
+            "errors": dict(Counter(
+                f"{r.get('status')} {r.get('type')}" + (f" ({r['step']})" if r.get("step") else "")
+                for r in records if not is_ok(r)
+            ).most_common()),
+        }
+
+    # Persentil stage per worker (reservoir /metrics); gabungan = nilai terburuk antar worker
+    stages: Dict[str, Dict[str, Any]] = {}
+    for pid, snapshot in snapshots.items():
+        for name, histogram in snapshot.get("histograms", {}).items():
+            stage = stages.setdefault(name, {"count": 0, "p50_ms": 0, "p95_ms": 0, "p99_ms": 0, "workers": {}})
+            stage["count"] += histogram["count"]
+            for key in ("p50", "p95", "p99"):
+                stage[f"{key}_ms"] = max(stage[f"{key}_ms"], round(histogram[key]))
+            stage["workers"][str(pid)] = {key: round(histogram[key]) for key in ("count", "p50", "p95", "p99")}
+
+    report = {"duration_s": duration, "requests": len(results), "endpoints": endpoints, "stages": stages}
+    if stub is not None:
+        report["stub_llm"] = {"calls": dict(stub.calls), "injected_errors": dict(stub.errors)}
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n=== {report['requests']} request dalam {report['duration_s']:.0f} detik ===")
+    print(f"{'endpoint':<12} {'req':>6} {'ok':>6} {'rps':>7} {'goodput':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}")
+    for name, e in report["endpoints"].items():
+        print(f"{name:<12} {e['requests']:>6} {e['success']:>6} {e['throughput_rps']:>7} {e['goodput_rps']:>8} "
+              f"{e['p50_ms']:>7} {e['p95_ms']:>7} {e['p99_ms']:>7} {e['max_ms']:>7}")
+        for error, count in e["errors"].items():
+            print(f"    {count:>6}  {error}")
+    if report["stages"]:
+        print(f"\n{'stage (ms, terburuk antar worker)':<40} {'n':>7} {'p50':>7} {'p95':>7} {'p99':>7}")
+        for name, s in sorted(report["stages"].items()):
+            print(f"{name:<40} {s['count']:>7} {s['p50_ms']:>7} {s['p95_ms']:>7} {s['p99_ms']:>7}")
+    if "stub_llm" in report:
+        print(f"\nStub LLM: {report['stub_llm']['calls']}  error disuntikkan: {report['stub_llm']['injected_errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay load test dari riwayat trx_pertanyaan.")
+    parser.add_argument("--dump", help="Dump trx_pertanyaan (.jsonl/.json/.csv) berisi user_promt, output_query, unit, nip")
+    parser.add_argument("--limit", type=int, default=2000, help="Jumlah sampel maksimal")
+    parser.add_argument("--rate", type=float, default=2.0, help="Arrival rate target (request/detik, Poisson)")
+    parser.add_argument("--duration", type=float, default=60, help="Lama pengujian (detik)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Bobot endpoint, mis. 'openrouter=0.9,dashboard=0.1' (default {DEFAULT_MIX})")
+    parser.add_argument("--model", default="openai/gpt-4o", help="model_name pada payload")
+    parser.add_argument("--latency", default="", help=f"Distribusi latensi stub per stage (default {DEFAULT_LATENCY})")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Probabilitas stub membalas HTTP 500")
+    parser.add_argument("--workers", type=int, default=2, help="Jumlah worker uvicorn")
+    parser.add_argument("--target", help="URL aplikasi yang sudah berjalan (tidak menjalankan uvicorn)")
+    parser.add_argument("--app-port", type=int, default=0)
+    parser.add_argument("--stub-port", type=int, default=0)
+    parser.add_argument("--db-url", help="DB pengganti (default: SQLite sintetis)")
+    parser.add_argument("--rows", type=int, default=20000, help="Jumlah baris drauk_unit sintetis")
+    parser.add_argument("--max-inflight", type=int, default=256, help="Batas request bersamaan di sisi client")
+    parser.add_argument("--timeout", type=float, default=120, help="Timeout per request (detik)")
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Tulis laporan lengkap ke file JSON")
+    args = parser.parse_args()
+
+    samples = load_samples(args)
+    latency_spec = {**parse_pairs(DEFAULT_LATENCY), **parse_pairs(args.latency)}
+    stub = StubLLM(samples, {stage: parse_distribution(spec) for stage, spec in latency_spec.items()},
+                   args.llm_error_rate, args.seed)
+    stub_port = args.stub_port or _free_port()
+    stub_server = stub.serve(stub_port)
+    print(f"✅ {len(samples)} sampel, stub LLM di http://127.0.0.1:{stub_port}/v1")
+
+    process = None
+    workdir = tempfile.mkdtemp(prefix="replay-load-")
+    try:
+        if args.target:
+            base_url = args.target.rstrip("/")
+            print(f"Target: {base_url} (pastikan BASE_URL_OPEN_ROUTER=http://127.0.0.1:{stub_port}/v1)")
+        else:
+            db_url = prepare_database(args, workdir)
+            process, base_url = start_app(args, stub_port, db_url, workdir)
+            print(f"✅ Aplikasi siap di {base_url} ({args.workers} worker, DB {db_url})")
+
+        print(f"Mengirim ~{args.rate * args.duration:.0f} request ({args.rate}/detik selama {args.duration:.0f} detik)...")
+        started = time.perf_counter()
+        results = run_load(args, base_url, samples)
+        elapsed = time.perf_counter() - started
+
+        snapshots = collect_worker_metrics(base_url, args.workers)
+        report = build_report(results, elapsed, snapshots, stub)
+        print_report(report)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"\nLaporan ditulis ke {args.json}")
+    finally:
+        if process is not None:
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        stub_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Uji jawaban template (src/utils/answer_templates.py) untuk hasil satu nilai / satu baris: label dan format angka
+harus mengikuti item SELECT yang persis `FUNC([DISTINCT] [tbl.]kolom)` atau kolom polos. Ekspresi lain (selisih,
+rasio, alias bebas) harus dikembalikan ke LLM analisis (None). Exit code 1 jika ada kasus yang gagal.
+
+    python scripts/verify_answer_templates.py
+"""
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.answer_templates import render_template_answer
+
+# (kolom hasil, baris, SQL, jawaban yang diharapkan atau None jika harus dianalisis LLM)
+CASES = [
+    ({"total_pagu": [1500000.0]}, "SELECT SUM(Jumlah) AS total_pagu FROM drauk_unit WHERE Tahun_Anggaran = 2024",
+     "Total pagu anggaran adalah Rp 1.500.000."),
+    ({"SUM(d.Realisasi)": [1500000.5]}, "SELECT SUM(d.Realisasi) FROM drauk_unit d",
+     "Total realisasi anggaran adalah Rp 1.500.000,50."),
+    ({"COUNT(*)": [12]}, "SELECT COUNT(*) FROM drauk_unit", "Jumlah data adalah 12."),
+    ({"jumlah_akun": [57]},
+     "SELECT COUNT(DISTINCT d.Akun) AS jumlah_akun FROM drauk_unit d WHERE d.Tahun_Anggaran = 2024",
+     "Jumlah akun adalah 57."),
+    ({"Nama_Unit": ["Biro Keuangan"], "total": [5000.0]},
+     "SELECT d.Nama_Unit, SUM(d.`Sisa`) total FROM drauk_unit d GROUP BY d.Nama_Unit ORDER BY total DESC LIMIT 1",
+     "Berikut hasilnya: nama unit Biro Keuangan, total sisa anggaran Rp 5.000."),
+    ({"Tahun_Anggaran": [2024]}, "SELECT DISTINCT Tahun_Anggaran FROM drauk_unit", "Tahun anggaran adalah 2024."),
+    ({"SUM(Jumlah)": [None]}, "SELECT SUM(Jumlah) FROM drauk_unit WHERE Tahun_Anggaran = 2030",
+     "Tidak ada data yang ditemukan untuk pertanyaan Anda."),
+    # Bukan agregat atas satu kolom: tidak boleh diberi label/format kolom lain
+    ({"selisih": [1500000]}, "SELECT SUM(Jumlah) - SUM(Realisasi) AS selisih FROM drauk_unit", None),
+    ({"persen": [80.5]}, "SELECT ROUND(SUM(Realisasi) / SUM(Jumlah) * 100, 2) AS persen FROM drauk_unit", None),
+    ({"Nama_Unit": ["Biro Keuangan"], "serapan": [0.8]},
+     "SELECT Nama_Unit, SUM(Realisasi) / SUM(Jumlah) AS serapan FROM drauk_unit GROUP BY Nama_Unit LIMIT 1", None),
+]
+
+
+def main():
+    failures = 0
+    for columns, sql, expected in CASES:
+        rendered = render_template_answer(pd.DataFrame(columns), sql)
+        answer = rendered[0] if rendered else None
+        ok = answer == expected
+        failures += not ok
+        print(f"  {'✓' if ok else '✗'}  {sql}\n     -> {answer}" + ("" if ok else f"\n     diharapkan: {expected}"))
+    print(f"\n{len(CASES)} kasus, {failures} gagal")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
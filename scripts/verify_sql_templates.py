@@ -0,0 +1,129 @@
+"""
+Uji cache template SQL (src/services/sql_template_service.py) terhadap database SQLite sintetis drauk_unit:
+template dipelajari dari pasangan (pertanyaan, SQL) seperti hasil LLM, lalu pertanyaan variasi literal dicocokkan.
+Untuk setiap kecocokan, hasil SQL template (bound parameter) dibandingkan dengan SQL literal yang setara;
+kasus yang ambigu / belum terkonfirmasi / bentuk SQL berubah harus kembali ke pipeline normal (tidak cocok).
+Exit code 1 jika ada kasus yang gagal.
+
+    python scripts/verify_sql_templates.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (pertanyaan, SQL "hasil LLM") yang dipelajari berurutan
+LEARN = [
+    ("Berapa total anggaran Fakultas 1 tahun 2023?",
+     "SELECT SUM(Jumlah) AS total FROM drauk_unit WHERE Nama_Unit = 'Fakultas 1' AND Tahun_Anggaran = 2023"),
+    ("Berapa total anggaran Fakultas 2 tahun 2024?",
+     "SELECT SUM(Jumlah) AS total FROM drauk_unit WHERE Nama_Unit = 'Fakultas 2' AND Tahun_Anggaran = 2024"),
+    ("Realisasi Program 3 per unit tahun 2022",
+     "SELECT Nama_Unit, SUM(Realisasi) AS realisasi FROM drauk_unit WHERE Program_Strategis = 'Program 3' "
+     "AND Tahun_Anggaran = 2022 GROUP BY Nama_Unit ORDER BY realisasi DESC"),
+    ("Realisasi Program 5 per unit tahun 2024",
+     "SELECT Nama_Unit, SUM(Realisasi) AS realisasi FROM drauk_unit WHERE Program_Strategis = 'Program 5' "
+     "AND Tahun_Anggaran = 2024 GROUP BY Nama_Unit ORDER BY realisasi DESC"),
+    # Hanya sekali: belum terkonfirmasi
+    ("Sisa anggaran Biro 3 tahun 2023",
+     "SELECT SUM(Sisa) FROM drauk_unit WHERE Nama_Unit = 'Biro 3' AND Tahun_Anggaran = 2023"),
+    # LIKE: slot tidak terikat ke literal, tidak boleh dipelajari
+    ("Kegiatan Fakultas 4 tahun 2023",
+     "SELECT DISTINCT Kegiatan_Unit FROM drauk_unit WHERE Nama_Unit LIKE '%Fakultas 4%' AND Tahun_Anggaran = 2023"),
+    ("Kegiatan Fakultas 5 tahun 2024",
+     "SELECT DISTINCT Kegiatan_Unit FROM drauk_unit WHERE Nama_Unit LIKE '%Fakultas 5%' AND Tahun_Anggaran = 2024"),
+    # Pertanyaan sama bentuk dengan SQL berbeda: konfirmasi diulang
+    ("Jumlah kegiatan Fakultas 7 tahun 2022",
+     "SELECT COUNT(DISTINCT Kegiatan_Unit) FROM drauk_unit WHERE Nama_Unit = 'Fakultas 7' AND Tahun_Anggaran = 2022"),
+    ("Jumlah kegiatan Fakultas 8 tahun 2023",
+     "SELECT COUNT(DISTINCT Kegiatan_Unit) FROM drauk_unit WHERE Nama_Unit = 'Fakultas 8' AND Tahun_Anggaran = 2023"),
+    ("Jumlah kegiatan Fakultas 10 tahun 2024",
+     "SELECT COUNT(*) FROM drauk_unit WHERE Nama_Unit = 'Fakultas 10' AND Tahun_Anggaran = 2024"),
+]
+
+# (pertanyaan, SQL literal yang setara atau None jika harus tidak cocok)
+CASES = [
+    ("berapa total anggaran Biro 9 tahun 2022",
+     "SELECT SUM(Jumlah) AS total FROM drauk_unit WHERE Nama_Unit = 'Biro 9' AND Tahun_Anggaran = 2022"),
+    ("Berapa total anggaran FAKULTAS 11 tahun 2024 ?",
+     "SELECT SUM(Jumlah) AS total FROM drauk_unit WHERE Nama_Unit = 'Fakultas 11' AND Tahun_Anggaran = 2024"),
+    ("Realisasi Program 10 per unit tahun 2023",
+     "SELECT Nama_Unit, SUM(Realisasi) AS realisasi FROM drauk_unit WHERE Program_Strategis = 'Program 10' "
+     "AND Tahun_Anggaran = 2023 GROUP BY Nama_Unit ORDER BY realisasi DESC"),
+    ("Berapa total anggaran Fakultas 1 tahun 2030?",
+     "SELECT SUM(Jumlah) AS total FROM drauk_unit WHERE Nama_Unit = 'Fakultas 1' AND Tahun_Anggaran = 2030"),
+    ("Berapa total anggaran Fakultas Kedokteran tahun 2023?", None),  # unit tidak dikenal
+    ("Berapa total anggaran Fakultas 1 dan Fakultas 2 tahun 2023?", None),  # bentuk lain
+    ("Berapa total anggaran tahun 2023?", None),
+    ("Sisa anggaran Biro 6 tahun 2024", None),  # belum terkonfirmasi
+    ("Kegiatan Fakultas 7 tahun 2022", None),  # tidak pernah dipelajari (LIKE)
+    ("Jumlah kegiatan Biro 0 tahun 2022", None),  # konflik bentuk SQL
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifikasi cache template SQL dengan data sintetis.")
+    parser.add_argument("--rows", type=int, default=20000, help="Jumlah baris data sintetis")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="sql-template-verify-")
+    db_path = os.path.join(workdir, "drauk.db")
+    # Environment harus di-set sebelum modul src diimpor (konfigurasi dibaca saat import)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "READONLY_DATABASE_URL": f"sqlite:///{db_path}",
+        "LOCAL_STORE_PATH": os.path.join(workdir, "local_store.sqlite3"),
+        "SQL_TEMPLATE_MIN_CONFIRMATIONS": "2",
+        "SQL_TEMPLATES_ENABLED": "true",
+    })
+
+    import pandas as pd
+    from sqlalchemy import create_engine, text
+    from verify_rollups import build_synthetic_db, frames_equal  # scripts/ ada di sys.path saat dijalankan langsung
+
+    url = build_synthetic_db(db_path, args.rows)
+    print(f"Database sintetis: {db_path} ({args.rows} baris)")
+
+    from src.db.executor import execute_sql_query
+    from src.services.sql_template_service import learn_sql_template, list_sql_templates, match_sql_template
+
+    for question, sql in LEARN:
+        learn_sql_template(question, sql, "verify")
+    print("Template:")
+    for template in list_sql_templates():
+        print(f"  [{template['confirmations']}x, konflik {template['conflicts']}] {template['template_key']}")
+        print(f"      {template['sql_template']}")
+
+    engine = create_engine(url)
+    failures = 0
+    for question, expected_sql in CASES:
+        start = time.perf_counter()
+        match = match_sql_template(question)
+        match_ms = (time.perf_counter() - start) * 1000
+        if expected_sql is None:
+            ok = match is None
+            print(f"  {'✓' if ok else '✗'}  tidak cocok ({match_ms:.2f} ms): {question}" + ("" if ok else f"\n     cocok: {match.sql}"))
+            failures += not ok
+            continue
+        if match is None:
+            print(f"  ✗  seharusnya cocok: {question}")
+            failures += 1
+            continue
+        result = execute_sql_query(match.sql_template, match.params)
+        with engine.connect() as connection:
+            expected = pd.read_sql_query(text(expected_sql), connection)
+        ok = not isinstance(result, str) and frames_equal(expected, result, "order by" in expected_sql.lower())
+        print(f"  {'✓' if ok else '✗'}  cocok ({match_ms:.2f} ms, {0 if isinstance(result, str) else len(result)} baris): "
+              f"{question}\n     {match.sql}")
+        failures += not ok
+
+    engine.dispose()
+    print(f"\n{len(CASES)} kasus, {failures} gagal")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import datetime
+import decimal
+import io
+import json
+import os
+from typing import Any, Dict, Iterator, List
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # dependensi opsional: pip install orjson
+    orjson = None
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.ipc  # type: ignore  # noqa: F401
+except ImportError:  # dependensi opsional: pip install pyarrow
+    pa = None
+
+# Format hasil yang bisa dinegosiasikan lewat query `?format=` atau header Accept.
+# "json" mempertahankan bentuk lama (raw_data sebagai list of records).
+FORMAT_JSON = "json"
+FORMAT_COLUMNAR = "columnar"
+FORMAT_NDJSON = "ndjson"
+FORMAT_ARROW = "arrow"
+FORMAT_CSV = "csv"
+FORMATS = (FORMAT_JSON, FORMAT_COLUMNAR, FORMAT_NDJSON, FORMAT_ARROW, FORMAT_CSV)
+
+MEDIA_TYPE_NDJSON = "application/x-ndjson"
+MEDIA_TYPE_ARROW = "application/vnd.apache.arrow.stream"
+MEDIA_TYPE_CSV = "text/csv"
+_ACCEPT_FORMATS = {
+    MEDIA_TYPE_NDJSON: FORMAT_NDJSON,
+    MEDIA_TYPE_ARROW: FORMAT_ARROW,
+    MEDIA_TYPE_CSV: FORMAT_CSV,
+}
+
+NDJSON_CHUNK_ROWS = int(os.getenv("NDJSON_CHUNK_ROWS", "500"))
+
+
+def _default(value: Any):
+    # Tipe dari MySQL/pandas yang tidak dikenal encoder JSON
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if hasattr(value, "item"):  # numpy scalar
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse yang diserialisasi dengan orjson (fallback ke json stdlib)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def negotiate_format(request: Request) -> str:
+    """`?format=` diutamakan, lalu header Accept; default json."""
+    requested = request.query_params.get("format", "").lower()
+    if requested in FORMATS:
+        return requested
+    for media_range in request.headers.get("accept", "").split(","):
+        fmt = _ACCEPT_FORMATS.get(media_range.split(";")[0].strip().lower())
+        if fmt:
+            return fmt
+    return FORMAT_JSON
+
+
+def records_to_columnar(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """List of records -> {columns, rows}: nama kolom hanya ditulis sekali."""
+    if not records:
+        return {"columns": [], "rows": []}
+    columns = list(records[0].keys())
+    return {"columns": columns, "rows": [[record.get(column) for column in columns] for record in records]}
+
+
+def _split_result(result: Any):
+    """(metadata, records) dari response pipeline (dict dengan raw_data) atau list of records (dashboard)."""
+    if isinstance(result, list):
+        return {}, result
+    records = result.get("raw_data")
+    if not isinstance(records, list):
+        return result, None
+    return {k: v for k, v in result.items() if k != "raw_data"}, records
+
+
+def _ndjson_lines(meta: Dict[str, Any], columnar: Dict[str, Any]) -> Iterator[bytes]:
+    # Baris pertama: metadata + nama kolom; baris berikutnya: satu baris data (array) per baris
+    yield dumps({**meta, "columns": columnar["columns"]}) + b"\n"
+    rows = columnar["rows"]
+    for start in range(0, len(rows), NDJSON_CHUNK_ROWS):
+        yield b"".join(dumps(row) + b"\n" for row in rows[start:start + NDJSON_CHUNK_ROWS])
+
+
+def _metadata_headers(meta: Dict[str, Any], records: List[Dict[str, Any]], filename: str) -> Dict[str, str]:
+    headers = {"X-Data-Count": str(len(records)), "Content-Disposition": f'attachment; filename="{filename}"'}
+    if meta.get("type"):
+        headers["X-Result-Type"] = str(meta["type"])
+    if meta.get("generated_sql"):
+        headers["X-Generated-SQL"] = quote(str(meta["generated_sql"]), safe="")
+    return headers
+
+
+def _to_csv(records: List[Dict[str, Any]]) -> bytes:
+    import pandas as pd
+    buffer = io.StringIO()
+    pd.DataFrame.from_records(records).to_csv(buffer, index=False)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _to_arrow(records: List[Dict[str, Any]]) -> bytes:
+    table = pa.Table.from_pylist(records)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def render_result(result: Any, fmt: str) -> Any:
+    """Merender hasil pipeline/dashboard sesuai format yang diminta. Response yang sudah jadi diteruskan apa adanya."""
+    if isinstance(result, Response) or result is None:
+        return result
+
+    meta, records = _split_result(result)
+    if records is None or fmt == FORMAT_JSON:
+        return FastJSONResponse(result)
+
+    if fmt == FORMAT_COLUMNAR:
+        columnar = records_to_columnar(records)
+        return FastJSONResponse(columnar if isinstance(result, list) else {**meta, "raw_data": columnar})
+    if fmt == FORMAT_NDJSON:
+        return StreamingResponse(_ndjson_lines(meta, records_to_columnar(records)), media_type=MEDIA_TYPE_NDJSON)
+    if fmt == FORMAT_CSV:
+        return Response(_to_csv(records), media_type=MEDIA_TYPE_CSV, headers=_metadata_headers(meta, records, "result.csv"))
+    if fmt == FORMAT_ARROW:
+        if pa is None:
+            return FastJSONResponse(
+                {"type": "FORMAT_UNAVAILABLE", "answer": "Format arrow membutuhkan pyarrow di server.", "format": fmt},
+                status_code=406,
+            )
+        return Response(_to_arrow(records), media_type=MEDIA_TYPE_ARROW, headers=_metadata_headers(meta, records, "result.arrow"))
+    return FastJSONResponse(result)
@@ -1,8 +1,13 @@
+import os
+from datetime import date
+from typing import Literal, Optional
+
 from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
-from src.schemas import QueryRequest, ContextualQueryRequest, NLToSQLRequestEndpoint
+from src.schemas import QueryRequest, ContextualQueryRequest, NLToSQLRequestEndpoint, BatchNLToSQLRequest
 from src.services.api_service import (
     generate_sql_only,
     route_and_generate_sql,
@@ -16,42 +21,154 @@ from src.services.openrouter_service import (
 # NLToSQLRequest
 from src.services.openrouter_service import NLToSQLRequest
 from src.services.api_service import NLToSQLGeminiRequest
+from src.db.config_mysql import get_pool_status
+from src.middleware.admission import (
+    ADMISSION,
+    LANE_BATCH,
+    LANE_INTERACTIVE,
+    AdmissionRejected,
+    charge_tokens,
+    check_token_budget,
+    estimate_response_tokens,
+)
+from src.api.response_formats import negotiate_format, render_result
+from src.utils import metrics
+from src.utils.hedging import hedge_stats
+from src.utils.profiling import get_profile_collapsed, is_admin_token, list_profiles, profiled_thread
+from src.utils.resilience import CircuitOpenError, DeadlineExceeded, breaker_states, deadline_settings, request_deadline
+from src.utils.tracing import get_logger
 
 router = APIRouter()
 
+logger = get_logger("router")
+
 limiter = Limiter(key_func=get_remote_address)
 
 
+def get_lane(request: Request) -> str:
+    """Lane admission: header `X-Priority: batch` untuk traffic non-interaktif."""
+    return LANE_BATCH if request.headers.get("X-Priority", "").lower() == LANE_BATCH else LANE_INTERACTIVE
+
+
+def run_admitted(lane: str, fn, nip: str = "", question: str = ""):
+    """Menjalankan pipeline lewat admission controller dan budget token per nip."""
+    try:
+        # Thread route ikut di-sample jika request di-profile (termasuk waktu tunggu admission)
+        with profiled_thread():
+            check_token_budget(nip)
+            # Deadline total request dihitung setelah lolos admission (waktu antre dibatasi admission sendiri)
+            with ADMISSION.admit(lane), request_deadline():
+                response = fn()
+    except AdmissionRejected as e:
+        answer = (
+            "Kuota token Anda untuk periode ini sudah habis."
+            if e.reason == "token_budget"
+            else "Server sedang sibuk, silakan coba beberapa saat lagi."
+        )
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"type": "REJECTED_BY_ADMISSION", "answer": answer, "reason": e.reason},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        # Pipeline Gemini/kontekstual tidak menangani dependensi yang down sendiri (OpenRouter sudah)
+        logger.error("Dependensi pipeline tidak tersedia", error=str(e))
+        headers = {"Retry-After": str(round(e.retry_after))} if isinstance(e, CircuitOpenError) else None
+        return JSONResponse(
+            status_code=503,
+            content={"type": "DEPENDENCY_UNAVAILABLE", "answer": "Layanan sedang mengalami gangguan, silakan coba beberapa saat lagi.", "error": str(e)},
+            headers=headers,
+        )
+
+    if isinstance(response, dict):
+        charge_tokens(nip, estimate_response_tokens(question, response))
+    return response
+
+
 @router.get("/", tags=["Health Check"], summary="🏥 Health Check")
 def read_root():
     return {"message": "🚀 NL-to-SQL API is running successfully!", "status": "healthy", "version": "1.0.0"}
 
+@router.get("/metrics", tags=["Monitoring"], summary="📈 Worker Metrics")
+def read_metrics():
+    snapshot = metrics.snapshot()
+    # Jumlah eksekusi pipeline yang dihemat karena request identik di-coalesce
+    snapshot["pipeline_runs_saved"] = sum(
+        v for k, v in snapshot["counters"].items() if k.startswith("singleflight.") and k.endswith(".shared")
+    )
+    snapshot["hedging"] = hedge_stats()
+    snapshot["db_pools"] = get_pool_status()
+    snapshot["admission"] = ADMISSION.status()
+    # Metrik bersifat per worker; pid membedakan snapshot dari worker yang berbeda
+    snapshot["worker_pid"] = os.getpid()
+    return snapshot
+
+@router.get("/health/breakers", tags=["Health Check"], summary="🔌 Circuit Breaker States")
+def read_breakers():
+    # State bersifat per worker (sama seperti /metrics)
+    return {"breakers": breaker_states(), "deadlines": deadline_settings(), "worker_pid": os.getpid()}
+
+def _forbidden():
+    return JSONResponse(status_code=403, content={"type": "FORBIDDEN", "answer": "Header X-Profile-Token tidak valid."})
+
+
+@router.get("/admin/profiles", tags=["Monitoring"], summary="🔬 List Request Profiles")
+def read_profiles(request: Request, limit: int = 50):
+    if not is_admin_token(request.headers.get("X-Profile-Token", "")):
+        return _forbidden()
+    return list_profiles(min(limit, 500))
+
+
+@router.get("/admin/profiles/{profile_id}", tags=["Monitoring"], summary="🔬 Download Request Profile (collapsed stacks)")
+def download_profile(profile_id: str, request: Request):
+    if not is_admin_token(request.headers.get("X-Profile-Token", "")):
+        return _forbidden()
+    collapsed = get_profile_collapsed(profile_id)
+    if collapsed is None:
+        return JSONResponse(status_code=404, content={"type": "NOT_FOUND", "answer": f"Profile {profile_id} tidak ditemukan."})
+    return Response(
+        collapsed,
+        media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+    )
+
 # GEMINI / LLM ENDPOINTS
 @router.post("/generate-sql-only", tags=["SQL Generation"], summary="🔧 Generate SQL Query Only")
 @limiter.limit("25/minute")
 def generate_sql(request_body: QueryRequest, request: Request):
-    return generate_sql_only(request_body.question, request_body.model)
+    return run_admitted(
+        get_lane(request),
+        lambda: generate_sql_only(request_body.question, request_body.model),
+        question=request_body.question,
+    )
 
 
 @router.post("/generate-sql-execute-analyze", tags=["Complete Workflow"])
 def ask(payload: NLToSQLRequestEndpoint, request: Request):
-    print("Received payload:", payload)
-    return route_and_generate_sql(
-        NLToSQLGeminiRequest(
-            question=payload.question,
-            model_name=payload.model_name,
-            unit=payload.unit,
-            nip=payload.nip
-        )
-    )
-
-
-# @router.post("/context-nl-to-sql", tags=["Conversational AI"], summary="💬 Contextual NL-to-SQL with Memory")
-# @limiter.limit("25/minute")
-# def ask_contextual(request_body: ContextualQueryRequest, request: Request):
-#     conversation_histories = {}
-#     formatted_history = ""
-#     return contextual_nl_to_sql(request_body.question, formatted_history)
+    logger.info("Payload diterima", question=payload.question, model=payload.model_name, unit=payload.unit)
+    return render_result(run_admitted(
+        get_lane(request),
+        lambda: route_and_generate_sql(
+            NLToSQLGeminiRequest(
+                question=payload.question,
+                model_name=payload.model_name,
+                unit=payload.unit,
+                nip=payload.nip
+            )
+        ),
+        nip=payload.nip,
+        question=payload.question,
+    ), negotiate_format(request))
+
+
+@router.post("/context-nl-to-sql", tags=["Conversational AI"], summary="💬 Contextual NL-to-SQL with Memory")
+@limiter.limit("25/minute")
+def ask_contextual(request_body: ContextualQueryRequest, request: Request):
+    return render_result(run_admitted(
+        get_lane(request),
+        lambda: contextual_nl_to_sql(request_body.question, request_body.conversation_id),
+        question=request_body.question,
+    ), negotiate_format(request))
 
 
 # OPENROUTER ENDPOINTS
@@ -61,26 +178,70 @@ def list_openrouter_models():
 
 @router.post("/openrouter/nl-to-sql", tags=["OpenRouter"], summary="🔧 NL-to-SQL with OpenRouter Models")
 def openrouter_nl_to_sql(payload: NLToSQLRequestEndpoint, request: Request):
-    print("Received payload:", payload)
-    return openrouter_nl_to_sql_workflow(
-        NLToSQLRequest(
-            question=payload.question,
-            model_name=payload.model_name,
-            unit=payload.unit,
-            nip=payload.nip
-        )
-    )
+    logger.info("Payload diterima", question=payload.question, model=payload.model_name, unit=payload.unit)
+    return render_result(run_admitted(
+        get_lane(request),
+        lambda: openrouter_nl_to_sql_workflow(
+            NLToSQLRequest(
+                question=payload.question,
+                model_name=payload.model_name,
+                unit=payload.unit,
+                nip=payload.nip
+            )
+        ),
+        nip=payload.nip,
+        question=payload.question,
+    ), negotiate_format(request))
+
+# BATCH ENDPOINTS
+from src.services.batch_service import submit_batch_job, get_batch_job, stream_batch_job
+@router.post("/openrouter/batch", tags=["Batch"], summary="📦 Submit Batch NL-to-SQL Job")
+def submit_batch(payload: BatchNLToSQLRequest):
+    return submit_batch_job(payload)
+
+@router.get("/openrouter/batch/{job_id}", tags=["Batch"], summary="📦 Poll Batch Job")
+def read_batch(job_id: str, offset: int = 0, limit: int = 100):
+    job = get_batch_job(job_id, offset, limit)
+    if job is None:
+        return JSONResponse(status_code=404, content={"type": "NOT_FOUND", "job_id": job_id})
+    return job
+
+@router.get("/openrouter/batch/{job_id}/stream", tags=["Batch"], summary="📦 Stream Batch Results (NDJSON)")
+def stream_batch(job_id: str):
+    return StreamingResponse(stream_batch_job(job_id), media_type="application/x-ndjson")
 
 # API DASHBOARD
-from src.services.dashboard_service import get_all_trx_pertanyaan_service, get_trx_pertanyaan_by_nip_service, get_trx_pertanyaan_by_id_service
+from src.services.dashboard_service import get_all_trx_pertanyaan_service, get_trx_pertanyaan_by_nip_service, get_trx_pertanyaan_by_id_service, search_trx_pertanyaan_service
 @router.get("/dashboard/getall", tags=["Dashboard"], summary="📊 Get All Questions")
-def get_all_questions(limit: int = 300):
-    return get_all_trx_pertanyaan_service(limit)
+def get_all_questions(request: Request, limit: int = 300):
+    return render_result(run_admitted(LANE_BATCH, lambda: get_all_trx_pertanyaan_service(limit)), negotiate_format(request))
 
 @router.get("/dashboard/getbynip/{nip}", tags=["Dashboard"], summary="📊 Get Questions by NIP")
-def get_questions_by_nip(nip: int):
-    return get_trx_pertanyaan_by_nip_service(nip)
+def get_questions_by_nip(nip: int, request: Request):
+    return render_result(run_admitted(LANE_BATCH, lambda: get_trx_pertanyaan_by_nip_service(nip)), negotiate_format(request))
+
+@router.get("/dashboard/search", tags=["Dashboard"], summary="🔎 Full-Text Search Question History")
+def search_questions_history(
+    q: str,
+    unit: Optional[str] = None,
+    nip: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    page: int = 1,
+    page_size: int = 20,
+    mode: Literal["all", "any"] = "all",
+):
+    result = run_admitted(
+        LANE_BATCH,
+        lambda: search_trx_pertanyaan_service(q, unit, nip, date_from, date_to, page, page_size, mode),
+    )
+    if result is None:
+        return JSONResponse(
+            status_code=400,
+            content={"type": "INVALID_QUERY", "answer": "Query pencarian kosong setelah stopword dibuang."},
+        )
+    return result
 
 @router.get("/dashboard/getbyid/{id}", tags=["Dashboard"], summary="📊 Get Questions by ID Question")
 def get_questions_by_id(id: int):
-    return get_trx_pertanyaan_by_id_service(id)
\ No newline at end of file
+    return run_admitted(LANE_BATCH, lambda: get_trx_pertanyaan_by_id_service(id))
\ No newline at end of file
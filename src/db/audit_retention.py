@@ -0,0 +1,133 @@
+import os
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Engine
+
+from src.db.config_mysql import get_engine, timed_connect
+from src.utils.tracing import get_logger
+
+load_dotenv()
+
+logger = get_logger("audit_retention")
+
+# Retensi trx_pertanyaan: baris yang lebih tua dari AUDIT_RETENTION_MONTHS bulan penuh dipindahkan ke tabel arsip
+# per bulan (trx_pertanyaan_archive_YYYYMM), sehingga tabel utama yang dibaca dashboard tetap kecil.
+# Perpindahan dilakukan per batch id; INSERT ke arsip dan DELETE dari tabel utama ada di satu transaksi.
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "6"))
+AUDIT_ARCHIVE_BATCH = int(os.getenv("AUDIT_ARCHIVE_BATCH", "2000"))
+
+SOURCE_TABLE = "trx_pertanyaan"
+ARCHIVE_PREFIX = "trx_pertanyaan_archive_"
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + (day.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def retention_cutoff(months: int, today: Optional[date] = None) -> date:
+    """Awal bulan batas retensi: bulan berjalan + `months` bulan sebelumnya tetap di tabel utama."""
+    return _add_months((today or date.today()).replace(day=1), -months)
+
+
+def archive_table_name(month: date) -> str:
+    return f"{ARCHIVE_PREFIX}{month:%Y%m}"
+
+
+def _ensure_archive_table(connection, engine: Engine, name: str):
+    if engine.dialect.name == "mysql":
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS `{name}` LIKE `{SOURCE_TABLE}`"))
+    else:
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS `{name}` AS SELECT * FROM `{SOURCE_TABLE}` WHERE 1 = 0"))
+
+
+def _as_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)).date()
+
+
+def archive_old_rows(
+    months: int = AUDIT_RETENTION_MONTHS,
+    engine: Optional[Engine] = None,
+    batch_size: int = AUDIT_ARCHIVE_BATCH,
+    dry_run: bool = False,
+    today: Optional[date] = None,
+) -> Dict[str, Any]:
+    """Memindahkan baris dengan udcr < cutoff ke tabel arsip bulanannya; mengembalikan ringkasan per bulan."""
+    engine = engine or get_engine()
+    cutoff = retention_cutoff(months, today)
+    summary: Dict[str, Any] = {"cutoff": cutoff.isoformat(), "dry_run": dry_run, "months": []}
+
+    with timed_connect(engine, "primary") as connection:
+        oldest = connection.execute(
+            text(f"SELECT MIN(udcr) FROM `{SOURCE_TABLE}` WHERE udcr < :cutoff"), {"cutoff": cutoff}
+        ).scalar()
+        if oldest is None:
+            return summary
+
+        month = _as_date(oldest).replace(day=1)
+        while month < cutoff:
+            next_month = _add_months(month, 1)
+            bounds = {"start": month, "end": next_month}
+            name = archive_table_name(month)
+            start = time.perf_counter()
+
+            if dry_run:
+                count = connection.execute(
+                    text(f"SELECT COUNT(*) FROM `{SOURCE_TABLE}` WHERE udcr >= :start AND udcr < :end"), bounds
+                ).scalar()
+                if count:
+                    summary["months"].append({"table": name, "rows": count})
+                month = next_month
+                continue
+
+            moved = 0
+            select_ids = text(
+                f"SELECT id_pertanyaan FROM `{SOURCE_TABLE}` WHERE udcr >= :start AND udcr < :end "
+                "ORDER BY id_pertanyaan LIMIT :limit"
+            )
+            copy_rows = text(
+                f"INSERT INTO `{name}` SELECT * FROM `{SOURCE_TABLE}` WHERE id_pertanyaan IN :ids"
+            ).bindparams(bindparam("ids", expanding=True))
+            delete_rows = text(
+                f"DELETE FROM `{SOURCE_TABLE}` WHERE id_pertanyaan IN :ids"
+            ).bindparams(bindparam("ids", expanding=True))
+
+            while True:
+                ids: List[int] = [row[0] for row in connection.execute(select_ids, {**bounds, "limit": batch_size})]
+                if not ids:
+                    break
+                if moved == 0:
+                    _ensure_archive_table(connection, engine, name)
+                connection.execute(copy_rows, {"ids": ids})
+                connection.execute(delete_rows, {"ids": ids})
+                connection.commit()
+                moved += len(ids)
+
+            if moved:
+                seconds = round(time.perf_counter() - start, 2)
+                summary["months"].append({"table": name, "rows": moved, "seconds": seconds})
+                logger.info("Arsip trx_pertanyaan", table=name, rows=moved, seconds=seconds)
+            month = next_month
+
+    return summary
+
+
+def list_archive_tables(engine: Optional[Engine] = None) -> List[str]:
+    engine = engine or get_engine()
+    with timed_connect(engine, "primary") as connection:
+        if engine.dialect.name == "mysql":
+            rows = connection.execute(text("SHOW TABLES LIKE :pattern"), {"pattern": f"{ARCHIVE_PREFIX}%"})
+        else:
+            rows = connection.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :pattern"),
+                {"pattern": f"{ARCHIVE_PREFIX}%"},
+            )
+        return sorted(row[0] for row in rows)
@@ -0,0 +1,104 @@
+import base64
+import hashlib
+import os
+import zlib
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from src.utils import metrics
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # dependensi opsional: pip install zstandard (fallback zlib)
+    zstandard = None
+
+load_dotenv()
+
+# Penyimpanan field teks besar di trx_pertanyaan (output_data_raw = to_string() hasil query, output_analisa).
+#   raw      : disimpan apa adanya (perilaku lama, default)
+#   compress : teks >= AUDIT_COMPRESS_MIN_BYTES dikompresi (zstd, fallback zlib) lalu base64 dengan prefix penanda;
+#              dibuka kembali secara transparan oleh fungsi baca di trx_pertanyaan_repo
+#   cap      : teks dipotong ke AUDIT_CAP_CHARS karakter + penanda berisi panjang asli dan sha256 isi lengkap
+# Nilai lama (tanpa prefix) tetap terbaca, sehingga mode bisa diganti kapan saja.
+AUDIT_STORAGE_MODE = os.getenv("AUDIT_STORAGE_MODE", "raw").lower()
+AUDIT_COMPRESSION = os.getenv("AUDIT_COMPRESSION", "zstd" if zstandard is not None else "zlib").lower()
+AUDIT_COMPRESS_MIN_BYTES = int(os.getenv("AUDIT_COMPRESS_MIN_BYTES", "4096"))
+AUDIT_COMPRESSION_LEVEL = int(os.getenv("AUDIT_COMPRESSION_LEVEL", "6"))
+AUDIT_CAP_CHARS = int(os.getenv("AUDIT_CAP_CHARS", "4000"))
+
+AUDIT_TEXT_FIELDS = ("output_data_raw", "output_analisa")
+
+_ZSTD_PREFIX = "~zstd1:"
+_ZLIB_PREFIX = "~zlib1:"
+_CAP_MARKER = "\n…[dipotong: {length} karakter, sha256={digest}]"
+
+
+def _compress(data: bytes) -> Optional[str]:
+    if AUDIT_COMPRESSION == "zstd" and zstandard is not None:
+        payload = zstandard.ZstdCompressor(level=AUDIT_COMPRESSION_LEVEL).compress(data)
+        prefix = _ZSTD_PREFIX
+    else:
+        payload = zlib.compress(data, AUDIT_COMPRESSION_LEVEL)
+        prefix = _ZLIB_PREFIX
+    encoded = prefix + base64.b64encode(payload).decode("ascii")
+    # Teks yang sulit dikompresi tetap disimpan apa adanya
+    return encoded if len(encoded) < len(data) else None
+
+
+def content_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def encode_audit_text(value: Optional[str]) -> Optional[str]:
+    """Nilai yang disimpan ke kolom audit sesuai AUDIT_STORAGE_MODE."""
+    if not value or AUDIT_STORAGE_MODE == "raw":
+        return value
+    if AUDIT_STORAGE_MODE == "cap":
+        if len(value) <= AUDIT_CAP_CHARS:
+            return value
+        metrics.incr("audit.capped")
+        return value[:AUDIT_CAP_CHARS] + _CAP_MARKER.format(length=len(value), digest=content_hash(value))
+
+    data = value.encode("utf-8")
+    if len(data) < AUDIT_COMPRESS_MIN_BYTES:
+        return value
+    encoded = _compress(data)
+    if encoded is None:
+        return value
+    metrics.incr("audit.compressed")
+    metrics.observe("audit.compression_ratio", len(data) / len(encoded))
+    return encoded
+
+
+def decode_audit_text(value: Any) -> Any:
+    """Kebalikan encode_audit_text untuk nilai terkompresi; nilai lain (termasuk hasil cap) dikembalikan apa adanya."""
+    if not isinstance(value, str) or not value.startswith("~z"):
+        return value
+    try:
+        if value.startswith(_ZSTD_PREFIX):
+            if zstandard is None:
+                raise RuntimeError("paket zstandard tidak terpasang")
+            data = zstandard.ZstdDecompressor().decompress(base64.b64decode(value[len(_ZSTD_PREFIX):]))
+        elif value.startswith(_ZLIB_PREFIX):
+            data = zlib.decompress(base64.b64decode(value[len(_ZLIB_PREFIX):]))
+        else:
+            return value
+    except Exception:
+        metrics.incr("audit.decode_errors")
+        return value
+    return data.decode("utf-8")
+
+
+def encode_audit_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    for field in AUDIT_TEXT_FIELDS:
+        if field in row:
+            row[field] = encode_audit_text(row[field])
+    return row
+
+
+def decode_audit_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    for field in AUDIT_TEXT_FIELDS:
+        if field in row:
+            row[field] = decode_audit_text(row[field])
+    return row
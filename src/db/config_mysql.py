@@ -1,6 +1,11 @@
 import os
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+from src.utils import metrics
 
 load_dotenv()
 
@@ -12,12 +17,86 @@ DB_USERNAME = os.getenv("DB_USERNAME", "")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 
 # Format URL koneksi SQLAlchemy untuk MySQL dengan PyMySQL
-DATABASE_URL = f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
+DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
+
+# --- Engine read-only untuk SQL hasil LLM (bisa diarahkan ke read replica) ---
+# Default ke kredensial primary jika DB_READ_* tidak di-set.
+DB_READ_HOST = os.getenv("DB_READ_HOST", DB_HOST)
+DB_READ_PORT = os.getenv("DB_READ_PORT", DB_PORT)
+DB_READ_DATABASE = os.getenv("DB_READ_DATABASE", DB_DATABASE)
+DB_READ_USERNAME = os.getenv("DB_READ_USERNAME", DB_USERNAME)
+DB_READ_PASSWORD = os.getenv("DB_READ_PASSWORD", DB_PASSWORD)
+_DB_READ_ENV = ("DB_READ_HOST", "DB_READ_PORT", "DB_READ_DATABASE", "DB_READ_USERNAME", "DB_READ_PASSWORD")
+# Tanpa READONLY_DATABASE_URL maupun DB_READ_*: sama dengan DATABASE_URL (termasuk jika DATABASE_URL di-set langsung)
+READONLY_DATABASE_URL = os.getenv("READONLY_DATABASE_URL") or (
+    f"mysql+pymysql://{DB_READ_USERNAME}:{DB_READ_PASSWORD}@{DB_READ_HOST}:{DB_READ_PORT}/{DB_READ_DATABASE}"
+    if any(os.getenv(name) for name in _DB_READ_ENV) else DATABASE_URL
+)
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "5"))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", "5"))
+DB_READ_POOL_RECYCLE = int(os.getenv("DB_READ_POOL_RECYCLE", "1800"))
+DB_READ_POOL_TIMEOUT = float(os.getenv("DB_READ_POOL_TIMEOUT", "10"))
+# Batas waktu per SELECT di MySQL (ms); 0 = tanpa batas
+DB_READ_MAX_EXECUTION_TIME_MS = int(os.getenv("DB_READ_MAX_EXECUTION_TIME_MS", "0"))
 
 # Buat engine SQLAlchemy yang dapat digunakan di seluruh aplikasi
 # Mengaktifkan pool_pre_ping agar koneksi dead/closed otomatis di-refresh
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 
+# Pool terpisah: query analitik yang lambat tidak bisa menghabiskan koneksi untuk audit/dashboard
+readonly_engine = create_engine(
+    READONLY_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=DB_READ_POOL_SIZE,
+    max_overflow=DB_READ_MAX_OVERFLOW,
+    pool_recycle=DB_READ_POOL_RECYCLE,
+    pool_timeout=DB_READ_POOL_TIMEOUT,
+)
+
+
+@event.listens_for(readonly_engine, "connect")
+def _set_session_read_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        if readonly_engine.dialect.name == "mysql":
+            cursor.execute("SET SESSION TRANSACTION READ ONLY")
+            if DB_READ_MAX_EXECUTION_TIME_MS > 0:
+                cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {DB_READ_MAX_EXECUTION_TIME_MS}")
+        elif readonly_engine.dialect.name == "sqlite":
+            cursor.execute("PRAGMA query_only = ON")
+    finally:
+        cursor.close()
+
+
 def get_engine():
     """Kembalikan engine SQLAlchemy (helper)."""
     return engine
+
+
+def get_readonly_engine():
+    """Engine read-only untuk mengeksekusi SQL yang dihasilkan LLM."""
+    return readonly_engine
+
+
+@contextmanager
+def timed_connect(db_engine: Engine, pool_name: str):
+    """`engine.connect()` yang mencatat lama menunggu checkout koneksi dari pool."""
+    start = time.perf_counter()
+    connection = db_engine.connect()
+    metrics.observe(f"db.{pool_name}.checkout_wait_ms", (time.perf_counter() - start) * 1000)
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+def get_pool_status():
+    """Status pool primary dan read-only untuk endpoint /metrics."""
+    status = {}
+    for name, db_engine in (("primary", engine), ("readonly", readonly_engine)):
+        pool = db_engine.pool
+        status[name] = {
+            "status": pool.status(),
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        }
+    return status
@@ -1,20 +1,41 @@
+import asyncio
 import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http import models as rest
+
+from src.utils import metrics
+from src.utils.tracing import get_logger
 
 load_dotenv()
-# --- Qdrant configuration with sensible defaults --- GRPC off
+
+logger = get_logger("config_qdrant")
+
+# --- Qdrant configuration with sensible defaults ---
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-QDRANT_PREFER_GRPC = False
+# gRPC (QDRANT_GRPC_PORT) has less per-call overhead than REST for the small, frequent schema searches
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT_S = float(os.getenv("QDRANT_TIMEOUT_S", "5"))
+# HNSW ef used for every search (0 = collection default); higher = better recall, slower
+QDRANT_SEARCH_EF = int(os.getenv("QDRANT_SEARCH_EF", "64"))
+QDRANT_WARMUP_ENABLED = os.getenv("QDRANT_WARMUP_ENABLED", "true").lower() == "true"
+# Payload key LangChain (and scripts/ingest_schema.py) stores document metadata under
+QDRANT_METADATA_KEY = "metadata"
 
 
 def get_qdrant_client() -> QdrantClient:
-    """Return a configured QdrantClient. Currently forces REST (HTTP) mode.
-
-    If you want to enable gRPC later, change QDRANT_PREFER_GRPC to True or update this helper.
-    """
-    return QdrantClient(url=QDRANT_URL, prefer_grpc=False, api_key=QDRANT_API_KEY)
+    """Return a configured synchronous QdrantClient (gRPC if QDRANT_PREFER_GRPC, otherwise REST)."""
+    return QdrantClient(
+        url=QDRANT_URL, prefer_grpc=QDRANT_PREFER_GRPC, grpc_port=QDRANT_GRPC_PORT,
+        api_key=QDRANT_API_KEY, timeout=QDRANT_TIMEOUT_S,
+    )
 
 
 def get_qdrant_settings():
@@ -22,4 +43,111 @@ def get_qdrant_settings():
         "url": QDRANT_URL,
         "collection": os.getenv("QDRANT_COLLECTION", "schema_vectors"),
         "prefer_grpc": QDRANT_PREFER_GRPC,
+        "grpc_port": QDRANT_GRPC_PORT,
+        "search_ef": QDRANT_SEARCH_EF,
     }
+
+
+def payload_filter(must: Optional[Dict[str, Any]] = None) -> Optional[rest.Filter]:
+    """{"kind": "column", "table": ["a", "b"]} -> metadata.kind == "column" AND metadata.table IN ("a", "b")."""
+    if not must:
+        return None
+    conditions = []
+    for key, value in must.items():
+        match = rest.MatchAny(any=list(value)) if isinstance(value, (list, tuple, set)) else rest.MatchValue(value=value)
+        conditions.append(rest.FieldCondition(key=f"{QDRANT_METADATA_KEY}.{key}", match=match))
+    return rest.Filter(must=conditions)
+
+
+class AsyncQdrantRunner:
+    """
+    One AsyncQdrantClient per worker, bound to its own event loop running in a daemon thread.
+    Request threads (sync FastAPI routes) submit searches with `run`; they all share one gRPC channel /
+    HTTP connection pool instead of each LangChain wrapper call going through the sync client.
+    """
+
+    def __init__(self, **client_kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="qdrant-async", daemon=True)
+        self._thread.start()
+        try:
+            # grpc.aio channels are bound to the loop they are created on
+            self.client: AsyncQdrantClient = self.run(self._create(client_kwargs))
+        except BaseException:
+            self._stop_loop()
+            raise
+
+    @staticmethod
+    async def _create(client_kwargs: Dict[str, Any]) -> AsyncQdrantClient:
+        return AsyncQdrantClient(**client_kwargs)
+
+    def run(self, coroutine, timeout: Optional[float] = QDRANT_TIMEOUT_S):
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def search(self, collection: str, vector: List[float], limit: int, must: Optional[Dict[str, Any]] = None,
+               ef: int = QDRANT_SEARCH_EF, timeout: Optional[float] = QDRANT_TIMEOUT_S) -> List[rest.ScoredPoint]:
+        start = time.perf_counter()
+        response = self.run(self.client.query_points(
+            collection_name=collection,
+            query=vector,
+            query_filter=payload_filter(must),
+            search_params=rest.SearchParams(hnsw_ef=ef) if ef > 0 else None,
+            limit=limit,
+            with_payload=True,
+        ), timeout)
+        metrics.observe("qdrant.search_ms", (time.perf_counter() - start) * 1000)
+        return response.points
+
+    def _stop_loop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(QDRANT_TIMEOUT_S)
+        if not self._thread.is_alive():
+            self._loop.close()
+
+    def close(self):
+        try:
+            self.run(self.client.close())
+        finally:
+            self._stop_loop()
+
+
+@lru_cache(maxsize=1)
+def get_async_qdrant() -> AsyncQdrantRunner:
+    """Per-worker async client configured from the QDRANT_* environment (created on first use)."""
+    return AsyncQdrantRunner(
+        url=QDRANT_URL, prefer_grpc=QDRANT_PREFER_GRPC, grpc_port=QDRANT_GRPC_PORT,
+        api_key=QDRANT_API_KEY, timeout=QDRANT_TIMEOUT_S,
+    )
+
+
+def close_async_qdrant():
+    """Close the per-worker async client if it was created (FastAPI shutdown handler)."""
+    if get_async_qdrant.cache_info().currsize:
+        runner = get_async_qdrant()
+        get_async_qdrant.cache_clear()
+        runner.close()
+
+
+def search_points(vector: List[float], limit: int, must: Optional[Dict[str, Any]] = None,
+                  collection: Optional[str] = None) -> List[rest.ScoredPoint]:
+    """Filtered vector search on the schema collection through the per-worker async client."""
+    return get_async_qdrant().search(collection or get_qdrant_settings()["collection"], vector, limit, must)
+
+
+def warm_qdrant(vector: List[float], kinds: tuple = ("table", "column"), collection: Optional[str] = None) -> float:
+    """
+    Open the connection / gRPC channel and page in the HNSW graph and payload indexes with one filtered search
+    per point kind, so the first request does not pay for it. Returns the elapsed milliseconds.
+    """
+    start = time.perf_counter()
+    for kind in kinds:
+        search_points(vector, 1, {"kind": kind}, collection)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    metrics.observe("qdrant.warmup_ms", elapsed_ms)
+    logger.info("Qdrant warmup selesai", elapsed_ms=round(elapsed_ms, 1), grpc=QDRANT_PREFER_GRPC)
+    return elapsed_ms
@@ -0,0 +1,32 @@
+import hashlib
+
+from sqlalchemy import text
+
+from src.db.config_mysql import get_readonly_engine, timed_connect
+
+# Ringkasan isi drauk_unit; berubah jika data di-load ulang / diperbarui (termasuk kolom teks seperti Nama_Unit).
+# Dipakai untuk menandai turunan data (precomputed answers, rollup, nilai entitas) yang sudah basi.
+# MySQL: CHECKSUM TABLE (semua kolom, satu scan di server). Dialek lain (SQLite salinan/sintetis di scripts/):
+# jumlah hash per baris dihitung di sini, tidak bergantung urutan baris.
+DATA_FINGERPRINT_SQL = text("CHECKSUM TABLE drauk_unit")
+DATA_ROWS_SQL = text("SELECT * FROM drauk_unit")
+
+
+def _row_checksum(connection) -> tuple:
+    count, total = 0, 0
+    for row in connection.execute(DATA_ROWS_SQL):
+        digest = hashlib.sha256(repr(tuple(row)).encode("utf-8")).digest()
+        total = (total + int.from_bytes(digest[:8], "big")) % (1 << 64)
+        count += 1
+    return count, total
+
+
+def get_data_fingerprint(engine=None) -> str:
+    """Hash isi drauk_unit, default lewat engine read-only."""
+    engine = engine or get_readonly_engine()
+    with timed_connect(engine, "readonly") as connection:
+        if engine.dialect.name == "mysql":
+            row = tuple(connection.execute(DATA_FINGERPRINT_SQL).fetchone())
+        else:
+            row = _row_checksum(connection)
+    return hashlib.sha256(repr(row).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from src.db.config_mysql import get_readonly_engine, timed_connect
+from src.db.data_version import get_data_fingerprint
+from src.utils import metrics
+from src.utils.schema_spec import get_column_names
+from src.utils.tracing import get_logger
+
+load_dotenv()
+
+logger = get_logger("entity_values")
+
+# Nilai distinct kolom kategorikal drauk_unit (unit, program, sasaran, kegiatan, ...) untuk mengenali nilai yang disebut
+# di pertanyaan dan memperbaiki literal SQL. Dibaca lewat engine read-only dan di-cache per worker; setiap
+# ENTITY_VALUES_TTL_S detik fingerprint data dicek di background dan nilai dimuat ulang hanya jika data berubah.
+# Kolom dengan nilai distinct lebih dari ENTITY_VALUES_MAX dianggap bukan kolom kategorikal dan dilewati.
+ENTITY_VALUE_COLUMNS = [
+    c.strip() for c in os.getenv(
+        "ENTITY_VALUE_COLUMNS", "Nama_Unit,Program_Strategis,Sasaran_Strategis,Kegiatan_Unit,Tipe_Unit"
+    ).split(",") if c.strip()
+]
+ENTITY_VALUES_TTL_S = float(os.getenv("ENTITY_VALUES_TTL_S", "600"))
+ENTITY_VALUES_MAX = int(os.getenv("ENTITY_VALUES_MAX", "5000"))
+ENTITY_VALUES_RETRY_S = float(os.getenv("ENTITY_VALUES_RETRY_S", "60"))
+
+SOURCE_TABLE = "drauk_unit"
+
+
+def _load_values(engine: Engine, columns: List[str]) -> Dict[str, List[str]]:
+    values: Dict[str, List[str]] = {}
+    with timed_connect(engine, "readonly") as connection:
+        for column in columns:
+            rows = connection.execute(text(
+                f"SELECT DISTINCT `{column}` FROM `{SOURCE_TABLE}` WHERE `{column}` IS NOT NULL LIMIT :limit"
+            ), {"limit": ENTITY_VALUES_MAX + 1}).fetchall()
+            if len(rows) > ENTITY_VALUES_MAX:
+                logger.warning("Kolom entitas dilewati, nilai distinct terlalu banyak", column=column)
+                continue
+            values[column] = sorted({str(row[0]).strip() for row in rows if str(row[0]).strip()})
+    return values
+
+
+class _EntityValueCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._values: Dict[str, List[str]] = {}
+        self._version = 0
+        self._data_version: Optional[str] = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._refreshing = False
+
+    def refresh(self, engine: Optional[Engine] = None, force: bool = False):
+        """Memuat ulang nilai jika fingerprint drauk_unit berubah (atau force / belum pernah dimuat)."""
+        with self._load_lock:
+            failed = False
+            try:
+                engine = engine or get_readonly_engine()
+                data_version = get_data_fingerprint(engine)
+                if force or not self._loaded or data_version != self._data_version:
+                    # Hanya nama kolom dari whitelist skema yang boleh masuk ke SQL
+                    known = set(get_column_names(SOURCE_TABLE))
+                    start = time.perf_counter()
+                    values = _load_values(engine, [c for c in ENTITY_VALUE_COLUMNS if c in known])
+                    metrics.observe("entity_values.load_ms", (time.perf_counter() - start) * 1000)
+                    with self._lock:
+                        if values != self._values:
+                            self._version += 1
+                        self._values = values
+                        self._data_version = data_version
+                        self._loaded = True
+                    logger.info("Nilai entitas dimuat", columns=len(values), values=sum(len(v) for v in values.values()))
+            except Exception as e:
+                failed = True
+                metrics.incr("entity_values.load_errors")
+                logger.warning("Gagal memuat nilai entitas", error=str(e))
+            finally:
+                with self._lock:
+                    # Setelah gagal, dicoba lagi paling lama ENTITY_VALUES_RETRY_S kemudian (bukan satu TTL penuh)
+                    retry_in = min(ENTITY_VALUES_RETRY_S, ENTITY_VALUES_TTL_S) if failed else ENTITY_VALUES_TTL_S
+                    self._checked_at = time.monotonic() - ENTITY_VALUES_TTL_S + retry_in
+                    self._refreshing = False
+
+    def get(self, engine: Optional[Engine] = None) -> Dict[str, List[str]]:
+        with self._lock:
+            if time.monotonic() - self._checked_at < ENTITY_VALUES_TTL_S:
+                return self._values
+            if self._loaded:
+                # Nilai lama tetap dipakai selama pengecekan di background
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self.refresh, args=(engine,), name="entity-values-refresh", daemon=True).start()
+                return self._values
+        self.refresh(engine)  # pemuatan pertama: sinkron
+        return self._values
+
+    def invalidate(self):
+        with self._lock:
+            self._checked_at = 0.0
+
+    @property
+    def version(self) -> int:
+        """Naik setiap kali isi nilai berubah; dipakai turunan (regex, index) untuk tahu kapan harus dibangun ulang."""
+        return self._version
+
+
+_cache = _EntityValueCache()
+
+
+def get_entity_values(engine: Optional[Engine] = None) -> Dict[str, List[str]]:
+    """{kolom: [nilai distinct]} untuk ENTITY_VALUE_COLUMNS."""
+    return _cache.get(engine)
+
+
+def get_entity_values_version() -> int:
+    return _cache.version
+
+
+def refresh_entity_values(engine: Optional[Engine] = None, force: bool = False):
+    _cache.refresh(engine, force)
+
+
+def invalidate_entity_values():
+    _cache.invalidate()
@@ -1,20 +1,65 @@
+import time
+from typing import Any, Dict, Optional
 import pandas as pd
 from sqlalchemy import text
-from src.db.config_mysql import get_engine
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from src.db.config_mysql import get_readonly_engine, timed_connect
+from src.utils import metrics
+from src.utils.resilience import CircuitOpenError, DeadlineExceeded, get_breaker, guarded_call
+from src.utils.tracing import get_logger, span
 
-engine = get_engine()
+logger = get_logger("executor")
 
-def execute_sql_query(query: str):
+# SQL hasil LLM selalu lewat engine read-only (pool terpisah dari audit/dashboard)
+engine = get_readonly_engine()
+
+READONLY_BREAKER = "mysql.readonly"
+# Kode error MySQL yang berarti server tidak tersedia / kelebihan beban (bukan kesalahan SQL dari LLM)
+_UNAVAILABLE_ERROR_CODES = {1040, 1205, 2002, 2003, 2006, 2013}
+
+
+def is_database_unavailable(error: BaseException) -> bool:
+    """Hanya error koneksi/pool yang dihitung breaker; SQL yang salah tidak membuka breaker."""
+    if isinstance(error, PoolTimeoutError):
+        return True
+    if isinstance(error, DBAPIError):
+        if error.connection_invalidated:
+            return True
+        args = getattr(error.orig, "args", None) or (None,)
+        return args[0] in _UNAVAILABLE_ERROR_CODES
+    return False
+
+
+def execute_sql_query(query: str, params: Optional[Dict[str, Any]] = None):
     """
     Mengeksekusi query SQL dan mengembalikan hasilnya sebagai
     DataFrame Pandas atau sebuah string error.
+    CircuitOpenError/DeadlineExceeded diteruskan: MySQL tidak tersedia bukan kesalahan SQL, jadi pemanggil
+    tidak boleh mengeskalasi ke model lain.
+    `params` untuk query dengan bound parameter (:nama), mis. SQL dari template.
     """
-    print(f"Mengeksekusi query: {query}")
-    try:
-        with engine.connect() as connection:
-            result_df = pd.read_sql_query(sql=text(query), con=connection)
-            return result_df 
-            
-    except Exception as e:
-        print(f"Error saat eksekusi SQL: {e}")
-        return f"Terjadi error saat eksekusi SQL: {str(e)}"
\ No newline at end of file
+    with span("execute", **{"db.system": engine.dialect.name, "db.statement": query}) as execute_span:
+        def run():
+            with timed_connect(engine, "readonly") as connection:
+                start = time.perf_counter()
+                result_df = pd.read_sql_query(sql=text(query), con=connection, params=params)
+                metrics.observe("db.readonly.query_ms", (time.perf_counter() - start) * 1000)
+                return result_df
+
+        try:
+            # Breaker + deadline stage `execute`: saat MySQL bermasalah request gagal cepat
+            result_df = guarded_call([get_breaker(READONLY_BREAKER, is_database_unavailable)], "execute", run)
+            if execute_span is not None:
+                execute_span.set(**{"db.rows": len(result_df)})
+            return result_df
+
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            if execute_span is not None:
+                execute_span.set_error(e)
+            raise
+
+        except Exception as e:
+            if execute_span is not None:
+                execute_span.set_error(e)
+            logger.error("Error saat eksekusi SQL", error=str(e), query=query)
+            return f"Terjadi error saat eksekusi SQL: {str(e)}"
\ No newline at end of file
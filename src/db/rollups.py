@@ -0,0 +1,317 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import sqlparse
+from dotenv import load_dotenv
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlparse.tokens import Keyword, Name, Newline, Operator, Punctuation, Whitespace, Wildcard
+
+from src.db.config_mysql import get_engine, get_readonly_engine, timed_connect
+from src.db.data_version import get_data_fingerprint
+from src.utils import metrics
+
+load_dotenv()
+
+# Rollup drauk_unit per Tahun_Anggaran mengikuti hierarki YAML (Sasaran_Strategis -> Program_Strategis -> Kegiatan_Unit)
+# dan per unit. Query agregat SUM yang hanya memakai kolom dimensi rollup diarahkan ke rollup terkecil yang cocok.
+ROLLUP_REWRITE_ENABLED = os.getenv("ROLLUP_REWRITE_ENABLED", "true").lower() == "true"
+ROLLUP_META_TTL_S = float(os.getenv("ROLLUP_META_TTL_S", "60"))
+
+SOURCE_TABLE = "drauk_unit"
+META_TABLE = "drauk_rollup_meta"
+# Lock MySQL (GET_LOCK) agar hanya satu proses refresh yang menukar tabel staging pada satu waktu
+REFRESH_LOCK_NAME = "drauk_rollup_refresh"
+MEASURES = ("Jumlah", "Realisasi", "Sisa")
+
+_UNIT = ["Kode_Unit", "Nama_Unit", "Tipe_Unit"]
+_SASARAN = ["Kode_SS", "Sasaran_Strategis"]
+_PROGRAM = _SASARAN + ["Kode_PS", "Program_Strategis"]
+
+# Urut dari yang paling kecil (paling sedikit baris); rewrite memilih yang pertama cocok
+ROLLUPS: List[Tuple[str, List[str]]] = [
+    ("drauk_rollup_tahun", ["Tahun_Anggaran"]),
+    ("drauk_rollup_sasaran", ["Tahun_Anggaran"] + _SASARAN),
+    ("drauk_rollup_program", ["Tahun_Anggaran"] + _PROGRAM),
+    ("drauk_rollup_unit", ["Tahun_Anggaran"] + _UNIT),
+    ("drauk_rollup_program_unit", ["Tahun_Anggaran"] + _PROGRAM + _UNIT),
+    ("drauk_rollup_kegiatan", ["Tahun_Anggaran"] + _PROGRAM + _UNIT + ["Kegiatan_Unit"]),
+]
+
+_MEASURE_KEYS = {m.lower() for m in MEASURES}
+# Agregat yang hasilnya berubah jika dihitung dari baris rollup
+_NON_ROLLUP_AGGREGATES = {"avg", "std", "stddev", "stddev_pop", "stddev_samp", "variance", "var_pop", "var_samp",
+                          "group_concat", "json_arrayagg", "json_objectagg", "bit_and", "bit_or", "bit_xor"}
+_UNSUPPORTED_KEYWORDS = {"JOIN", "UNION", "OVER", "WITH", "INTO", "ROLLUP"}
+
+
+def _build_sql(name: str, dimensions: List[str]) -> str:
+    dims = ", ".join(f"`{d}`" for d in dimensions)
+    sums = ", ".join(f"SUM(`{m}`) AS `{m}`" for m in MEASURES)
+    return f"CREATE TABLE `{name}` AS SELECT {dims}, {sums}, COUNT(*) AS `row_count` FROM `{SOURCE_TABLE}` GROUP BY {dims}"
+
+
+def _ensure_meta_table(connection: Connection):
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS `{META_TABLE}` (
+            name VARCHAR(64) PRIMARY KEY,
+            row_count INTEGER NOT NULL,
+            data_version VARCHAR(32) NOT NULL,
+            refreshed_at DATETIME NOT NULL,
+            stale INTEGER NOT NULL DEFAULT 0
+        )
+    """))
+    columns = {column["name"] for column in inspect(connection).get_columns(META_TABLE)}
+    if "stale" not in columns:
+        connection.execute(text(f"ALTER TABLE `{META_TABLE}` ADD COLUMN stale INTEGER NOT NULL DEFAULT 0"))
+    connection.commit()
+
+
+@contextmanager
+def _refresh_lock(connection: Connection) -> Iterator[bool]:
+    """True jika lock refresh didapat. Dialek lain (SQLite salinan/sintetis di scripts/) tanpa lock."""
+    if connection.dialect.name != "mysql":
+        yield True
+        return
+    acquired = connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": REFRESH_LOCK_NAME}).scalar() == 1
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": REFRESH_LOCK_NAME})
+
+
+def _mark_stale(connection: Connection, data_version: str) -> List[str]:
+    """Menandai rollup yang dibangun dari versi data lain sebagai basi (tidak dipakai rewrite)."""
+    stale = [row[0] for row in connection.execute(
+        text(f"SELECT name FROM `{META_TABLE}` WHERE data_version <> :version AND stale = 0"), {"version": data_version})]
+    if stale:
+        connection.execute(text(f"UPDATE `{META_TABLE}` SET stale = 1 WHERE data_version <> :version"),
+                           {"version": data_version})
+        connection.commit()
+        metrics.incr("rollup.stale", len(stale))
+    return stale
+
+
+def mark_stale_rollups(engine: Optional[Engine] = None) -> List[str]:
+    """Cek fingerprint drauk_unit dan tandai rollup yang basi tanpa membangun ulang; mengembalikan nama rollup."""
+    engine = engine or get_engine()
+    with timed_connect(engine, "primary") as connection:
+        _ensure_meta_table(connection)
+        return _mark_stale(connection, get_data_fingerprint(engine))
+
+
+def refresh_rollups(engine: Optional[Engine] = None, force: bool = False) -> Dict[str, object]:
+    """
+    Membangun ulang semua rollup jika data drauk_unit berubah (atau force). Hanya dijalankan dari
+    scripts/refresh_rollups.py (terjadwal), tidak pernah dari worker API.
+    Rollup basi ditandai dulu di tabel meta sehingga worker berhenti memakainya, lalu tabel baru dibangun dengan nama
+    sementara dan ditukar, sehingga query tidak pernah melihat rollup setengah jadi.
+    """
+    engine = engine or get_engine()
+    with timed_connect(engine, "primary") as connection:
+        _ensure_meta_table(connection)
+        with _refresh_lock(connection) as acquired:
+            if not acquired:
+                return {"data_version": None, "refreshed": [], "skipped": [name for name, _ in ROLLUPS], "locked": True}
+            data_version = get_data_fingerprint(engine)
+            current = {row[0]: (row[1], row[2]) for row in
+                       connection.execute(text(f"SELECT name, data_version, stale FROM `{META_TABLE}`"))}
+            if not force and all(current.get(name) == (data_version, 0) for name, _ in ROLLUPS):
+                return {"data_version": data_version, "refreshed": [], "skipped": [name for name, _ in ROLLUPS]}
+
+            summary = {"data_version": data_version, "refreshed": [], "skipped": [],
+                       "marked_stale": _mark_stale(connection, data_version)}
+            for name, dimensions in ROLLUPS:
+                start = time.perf_counter()
+                staging, old = f"{name}__new", f"{name}__old"
+                connection.execute(text(f"DROP TABLE IF EXISTS `{staging}`"))
+                connection.execute(text(_build_sql(staging, dimensions)))
+                row_count = connection.execute(text(f"SELECT COUNT(*) FROM `{staging}`")).scalar()
+
+                if engine.dialect.name == "mysql":
+                    connection.execute(text(f"DROP TABLE IF EXISTS `{old}`"))
+                    exists = connection.execute(text("SHOW TABLES LIKE :name"), {"name": name}).first() is not None
+                    if exists:
+                        connection.execute(text(f"RENAME TABLE `{name}` TO `{old}`, `{staging}` TO `{name}`"))
+                        connection.execute(text(f"DROP TABLE `{old}`"))
+                    else:
+                        connection.execute(text(f"RENAME TABLE `{staging}` TO `{name}`"))
+                else:
+                    # SQLite: DDL transaksional, drop + rename di-commit bersama
+                    connection.execute(text(f"DROP TABLE IF EXISTS `{name}`"))
+                    connection.execute(text(f"ALTER TABLE `{staging}` RENAME TO `{name}`"))
+
+                connection.execute(text(f"DELETE FROM `{META_TABLE}` WHERE name = :name"), {"name": name})
+                connection.execute(
+                    text(f"INSERT INTO `{META_TABLE}` (name, row_count, data_version, refreshed_at, stale) "
+                         f"VALUES (:name, :rows, :version, :at, 0)"),
+                    {"name": name, "rows": row_count, "version": data_version, "at": datetime.now()},
+                )
+                connection.commit()
+                summary["refreshed"].append({"name": name, "rows": row_count, "seconds": round(time.perf_counter() - start, 2)})
+
+    _meta_cache.invalidate()
+    return summary
+
+
+class _MetaCache:
+    """
+    Daftar rollup yang siap dipakai (dibaca dari tabel meta, di-cache ROLLUP_META_TTL_S): rollup yang tidak ditandai
+    basi dan berasal dari refresh yang sama (versi data sama). Jalur request hanya membaca tabel meta; fingerprint dan
+    rebuild dikerjakan scripts/refresh_rollups.py. Lock hanya menjaga cache, tidak dipegang selama I/O.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._available: Set[str] = set()
+        self._loaded_at = 0.0
+        self._loading = False
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def available(self, engine: Optional[Engine] = None) -> Set[str]:
+        with self._lock:
+            # Saat satu thread sedang membaca tabel meta, thread lain memakai daftar sebelumnya
+            if self._loading or time.monotonic() - self._loaded_at < ROLLUP_META_TTL_S:
+                return self._available
+            self._loading = True
+        available: Set[str] = set()
+        try:
+            with timed_connect(engine or get_readonly_engine(), "readonly") as connection:
+                rows = connection.execute(text(f"SELECT name, data_version FROM `{META_TABLE}` WHERE stale = 0")).fetchall()
+            if len({row[1] for row in rows}) == 1:
+                available = {row[0] for row in rows}
+        except Exception:
+            pass  # tabel meta belum ada / belum dimigrasi: rollup belum pernah di-refresh
+        finally:
+            with self._lock:
+                self._available, self._loaded_at, self._loading = available, time.monotonic(), False
+        return available
+
+
+_meta_cache = _MetaCache()
+
+
+def _referenced_dimensions(query: str) -> Optional[Set[str]]:
+    """
+    Kolom dimensi yang dirujuk query agregat atas drauk_unit, atau None jika query tidak aman di-rewrite:
+    measure harus selalu langsung di dalam SUM (tanpa operator), tidak ada AVG/COUNT(*)/JOIN/subquery/SELECT *.
+    """
+    statements = [s for s in sqlparse.parse(query) if str(s).strip().strip(";")]
+    if len(statements) != 1:
+        return None
+    tokens = [t for t in statements[0].flatten() if t.ttype not in (Whitespace, Newline)]
+    if sum(1 for t in tokens if t.ttype in Keyword.DML and t.value.upper() == "SELECT") != 1:
+        return None
+
+    known_dimensions = {d.lower() for _, dims in ROLLUPS for d in dims}
+    aliases: Set[str] = set()
+    for index, token in enumerate(tokens):
+        if token.ttype in Keyword and token.value.upper() == "AS" and index + 1 < len(tokens):
+            aliases.add(tokens[index + 1].value.strip("`\"").lower())
+        if token.ttype in Name and token.value.strip("`\"").lower() == SOURCE_TABLE and index + 1 < len(tokens):
+            following = tokens[index + 1]
+            if following.ttype in Name:
+                aliases.add(following.value.strip("`\"").lower())  # alias tabel: FROM drauk_unit d
+
+    referenced: Set[str] = set()
+    uses_sum = False
+    stack: List[str] = []  # nama fungsi untuk setiap kurung yang terbuka
+    for index, token in enumerate(tokens):
+        value = token.value.strip("`\"").lower()
+        previous = tokens[index - 1] if index else None
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+
+        if token.ttype in Keyword and token.value.upper() in _UNSUPPORTED_KEYWORDS:
+            return None
+        if token.ttype in Punctuation and token.value == "(":
+            stack.append(previous.value.lower() if previous is not None and previous.ttype in (Name, Keyword) else "")
+            continue
+        if token.ttype in Punctuation and token.value == ")":
+            if stack:
+                stack.pop()
+            continue
+        if token.ttype in Wildcard:
+            return None  # SELECT * atau COUNT(*)
+        if "sum" in stack and token.ttype in Keyword and token.value.upper() == "DISTINCT":
+            return None  # SUM(DISTINCT Jumlah) tidak bisa dihitung dari baris rollup
+        if "sum" in stack and token.ttype in Operator:
+            return None  # SUM(Jumlah - Realisasi) berbeda dari selisih SUM per grup jika ada NULL
+        if token.ttype not in Name or token.ttype in Name.Placeholder:
+            continue  # placeholder bound parameter (:slot_0) diperlakukan seperti literal
+
+        if following is not None and following.ttype in Punctuation and following.value == "(":
+            if value in _NON_ROLLUP_AGGREGATES:
+                return None
+            if value == "count":
+                distinct = tokens[index + 2] if index + 2 < len(tokens) else None
+                if distinct is None or distinct.value.upper() != "DISTINCT":
+                    return None
+            if value == "sum":
+                uses_sum = True
+            elif "sum" in stack:
+                return None  # fungsi skalar di dalam SUM
+            continue
+        if following is not None and following.ttype in Punctuation and following.value == ".":
+            continue  # kualifikasi tabel: d.Nama_Unit
+        if value == SOURCE_TABLE or value in aliases:
+            continue
+
+        if value in _MEASURE_KEYS:
+            inside_sum = "sum" in stack and all(name == "" for name in stack[stack.index("sum") + 1:])
+            if not inside_sum:
+                return None
+        elif value in known_dimensions:
+            if "sum" in stack:
+                return None
+            referenced.add(value)
+        else:
+            return None  # kolom di luar rollup (mis. Akun) atau identifier tak dikenal
+
+    return referenced if uses_sum else None
+
+
+def choose_rollup(query: str, available: Optional[Set[str]] = None) -> Optional[str]:
+    """Rollup terkecil yang memuat semua dimensi yang dirujuk query, atau None."""
+    referenced = _referenced_dimensions(query)
+    if referenced is None:
+        return None
+    for name, dimensions in ROLLUPS:
+        if available is not None and name not in available:
+            continue
+        if referenced <= {d.lower() for d in dimensions}:
+            return name
+    return None
+
+
+def rewrite_to_rollup(query: str, rollup: str) -> str:
+    """Mengganti referensi tabel drauk_unit dengan tabel rollup (token-based, literal string tidak tersentuh)."""
+    parts = []
+    for token in sqlparse.parse(query)[0].flatten():
+        if token.ttype in Name and token.value.strip("`\"").lower() == SOURCE_TABLE:
+            parts.append(f"`{rollup}`")
+        else:
+            parts.append(token.value)
+    return "".join(parts)
+
+
+def rewrite_for_rollup(query: str, engine: Optional[Engine] = None) -> Tuple[str, Optional[str]]:
+    """Stage rewrite sebelum eksekusi: (query yang dieksekusi, nama rollup atau None)."""
+    if not ROLLUP_REWRITE_ENABLED:
+        return query, None
+    available = _meta_cache.available(engine)
+    if not available:
+        return query, None
+    rollup = choose_rollup(query, available)
+    if rollup is None:
+        metrics.incr("rollup.rewrite.skipped")
+        return query, None
+    metrics.incr(f"rollup.rewrite.{rollup}")
+    return rewrite_to_rollup(query, rollup), rollup
@@ -1,23 +1,20 @@
 from datetime import datetime
-from sqlalchemy import text
-from src.db.config_mysql import get_engine
+from typing import Any, Dict, List
+from sqlalchemy import bindparam, text
+from src.db.audit_storage import decode_audit_row, encode_audit_row, encode_audit_text
+from src.db.config_mysql import get_engine, timed_connect
+from src.db.executor import is_database_unavailable
+from src.search.index import schedule_search_sync
+from src.utils.resilience import get_breaker, guarded_call
+from src.utils.tracing import get_logger, traced
+
+logger = get_logger("trx_pertanyaan_repo")
 
 engine = get_engine()
 
-def insert_trx_pertanyaan(
-    unit: str,
-    nip: str,
-    user_prompt: str,
-    token_in: int,
-    token_out: int,
-    token_total: int,
-    output_query: str,
-    output_data_raw: str,
-    output_analisa: str,
-    apps: str = "e - budgeting",
-):
-    try:
-        insert_sql = text("""
+PRIMARY_BREAKER = "mysql.primary"
+
+INSERT_TRX_PERTANYAAN_SQL = text("""
             INSERT INTO trx_pertanyaan ( unit,
                                          nip,
                                          user_promt,
@@ -43,9 +40,24 @@ def insert_trx_pertanyaan(
                                             :udcr
                                     )
                           """)
-        with engine.connect() as connection:
+
+@traced("audit_insert")
+def insert_trx_pertanyaan(
+    unit: str,
+    nip: str,
+    user_prompt: str,
+    token_in: int,
+    token_out: int,
+    token_total: int,
+    output_query: str,
+    output_data_raw: str,
+    output_analisa: str,
+    apps: str = "e - budgeting",
+):
+    def insert():
+        with timed_connect(engine, "primary") as connection:
             connection.execute(
-                insert_sql,
+                INSERT_TRX_PERTANYAAN_SQL,
                 {
                     "unit": unit,
                     "nip": nip,
@@ -54,32 +66,58 @@ def insert_trx_pertanyaan(
                     "token_out": token_out,
                     "token_total": token_total,
                     "output_query": output_query,
-                    "output_data_raw": output_data_raw,
-                    "output_analisa": output_analisa,
+                    "output_data_raw": encode_audit_text(output_data_raw),
+                    "output_analisa": encode_audit_text(output_analisa),
                     "apps": apps,
                     "udcr": datetime.now(),
                 },
             )
             connection.commit()  # commit manual karena pakai connection-level
-        print("✅ Insert trx_pertanyaan berhasil")
+
+    try:
+        # Saat MySQL primary bermasalah insert gagal cepat (breaker) dan tidak menahan response melewati deadline `audit`;
+        # tidak dipotong deadline request agar jawaban yang sudah jadi tetap tercatat
+        guarded_call([get_breaker(PRIMARY_BREAKER, is_database_unavailable)], "audit", insert, request_bound=False)
+        logger.debug("Insert trx_pertanyaan berhasil")
+        schedule_search_sync()
+
+    except Exception as e:
+        logger.error("Gagal insert trx_pertanyaan", error=str(e))
+
+@traced("audit_insert", **{"audit.bulk": True})
+def insert_trx_pertanyaan_bulk(rows: List[Dict[str, Any]], apps: str = "e - budgeting"):
+    """Insert banyak baris audit dalam satu transaksi (dipakai batch job)."""
+    if not rows:
+        return
+    try:
+        udcr = datetime.now()
+        params = [
+            encode_audit_row({"token_in": 0, "token_out": 0, "token_total": 0, "apps": apps, "udcr": udcr, **row})
+            for row in rows
+        ]
+        with timed_connect(engine, "primary") as connection:
+            connection.execute(INSERT_TRX_PERTANYAAN_SQL, params)
+            connection.commit()
+        logger.debug("Insert bulk trx_pertanyaan berhasil", rows=len(rows))
+        schedule_search_sync()
 
     except Exception as e:
-        print(f"❌ Gagal insert trx_pertanyaan: {e}")
+        logger.error("Gagal insert bulk trx_pertanyaan", error=str(e))
 
 def get_all_trx_pertanyaan(limit: int = 300):
     try:
         select_sql = text("""
             SELECT * FROM trx_pertanyaan LIMIT :limit
         """)
-        with engine.connect() as connection:
+        with timed_connect(engine, "primary") as connection:
             result = connection.execute(select_sql, {"limit": limit})
             rows = result.fetchall()
             columns = result.keys()
-            data = [dict(zip(columns, row)) for row in rows]
+            data = [decode_audit_row(dict(zip(columns, row))) for row in rows]
         return data
 
     except Exception as e:
-        print(f"❌ Gagal mengambil data trx_pertanyaan: {e}")
+        logger.error("Gagal mengambil data trx_pertanyaan", error=str(e))
         return []
 
 def get_trx_pertanyaan_by_id(id_pertanyaan: int):
@@ -87,17 +125,17 @@ def get_trx_pertanyaan_by_id(id_pertanyaan: int):
         select_sql = text("""
             SELECT * FROM trx_pertanyaan WHERE id_pertanyaan = :id_pertanyaan
         """)
-        with engine.connect() as connection:
+        with timed_connect(engine, "primary") as connection:
             result = connection.execute(select_sql, {"id_pertanyaan": id_pertanyaan})
             row = result.fetchone()  # ✅ ambil satu baris
             if row:
                 columns = result.keys()
-                data = dict(zip(columns, row))
+                data = decode_audit_row(dict(zip(columns, row)))
                 return data
             else:
                 return None
     except Exception as e:
-        print(f"❌ Gagal mengambil data trx_pertanyaan by nip: {e}")
+        logger.error("Gagal mengambil data trx_pertanyaan by nip", error=str(e))
         return None
 
 def get_trx_pertanyaan_by_nip(nip: int):
@@ -105,15 +143,123 @@ def get_trx_pertanyaan_by_nip(nip: int):
         select_sql = text("""
             SELECT * FROM trx_pertanyaan WHERE nip = :nip
         """)
-        with engine.connect() as connection:
+        with timed_connect(engine, "primary") as connection:
             result = connection.execute(select_sql, {"nip": nip})
             rows = result.fetchall()  # ✅ ambil semua baris
             if rows:
                 columns = result.keys()
-                data = [dict(zip(columns, row)) for row in rows]
+                data = [decode_audit_row(dict(zip(columns, row))) for row in rows]
                 return data
             else:
                 return []
     except Exception as e:
-        print(f"❌ Gagal mengambil data trx_pertanyaan by nip: {e}")
+        logger.error("Gagal mengambil data trx_pertanyaan by nip", error=str(e))
         return []
+
+def get_recent_user_prompts(limit: int = 500):
+    """Daftar `user_promt` unik terbaru (dipakai sebagai contoh berlabel data_perusahaan)."""
+    try:
+        select_sql = text("""
+            SELECT user_promt FROM trx_pertanyaan
+            WHERE user_promt IS NOT NULL AND user_promt <> ''
+            GROUP BY user_promt
+            ORDER BY MAX(udcr) DESC
+            LIMIT :limit
+        """)
+        with timed_connect(engine, "primary") as connection:
+            result = connection.execute(select_sql, {"limit": limit})
+            return [row[0] for row in result.fetchall()]
+    except Exception as e:
+        logger.error("Gagal mengambil riwayat user_promt", error=str(e))
+        return []
+
+def get_top_user_prompts(limit: int = 50):
+    """`user_promt` yang paling sering ditanyakan beserta frekuensinya (dipakai precompute job)."""
+    try:
+        select_sql = text("""
+            SELECT user_promt, COUNT(*) AS total FROM trx_pertanyaan
+            WHERE user_promt IS NOT NULL AND user_promt <> ''
+            GROUP BY user_promt
+            ORDER BY total DESC
+            LIMIT :limit
+        """)
+        with timed_connect(engine, "primary") as connection:
+            result = connection.execute(select_sql, {"limit": limit})
+            return [(row[0], row[1]) for row in result.fetchall()]
+    except Exception as e:
+        logger.error("Gagal mengambil user_promt terpopuler", error=str(e))
+        return []
+
+def get_logged_output_queries(limit: int = 5000):
+    """`output_query` (SQL hasil LLM) terbaru, dipakai index advisor sebagai sampel workload."""
+    try:
+        select_sql = text("""
+            SELECT output_query FROM trx_pertanyaan
+            WHERE output_query IS NOT NULL AND output_query <> ''
+            ORDER BY udcr DESC
+            LIMIT :limit
+        """)
+        with timed_connect(engine, "primary") as connection:
+            result = connection.execute(select_sql, {"limit": limit})
+            return [row[0] for row in result.fetchall()]
+    except Exception as e:
+        logger.error("Gagal mengambil output_query", error=str(e))
+        return []
+
+def get_replay_samples(limit: int = 2000):
+    """Pertanyaan terbaru beserta SQL yang tercatat, unit, dan nip (dipakai load test replay)."""
+    try:
+        select_sql = text("""
+            SELECT user_promt, output_query, unit, nip FROM trx_pertanyaan
+            WHERE user_promt IS NOT NULL AND user_promt <> ''
+            ORDER BY udcr DESC
+            LIMIT :limit
+        """)
+        with timed_connect(engine, "primary") as connection:
+            result = connection.execute(select_sql, {"limit": limit})
+            columns = result.keys()
+            return [dict(zip(columns, row)) for row in result.fetchall()]
+    except Exception as e:
+        logger.error("Gagal mengambil sampel replay trx_pertanyaan", error=str(e))
+        return []
+
+def get_trx_pertanyaan_after(last_id: int, limit: int = 5000):
+    """Baris dengan id_pertanyaan > last_id (urut id), untuk sinkronisasi inkremental indeks pencarian."""
+    select_sql = text("""
+        SELECT id_pertanyaan, unit, nip, udcr, user_promt, output_analisa FROM trx_pertanyaan
+        WHERE id_pertanyaan > :last_id
+        ORDER BY id_pertanyaan
+        LIMIT :limit
+    """)
+    with timed_connect(engine, "primary") as connection:
+        result = connection.execute(select_sql, {"last_id": last_id, "limit": limit})
+        columns = result.keys()
+        return [decode_audit_row(dict(zip(columns, row))) for row in result.fetchall()]
+
+def get_trx_pertanyaan_ids_after(last_id: int, limit: int = 50000) -> List[int]:
+    """id_pertanyaan > last_id (urut id), untuk mencocokkan isi indeks pencarian dengan trx_pertanyaan."""
+    select_sql = text("""
+        SELECT id_pertanyaan FROM trx_pertanyaan
+        WHERE id_pertanyaan > :last_id
+        ORDER BY id_pertanyaan
+        LIMIT :limit
+    """)
+    with timed_connect(engine, "primary") as connection:
+        return [int(row[0]) for row in connection.execute(select_sql, {"last_id": last_id, "limit": limit})]
+
+def get_trx_pertanyaan_by_ids(ids: List[int]):
+    """Baris untuk indeks pencarian berdasarkan daftar id_pertanyaan."""
+    if not ids:
+        return []
+    select_sql = text("""
+        SELECT id_pertanyaan, unit, nip, udcr, user_promt, output_analisa FROM trx_pertanyaan
+        WHERE id_pertanyaan IN :ids
+    """).bindparams(bindparam("ids", expanding=True))
+    with timed_connect(engine, "primary") as connection:
+        result = connection.execute(select_sql, {"ids": list(ids)})
+        columns = result.keys()
+        return [decode_audit_row(dict(zip(columns, row))) for row in result.fetchall()]
+
+def count_trx_pertanyaan() -> int:
+    with timed_connect(engine, "primary") as connection:
+        return int(connection.execute(text("SELECT COUNT(*) FROM trx_pertanyaan")).scalar() or 0)
@@ -4,7 +4,13 @@ from dotenv import load_dotenv
 import os
 
 from src.middleware.token_counter import TokenCountMiddleware
+from src.middleware.compression import CompressionMiddleware
+from src.middleware.profiling import ProfilingMiddleware
+from src.middleware.tracing import TracingMiddleware
+from src.api.response_formats import FastJSONResponse
 from src.api.router import router, limiter as api_limiter
+from src.db.config_qdrant import close_async_qdrant
+from src.utils.profiling import PROFILING_ENABLED
 
 load_dotenv()
 
@@ -12,9 +18,13 @@ load_dotenv()
 app = FastAPI(
     title="🤖 NL-to-SQL Service API",
     version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(TokenCountMiddleware)
+# Profiling per request hanya dipasang jika PROFILING_TOKEN / PROFILING_SAMPLE_RATE di-set (tanpa overhead jika tidak)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 
 # CORS
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*")
@@ -31,6 +41,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Root span per request + header X-Trace-Id (di luar profiling agar profile ikut dalam trace)
+app.add_middleware(TracingMiddleware)
+# Ditambahkan terakhir = lapisan terluar: mengompresi body final (br/gzip)
+app.add_middleware(CompressionMiddleware)
+
 # Attach limiter from router to app state so slowapi can access it
 try:
     app.state.limiter = api_limiter
@@ -39,4 +54,7 @@ except Exception:
     pass
 
 # Mount API router
-app.include_router(router)
\ No newline at end of file
+app.include_router(router)
+
+# Menutup client Qdrant async per worker (channel gRPC / pool HTTP dan thread event loop-nya)
+app.add_event_handler("shutdown", close_async_qdrant)
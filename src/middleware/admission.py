@@ -0,0 +1,194 @@
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from src.utils import metrics
+from src.utils.local_store import get_local_store
+from src.utils.tracing import get_logger
+
+load_dotenv()
+
+logger = get_logger("admission")
+
+# Admission control untuk pipeline LLM/DB (per worker):
+# - batas pipeline yang berjalan bersamaan
+# - antrean tunggu terbatas, request di-shed jika melewati deadline
+# - lane prioritas: "interactive" selalu didahulukan, "batch" (batch job/dashboard) dibatasi jatahnya
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+ADMISSION_BATCH_MAX_CONCURRENT = int(os.getenv("ADMISSION_BATCH_MAX_CONCURRENT", "2"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_INTERACTIVE_TIMEOUT_MS = float(os.getenv("ADMISSION_INTERACTIVE_TIMEOUT_MS", "5000"))
+ADMISSION_BATCH_TIMEOUT_MS = float(os.getenv("ADMISSION_BATCH_TIMEOUT_MS", "30000"))
+
+# Budget token per nip (dibagi semua worker lewat local store). 0 = nonaktif.
+NIP_TOKEN_BUDGET = int(os.getenv("NIP_TOKEN_BUDGET", "0"))
+NIP_TOKEN_BUDGET_WINDOW_S = int(os.getenv("NIP_TOKEN_BUDGET_WINDOW_S", "86400"))
+
+LANE_INTERACTIVE = "interactive"
+LANE_BATCH = "batch"
+_LANE_PRIORITY = {LANE_INTERACTIVE: 0, LANE_BATCH: 1}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, status_code: int, retry_after: int = 1):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, lane: str, seq: int):
+        self.lane = lane
+        self.order = (_LANE_PRIORITY[lane], seq)
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int, batch_max_concurrent: int, max_queue: int):
+        self._max_concurrent = max_concurrent
+        self._batch_max_concurrent = batch_max_concurrent
+        self._max_queue = max_queue
+        self._cond = threading.Condition()
+        self._active = {LANE_INTERACTIVE: 0, LANE_BATCH: 0}
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+
+    def _lane_has_room(self, lane: str) -> bool:
+        if sum(self._active.values()) >= self._max_concurrent:
+            return False
+        return lane != LANE_BATCH or self._active[LANE_BATCH] < self._batch_max_concurrent
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        # Waiter berprioritas tertinggi yang lane-nya masih punya slot
+        for waiter in sorted(self._waiters, key=lambda w: w.order):
+            if self._lane_has_room(waiter.lane):
+                return waiter
+        return None
+
+    @contextmanager
+    def admit(self, lane: str = LANE_INTERACTIVE, timeout_ms: Optional[float] = None):
+        if timeout_ms is None:
+            timeout_ms = ADMISSION_BATCH_TIMEOUT_MS if lane == LANE_BATCH else ADMISSION_INTERACTIVE_TIMEOUT_MS
+        start = time.monotonic()
+        deadline = start + timeout_ms / 1000
+
+        with self._cond:
+            if self._lane_has_room(lane) and not any(w.order[0] <= _LANE_PRIORITY[lane] for w in self._waiters):
+                self._active[lane] += 1
+            else:
+                if len(self._waiters) >= self._max_queue:
+                    metrics.incr(f"admission.{lane}.shed.queue_full")
+                    raise AdmissionRejected("queue_full", 503)
+
+                waiter = _Waiter(lane, next(self._seq))
+                self._waiters.append(waiter)
+                try:
+                    while self._next_waiter() is not waiter:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            metrics.incr(f"admission.{lane}.shed.deadline")
+                            raise AdmissionRejected("deadline", 503)
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiters.remove(waiter)
+                    # Waiter lain mungkin sekarang menjadi yang terdepan
+                    self._cond.notify_all()
+                self._active[lane] += 1
+
+        metrics.incr(f"admission.{lane}.admitted")
+        metrics.observe(f"admission.{lane}.wait_ms", (time.monotonic() - start) * 1000)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active[lane] -= 1
+                self._cond.notify_all()
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "active": dict(self._active),
+                "queued": {lane: sum(1 for w in self._waiters if w.lane == lane) for lane in _LANE_PRIORITY},
+                "max_concurrent": self._max_concurrent,
+                "batch_max_concurrent": self._batch_max_concurrent,
+                "max_queue": self._max_queue,
+            }
+
+
+class TokenBudgetStore:
+    """Pemakaian token per nip per jendela waktu, disimpan di local store (dibagi antar worker)."""
+
+    def __init__(self):
+        get_local_store().execute("""
+            CREATE TABLE IF NOT EXISTS nip_token_usage (
+                nip TEXT NOT NULL,
+                window_start INTEGER NOT NULL,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (nip, window_start)
+            )
+        """)
+
+    @staticmethod
+    def _window_start() -> int:
+        now = int(time.time())
+        return now - now % NIP_TOKEN_BUDGET_WINDOW_S
+
+    def used(self, nip: str) -> int:
+        row = get_local_store().execute(
+            "SELECT tokens FROM nip_token_usage WHERE nip = ? AND window_start = ?",
+            (nip, self._window_start()),
+        ).fetchone()
+        return row["tokens"] if row else 0
+
+    def add(self, nip: str, tokens: int):
+        store = get_local_store()
+        window_start = self._window_start()
+        store.execute(
+            """
+            INSERT INTO nip_token_usage (nip, window_start, tokens) VALUES (?, ?, ?)
+            ON CONFLICT (nip, window_start) DO UPDATE SET tokens = tokens + excluded.tokens
+            """,
+            (nip, window_start, tokens),
+        )
+        store.execute("DELETE FROM nip_token_usage WHERE window_start < ?", (window_start,))
+
+
+ADMISSION = AdmissionController(ADMISSION_MAX_CONCURRENT, ADMISSION_BATCH_MAX_CONCURRENT, ADMISSION_MAX_QUEUE)
+_token_budget_store: Optional[TokenBudgetStore] = None
+
+
+def _get_token_budget_store() -> TokenBudgetStore:
+    global _token_budget_store
+    if _token_budget_store is None:
+        _token_budget_store = TokenBudgetStore()
+    return _token_budget_store
+
+
+def check_token_budget(nip: Optional[str]):
+    if NIP_TOKEN_BUDGET <= 0 or not nip:
+        return
+    if _get_token_budget_store().used(nip) >= NIP_TOKEN_BUDGET:
+        metrics.incr("admission.shed.token_budget")
+        raise AdmissionRejected("token_budget", 429, retry_after=NIP_TOKEN_BUDGET_WINDOW_S)
+
+
+def estimate_response_tokens(question: str, response: Dict[str, Any]) -> int:
+    """Token dari token_usage jika ada (Gemini), selain itu estimasi panjang teks // 4."""
+    usage = response.get("token_usage") or {}
+    if usage.get("grand_total"):
+        return int(usage["grand_total"])
+    return (len(question) + len(str(response.get("answer", ""))) + len(str(response.get("generated_sql", "")))) // 4
+
+
+def charge_tokens(nip: Optional[str], tokens: int):
+    if NIP_TOKEN_BUDGET <= 0 or not nip or tokens <= 0:
+        return
+    try:
+        _get_token_budget_store().add(nip, tokens)
+    except Exception as e:
+        logger.error("Gagal mencatat pemakaian token", nip=nip, error=str(e))
@@ -0,0 +1,51 @@
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.utils.profiling import (
+    PROFILE_HEADER,
+    PROFILE_ID_HEADER,
+    save_profile,
+    should_profile,
+    start_profile,
+    stop_profile,
+)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware: request yang memenuhi syarat (header token atau sampling) dijalankan dengan profile aktif,
+    lalu profile-nya disimpan. Id profile dikembalikan lewat header X-Profile-Id.
+    Hanya dipasang jika profiling diaktifkan (lihat src/utils/profiling.py).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        trigger = should_profile(scope["method"], headers.get(PROFILE_HEADER, ""))
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile, context_token = start_profile(
+            scope["method"], scope["path"], trigger, headers.get("x-request-id", "")[:64]
+        )
+        status = None
+
+        async def send_with_profile_id(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message)[PROFILE_ID_HEADER] = profile.profile_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            stop_profile(profile, context_token, status)
+            await run_in_threadpool(save_profile, profile)
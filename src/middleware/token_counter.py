@@ -5,6 +5,10 @@ from starlette.requests import Request
 from starlette.responses import Response
 import tiktoken
 
+from src.utils.tracing import get_logger
+
+logger = get_logger("token_counter")
+
 # Gemini
 try:
     import google.generativeai as genai  # type: ignore
@@ -63,7 +67,7 @@ class TokenCountMiddleware(BaseHTTPMiddleware):
                     resp = model.count_tokens([{"role": "user", "parts": [text]}])   # type: ignore
                     token_count = resp.total_tokens
                 except Exception as e:
-                    print("Gemini token count error:", e)
+                    logger.warning("Gemini token count error", error=str(e))
                     token_count = len(text) // 4
 
             # Llama
@@ -76,7 +80,7 @@ class TokenCountMiddleware(BaseHTTPMiddleware):
                 token_count = len(text) // 4
 
         except Exception as e:
-            print("Token count error:", e)
+            logger.warning("Token count error", error=str(e))
 
         # Simpan ke request.state
         request.state.token_count = token_count
@@ -0,0 +1,56 @@
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.utils.tracing import end_server_span, get_logger, start_server_span
+
+logger = get_logger("http")
+
+TRACE_ID_HEADER = "X-Trace-Id"
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: root span per request (melanjutkan header W3C `traceparent` jika ada),
+    trace id dikembalikan lewat header X-Trace-Id dan dicatat di log akses JSON.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        root, token = start_server_span(
+            f"{method} {path}",
+            Headers(scope=scope).get("traceparent", ""),
+            **{"http.method": method, "http.target": path},
+        )
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_trace_id(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message)[TRACE_ID_HEADER] = root.trace_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except BaseException as e:
+            root.set_error(e)
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            root.set(**{"http.status_code": status})
+            logger.info("request selesai", method=method, path=path, status=status, duration_ms=round(duration_ms, 1))
+            end_server_span(root, token)
@@ -1,28 +1,30 @@
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain_google_genai import ChatGoogleGenerativeAI
 from operator import itemgetter
 from src.retrieval.dependencies import get_retriever
+from src.retrieval.schema_retriever import schema_prompt_inputs
 
 # --- PROMPT UTAMA UNTUK SEMUA FUNGSI SQL ---
 # Mendefinisikan prompt super kuat sebagai konstanta untuk digunakan kembali (Prinsip DRY)
 # Ini adalah "otak" utama untuk mencegah halusinasi nama kolom.
 SUPER_STRONG_SQL_PROMPT_TEMPLATE = """
-Anda adalah asisten AI yang bertugas mengubah bahasa natural menjadi query SQL yang valid untuk tabel bernama `drauk_unit`.
+Anda adalah asisten AI yang bertugas mengubah bahasa natural menjadi query SQL yang valid untuk tabel-tabel pada daftar di bawah ini.
 
-DAFTAR KOLOM YANG VALID (Whitelist):
-[Tahun_Anggaran, Kode_DRAUK, Indikator_Tujuan, Kode_SS, Sasaran_Strategis, Kode_IKSS, Indikator_Kinerja_Sasaran_Strategis, Kode_PS, Program_Strategis, Kode_IKPS, Indikator_Kinerja_Program_Strategis, Kode_Unit, Nama_Unit, Tipe_Unit, Kegiatan_Universitas, Indikator_Capaian, Kegiatan_Unit, Kode_Standar_Kegiatan, Standar_Kegiatan, FTE, Detail_Kegiatan, Kelompok_Pagu, Akun, COA, Nama_COA, Satuan_Kegiatan, Barjas, Volume_1, Satuan_1, Volume_2, Satuan_2, Volume_3, Satuan_3, Volume_4, Satuan_4, Harga_Satuan, Sumber_Dana, Detail_Sumber_Dana, Jumlah, Realisasi, Sisa]
+DAFTAR TABEL DAN KOLOM YANG VALID (Whitelist):
+{whitelist}
 
 ATURAN PALING PENTING:
-1.  GUNAKAN HANYA nama kolom dari "DAFTAR KOLOM YANG VALID" di atas. Jangan mengarang atau mengubah nama kolom.
+1.  GUNAKAN HANYA nama tabel dan kolom dari "DAFTAR TABEL DAN KOLOM YANG VALID" di atas. Jangan mengarang atau mengubah nama tabel/kolom.
 2.  PENULISAN NAMA KOLOM HARUS SAMA PERSIS (case-sensitive). Jangan mengubah `Kegiatan_Unit` menjadi `kegiatan_unit`. Salin nama kolom persis seperti yang tertulis di daftar.
 3.  Gunakan "Konteks Skema" di bawah ini untuk memahami arti setiap kolom dan menghubungkannya dengan pertanyaan pengguna.
 4.  Jika sebuah kata dalam pertanyaan tidak ada di daftar kolom, gunakan sinonim atau deskripsi dari "Konteks Skema" untuk menemukan kolom yang paling cocok dari daftar.
-5.  Untuk permintaan "terbesar", "tertinggi", atau "paling banyak", GUNAKAN `ORDER BY ... DESC LIMIT ...`.
-6.  Untuk permintaan "terkecil", "terendah", atau "paling sedikit", GUNAKAN `ORDER BY ... ASC LIMIT ...`.
-7.  PERHATIKAN RIWAYAT PERCAKAPAN SEBELUMNYA untuk memahami konteks pertanyaan lanjutan.
-8.  Kembalikan HANYA string query SQL mentah, tanpa format ```sql.
+5.  Jika butuh lebih dari satu tabel, gunakan JOIN sesuai "Relasi antar tabel" di "Konteks Skema".
+6.  Untuk permintaan "terbesar", "tertinggi", atau "paling banyak", GUNAKAN `ORDER BY ... DESC LIMIT ...`.
+7.  Untuk permintaan "terkecil", "terendah", atau "paling sedikit", GUNAKAN `ORDER BY ... ASC LIMIT ...`.
+8.  PERHATIKAN RIWAYAT PERCAKAPAN SEBELUMNYA untuk memahami konteks pertanyaan lanjutan.
+9.  Kembalikan HANYA string query SQL mentah, tanpa format ```sql.
 
 ---
 Riwayat Percakapan:
@@ -36,10 +38,13 @@ Pertanyaan Pengguna Baru: {question}
 Query SQL:
 """
 
+# Whitelist tabel & kolom di prompt dibuat dari tabel yang terpilih oleh retriever (bukan daftar tetap)
+_with_schema_inputs = RunnableLambda(lambda inputs: {**inputs, **schema_prompt_inputs(inputs["documents"])})
+
 # FUNGSI CHAIN 
 # create_nl2sql_chain untuk nl to sql tanpa memori
 # create_nl2sql_with_conversation_chain untuk nl to sql dengan memori
-# get_retriever untuk mendapatkan retriever dari dependencies.py mencari data yang memiliki konteks paling relevan dikembalikan sebanyak K=2
+# get_retriever untuk mendapatkan retriever dari dependencies.py mencari data yang memiliki konteks paling relevan (tabel terpilih lalu kolomnya)
 # dua fungsi tersebut membuetuhkan retriever karena membutuhkan konteks skema untuk mencegah halusinasi nama kolom
 
 def create_nl2sql_chain(model_name: str):
@@ -51,15 +56,16 @@ def create_nl2sql_chain(model_name: str):
     
     prompt = PromptTemplate(
         template=SUPER_STRONG_SQL_PROMPT_TEMPLATE,
-        input_variables=["context", "question"],
+        input_variables=["whitelist", "context", "question"],
         partial_variables={"chat_history": "Tidak ada riwayat percakapan."} # Mengabaikan history
     )
 
     sql_chain = (
         {
-            "context": retriever, 
+            "documents": retriever, 
             "question": RunnablePassthrough()
         }
+        | _with_schema_inputs
         | prompt
         | llm
         | StrOutputParser()
@@ -76,13 +82,14 @@ def create_nl2sql_with_conversation_chain():
 
     prompt = PromptTemplate(
         template=SUPER_STRONG_SQL_PROMPT_TEMPLATE,
-        input_variables=["chat_history", "context", "question"]
+        input_variables=["chat_history", "whitelist", "context", "question"]
     )
 
     chain = (
         RunnablePassthrough.assign(
-            context=itemgetter("question") | retriever
+            documents=itemgetter("question") | retriever
         )
+        | _with_schema_inputs
         | prompt
         | llm
         | StrOutputParser()
@@ -142,4 +149,22 @@ def create_analysis_with_conversation_chain():
     """
     prompt = PromptTemplate.from_template(template)
     analysis_chain = prompt | llm | StrOutputParser()
-    return analysis_chain
\ No newline at end of file
+    return analysis_chain
+
+
+def create_conversation_summary_chain():
+    """
+    Membuat chain untuk memadatkan turn percakapan lama ke ringkasan bergulir.
+    """
+    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0)
+    template = """
+    Anda merangkum percakapan antara pengguna dan asisten data anggaran. Gabungkan ringkasan sebelumnya dengan percakapan baru menjadi satu ringkasan singkat (maksimal {max_words} kata).
+    Pertahankan hal yang dibutuhkan untuk pertanyaan lanjutan: unit, program, tahun, filter, dan angka penting yang sudah dibahas.
+    Ringkasan Sebelumnya: {summary}
+    Percakapan Baru:
+    {turns}
+    Ringkasan:
+    """
+    prompt = PromptTemplate.from_template(template)
+    summary_chain = prompt | llm | StrOutputParser()
+    return summary_chain
@@ -1,4 +1,4 @@
 """Retrieval helpers for vectorstores and embeddings."""
-from src.retrieval.dependencies import get_retriever, get_embedding_function
+from src.retrieval.dependencies import get_retriever, get_embedding_function, get_shared_embedding_function, warm_retriever
 
-__all__ = ["get_retriever", "get_embedding_function"]
+__all__ = ["get_retriever", "get_embedding_function", "get_shared_embedding_function", "warm_retriever"]
@@ -1,14 +1,24 @@
 import os
+import threading
+from functools import lru_cache
 from dotenv import load_dotenv
-from langchain_community.vectorstores import Qdrant
 from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_core.retrievers import BaseRetriever
-from src.db.config_qdrant import get_qdrant_client, get_qdrant_settings
+from src.db.config_qdrant import QDRANT_WARMUP_ENABLED, get_qdrant_settings, warm_qdrant
+from src.retrieval.embedding_service import EmbeddingServiceClient, EMBEDDING_SERVICE_SOCKET
+from src.retrieval.local_retriever import EntityHintRetriever, LocalSchemaRetriever, ResilientRetriever
+from src.retrieval.schema_retriever import KIND_COLUMN, KIND_TABLE, QdrantSchemaRetriever
+from src.utils.tracing import get_logger, span
 
 load_dotenv()
 
+logger = get_logger("retrieval")
+
 # Embedding model (must match ingest)
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-base-en-v1.5")
+# Pertanyaan contoh untuk warmup (embedding + search Qdrant) saat startup
+WARMUP_QUESTION = os.getenv("RETRIEVER_WARMUP_QUESTION", "Berapa total anggaran per unit tahun ini?")
 
 
 def get_embedding_function():
@@ -22,22 +32,67 @@ def get_embedding_function():
     )
 
 
+class TracedEmbeddings(Embeddings):
+    """Embeddings yang mencatat setiap pemanggilan sebagai span `embed`."""
+
+    def __init__(self, inner: Embeddings):
+        self.inner = inner
+
+    def embed_query(self, text: str):
+        with span("embed", **{"embed.texts": 1}):
+            return self.inner.embed_query(text)
+
+    def embed_documents(self, texts):
+        with span("embed", **{"embed.texts": len(texts)}):
+            return self.inner.embed_documents(texts)
+
+
+@lru_cache(maxsize=1)
+def get_shared_embedding_function() -> Embeddings:
+    """
+    Satu instance embedding per proses yang dipakai bersama oleh retriever dan
+    komponen lain (mis. intent classifier), agar model tidak dimuat dua kali.
+    """
+    if EMBEDDING_SERVICE_SOCKET:
+        return TracedEmbeddings(EmbeddingServiceClient(EMBEDDING_SERVICE_SOCKET))
+    return TracedEmbeddings(get_embedding_function())
+
+
+def _build_retriever(embedding_function: Embeddings) -> BaseRetriever:
+    # Search lewat client Qdrant async bersama per worker (src/db/config_qdrant.py), dibuat saat search pertama
+    settings = get_qdrant_settings()
+
+    # Dua tahap: tabel paling relevan dari ringkasan tabel, lalu kolom hanya di tabel terpilih; jika Qdrant/embedding
+    # gagal, konteks diambil dari YAML skema dengan cara yang sama. Nilai kolom kategorikal yang disebut di pertanyaan
+    # ditambahkan sebagai dokumen terakhir.
+    schema_retriever = ResilientRetriever(
+        primary=QdrantSchemaRetriever(collection=settings["collection"], embeddings=embedding_function),
+        fallback=LocalSchemaRetriever(),
+    )
+    return EntityHintRetriever(base=schema_retriever)
+
+
 def get_retriever() -> BaseRetriever:
     """
     Memuat database vektor Qdrant dan mengembalikannya sebagai retriever.
     Retriever ini bertugas mencari konteks skema yang relevan.
+    Jika EMBEDDING_SERVICE_SOCKET di-set, embedding dilakukan oleh embedding service bersama.
     """
-    embedding_function = get_embedding_function()
-    
-    # Connect to Qdrant using centralized config helper
-    client = get_qdrant_client()
-    settings = get_qdrant_settings()
+    return _build_retriever(get_shared_embedding_function())
 
-    db = Qdrant(
-        client=client,
-        collection_name=settings.get("collection", "schema_vectors"),
-        embeddings=embedding_function
-    )
-    
-    # Mengambil 2 potongan konteks paling relevan
-    return db.as_retriever(search_kwargs={"k": 2})
+
+def _warm_retriever():
+    try:
+        vector = get_shared_embedding_function().embed_query(WARMUP_QUESTION)
+        warm_qdrant(vector, (KIND_TABLE, KIND_COLUMN), get_qdrant_settings()["collection"])
+    except Exception as e:
+        logger.warning("Warmup retriever gagal", error=str(e))
+
+
+def warm_retriever():
+    """
+    Di background saat startup: memuat model embedding lalu menjalankan search Qdrant per jenis point
+    (membuka koneksi/gRPC channel, memuat graf HNSW), agar request pertama tidak menanggungnya.
+    """
+    if QDRANT_WARMUP_ENABLED:
+        threading.Thread(target=_warm_retriever, name="retriever-warmup", daemon=True).start()
@@ -0,0 +1,206 @@
+"""Layanan embedding lokal bersama (satu model per host) lewat Unix socket.
+
+Jalankan sekali per host:
+
+    python -m src.retrieval.embedding_service
+
+Lalu set EMBEDDING_SERVICE_SOCKET di semua worker uvicorn agar retriever memakai
+`EmbeddingServiceClient` alih-alih memuat model sendiri. Panggilan `embed_query`
+dari semua worker dikumpulkan menjadi micro-batch (maksimal
+EMBEDDING_BATCH_MAX_SIZE teks atau menunggu EMBEDDING_BATCH_MAX_WAIT_MS).
+
+Protokol: setiap frame = panjang 4 byte (big-endian) + JSON UTF-8.
+Request  {"texts": ["..."]}  ->  Response {"vectors": [[...]]} atau {"error": "..."}.
+"""
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+load_dotenv()
+
+EMBEDDING_SERVICE_SOCKET = os.getenv("EMBEDDING_SERVICE_SOCKET", "")
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+EMBEDDING_SERVICE_TIMEOUT = float(os.getenv("EMBEDDING_SERVICE_TIMEOUT", "10"))
+
+_HEADER = struct.Struct(">I")
+
+
+def _encode_frame(payload: Dict[str, Any]) -> bytes:
+    body = json.dumps(payload).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Koneksi ke embedding service terputus.")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+# ======================================================================
+# ========== SERVER (PEMILIK MODEL) ==========
+# ======================================================================
+class MicroBatcher:
+    """Mengumpulkan teks dari banyak koneksi lalu meng-embed-nya per batch."""
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]], max_batch_size: int, max_wait_ms: float):
+        self._embed_fn = embed_fn
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "asyncio.Queue[Tuple[str, asyncio.Future]]" = asyncio.Queue()
+        # Satu thread saja: model dipakai bergantian, paralelisme ada di dalam batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-batch")
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._queue.put_nowait((text, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._embed_fn, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+
+async def _handle_connection(batcher: MicroBatcher, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(_HEADER.size)
+            except asyncio.IncompleteReadError:
+                break
+            (size,) = _HEADER.unpack(header)
+            request = json.loads(await reader.readexactly(size))
+            try:
+                vectors = await batcher.embed(list(request.get("texts", [])))
+                response = {"vectors": vectors}
+            except Exception as e:
+                response = {"error": str(e)}
+            writer.write(_encode_frame(response))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: str, embeddings: Optional[Embeddings] = None):
+    """Menjalankan embedding service sampai proses dihentikan."""
+    if embeddings is None:
+        from src.retrieval.dependencies import get_embedding_function
+        embeddings = get_embedding_function()
+
+    batcher = MicroBatcher(embeddings.embed_documents, EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_MAX_WAIT_MS)
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = await asyncio.start_unix_server(
+        lambda r, w: _handle_connection(batcher, r, w), path=socket_path
+    )
+    print(f"✅ Embedding service siap di {socket_path} (batch={EMBEDDING_BATCH_MAX_SIZE}, wait={EMBEDDING_BATCH_MAX_WAIT_MS}ms)")
+    batch_task = asyncio.create_task(batcher.run())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+
+
+# ======================================================================
+# ========== CLIENT (DIPAKAI OLEH WORKER UVICORN) ==========
+# ======================================================================
+class EmbeddingServiceClient(Embeddings):
+    """Implementasi `Embeddings` yang meneruskan permintaan ke embedding service.
+
+    Koneksi disimpan per-thread sehingga aman dipakai dari threadpool FastAPI.
+    """
+
+    def __init__(self, socket_path: str = EMBEDDING_SERVICE_SOCKET, timeout: float = EMBEDDING_SERVICE_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        return sock
+
+    def _request(self, texts: List[str]) -> List[List[float]]:
+        frame = _encode_frame({"texts": texts})
+        # Satu kali reconnect jika koneksi lama sudah ditutup oleh server
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None) or self._connect()
+            try:
+                sock.sendall(frame)
+                (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+                response = json.loads(_recv_exact(sock, size))
+                break
+            except (ConnectionError, OSError):
+                sock.close()
+                self._local.sock = None
+                if attempt == 1:
+                    raise
+        if "error" in response:
+            raise RuntimeError(f"Embedding service error: {response['error']}")
+        return response["vectors"]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._request(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._request([text])[0]
+
+
+def main():
+    if not EMBEDDING_SERVICE_SOCKET:
+        raise SystemExit("Set EMBEDDING_SERVICE_SOCKET, misalnya /tmp/nl2sql-embed.sock")
+    asyncio.run(serve(EMBEDDING_SERVICE_SOCKET))
+
+
+if __name__ == "__main__":
+    main()
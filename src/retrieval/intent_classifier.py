@@ -0,0 +1,211 @@
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from src.utils import metrics
+from src.utils.schema_spec import get_column_names, get_column_synonyms, get_common_questions, get_table_names
+from src.utils.tracing import get_logger, span
+
+load_dotenv()
+
+logger = get_logger("intent_classifier")
+
+# Pengganti lokal untuk router LLM (data_perusahaan vs pengetahuan_umum).
+# Klasifikasi: aturan kata kunci dari sinonim skema + kemiripan embedding terhadap contoh berlabel.
+# Jika keyakinan di bawah ambang batas, keputusan diserahkan ke router LLM.
+INTENT_CLASSIFIER_ENABLED = os.getenv("INTENT_CLASSIFIER_ENABLED", "true").lower() == "true"
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.08"))
+# Jalur cepat tanpa embedding hanya untuk identifier skema (nama tabel/kolom); sinonim umum cuma menambah skor
+INTENT_KEYWORD_SHORTCUT_HITS = int(os.getenv("INTENT_KEYWORD_SHORTCUT_HITS", "1"))
+INTENT_KEYWORD_WEIGHT = float(os.getenv("INTENT_KEYWORD_WEIGHT", "0.05"))
+INTENT_HISTORY_LIMIT = int(os.getenv("INTENT_HISTORY_LIMIT", "500"))
+# Setelah build gagal, dicoba lagi paling cepat INTENT_RETRY_S kemudian (sementara itu router LLM)
+INTENT_RETRY_S = float(os.getenv("INTENT_RETRY_S", "300"))
+INTENT_TOP_K = 3
+
+LABEL_DATA = "data_perusahaan"
+LABEL_GENERAL = "pengetahuan_umum"
+
+# Kata kunci domain dari ROUTER_PROMPT, dilengkapi sinonim kolom di YAML
+DOMAIN_KEYWORDS = [
+    "anggaran", "realisasi", "sisa dana", "kegiatan", "unit kerja",
+    "sasaran strategis", "program strategis", "pagu",
+]
+# Istilah yang hanya muncul di pertanyaan tentang data ini; dilengkapi nama tabel dan kolom di YAML
+DOMAIN_IDENTIFIERS = ["drauk", "rkat"]
+
+# Contoh pertanyaan di luar data perusahaan (kelas negatif)
+GENERAL_EXEMPLARS = [
+    "Siapa presiden pertama Indonesia?",
+    "Apa itu machine learning?",
+    "Jelaskan teori relativitas secara sederhana",
+    "Bagaimana cara membuat nasi goreng?",
+    "Berapa jarak bumi ke bulan?",
+    "Apa ibu kota Australia?",
+    "Siapa pemenang piala dunia 2022?",
+    "Tuliskan puisi tentang hujan",
+    "Bagaimana cuaca hari ini?",
+    "Terjemahkan kalimat ini ke bahasa Inggris",
+    "Apa itu fotosintesis?",
+    "Rekomendasikan film yang bagus untuk ditonton",
+    "Bagaimana cara belajar bahasa pemrograman Python?",
+    "Kapan Indonesia merdeka?",
+]
+
+
+@dataclass
+class IntentResult:
+    label: str
+    confidence: float
+    source: str  # "keyword" atau "embedding"
+
+    @property
+    def escalate(self) -> bool:
+        return self.confidence < INTENT_CONFIDENCE_THRESHOLD
+
+
+def _keyword_patterns(phrases: Iterable[str]) -> List[re.Pattern]:
+    unique = sorted({p.strip().lower() for p in phrases if p and len(p.strip()) >= 3})
+    return [re.compile(rf"\b{re.escape(p)}\b") for p in unique]
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IntentClassifier:
+    def __init__(self, embeddings: Embeddings, exemplars: Dict[str, List[str]], keywords: Iterable[str],
+                 identifiers: Iterable[str] = ()):
+        self._embeddings = embeddings
+        self._keywords = _keyword_patterns(keywords)
+        self._identifiers = _keyword_patterns(identifiers)
+        self._labels: List[str] = []
+        texts: List[str] = []
+        for label, questions in exemplars.items():
+            for question in questions:
+                self._labels.append(label)
+                texts.append(question)
+        self._label_array = np.array(self._labels)
+        self._matrix = _normalize_rows(np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+
+    def keyword_hits(self, question: str) -> int:
+        lowered = question.lower()
+        return sum(1 for pattern in self._keywords if pattern.search(lowered))
+
+    def identifier_hits(self, question: str) -> int:
+        lowered = question.lower()
+        return sum(1 for pattern in self._identifiers if pattern.search(lowered))
+
+    def classify(self, question: str) -> IntentResult:
+        # Jalur cepat (mikrodetik): nama tabel/kolom disebut langsung -> jelas data perusahaan.
+        # Sinonim umum ("anggaran", "tahun") juga muncul di pertanyaan umum, jadi hanya menambah skor embedding.
+        if INTENT_KEYWORD_SHORTCUT_HITS > 0 and self.identifier_hits(question) >= INTENT_KEYWORD_SHORTCUT_HITS:
+            return IntentResult(LABEL_DATA, 1.0, "keyword")
+        hits = self.keyword_hits(question)
+
+        vector = np.asarray(self._embeddings.embed_query(question), dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        similarities = self._matrix @ vector
+
+        scores = {}
+        for label in (LABEL_DATA, LABEL_GENERAL):
+            label_scores = similarities[self._label_array == label]
+            if label_scores.size == 0:
+                scores[label] = 0.0
+                continue
+            top = np.sort(label_scores)[-INTENT_TOP_K:]
+            scores[label] = float(top.mean())
+        scores[LABEL_DATA] += INTENT_KEYWORD_WEIGHT * hits
+
+        label = max(scores, key=scores.get)
+        return IntentResult(label, abs(scores[LABEL_DATA] - scores[LABEL_GENERAL]), "embedding")
+
+
+def build_intent_classifier(embeddings: Embeddings, history: Optional[List[str]] = None) -> IntentClassifier:
+    """Menyusun classifier dari common_questions YAML, riwayat user_promt, dan sinonim skema."""
+    data_exemplars = [q["question"] for q in get_common_questions() if q.get("question")]
+    data_exemplars.extend(history or [])
+
+    keywords = list(DOMAIN_KEYWORDS)
+    for column, synonyms in get_column_synonyms().items():
+        keywords.append(column.replace("_", " "))
+        keywords.extend(synonyms)
+
+    # Nama tabel dan nama kolom bergaris bawah (Tahun_Anggaran), bukan kata biasa
+    identifiers = list(DOMAIN_IDENTIFIERS) + get_table_names()
+    identifiers.extend(column for column in get_column_names() if "_" in column)
+
+    return IntentClassifier(
+        embeddings,
+        {LABEL_DATA: data_exemplars, LABEL_GENERAL: list(GENERAL_EXEMPLARS)},
+        keywords,
+        identifiers,
+    )
+
+
+_classifier: Optional[IntentClassifier] = None
+_classifier_failed_at: Optional[float] = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier() -> Optional[IntentClassifier]:
+    """Classifier singleton per worker; None jika dinonaktifkan atau gagal dibangun."""
+    global _classifier, _classifier_failed_at
+    if not INTENT_CLASSIFIER_ENABLED:
+        return None
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                if _classifier_failed_at is not None and time.monotonic() - _classifier_failed_at < INTENT_RETRY_S:
+                    return None
+                from src.db.trx_pertanyaan_repo import get_recent_user_prompts
+                from src.retrieval.dependencies import get_shared_embedding_function
+                try:
+                    _classifier = build_intent_classifier(
+                        get_shared_embedding_function(),
+                        get_recent_user_prompts(INTENT_HISTORY_LIMIT),
+                    )
+                    _classifier_failed_at = None
+                except Exception as e:
+                    _classifier_failed_at = time.monotonic()
+                    metrics.incr("router.classifier_build_errors")
+                    logger.error("Gagal membangun intent classifier, memakai router LLM", error=str(e),
+                                 retry_in_s=INTENT_RETRY_S)
+                    return None
+    return _classifier
+
+
+def route_question(question: str, llm_router: Callable[[], str]) -> Tuple[str, str]:
+    """
+    Mengembalikan (klasifikasi, sumber). Classifier lokal dipakai jika yakin;
+    selain itu `llm_router` dipanggil (router LLM lama).
+    """
+    with span("router") as router_span:
+        label, source = _route_question(question, llm_router)
+        if router_span is not None:
+            router_span.set(**{"router.label": label.strip()[:64], "router.source": source})
+        return label, source
+
+
+def _route_question(question: str, llm_router: Callable[[], str]) -> Tuple[str, str]:
+    classifier = get_intent_classifier()
+    if classifier is not None:
+        try:
+            result = classifier.classify(question)
+            if not result.escalate:
+                metrics.incr(f"router.local.{result.source}")
+                return result.label, "local"
+        except Exception as e:
+            logger.error("Intent classifier error, eskalasi ke router LLM", error=str(e))
+
+    metrics.incr("router.llm")
+    return llm_router(), "llm"
@@ -0,0 +1,72 @@
+from typing import List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.retrieval.schema_retriever import build_schema_documents
+from src.search.entity_index import find_entity_mentions, format_entity_hints
+from src.search.table_index import SCHEMA_COLUMNS_PER_TABLE, SCHEMA_TABLES_K, get_schema_table_index
+from src.utils import metrics
+from src.utils.resilience import get_breaker, guarded_call
+from src.utils.tracing import get_logger, set_attributes
+
+logger = get_logger("local_retriever")
+
+QDRANT_BREAKER = "qdrant"
+
+
+class LocalSchemaRetriever(BaseRetriever):
+    """
+    Retriever tanpa Qdrant/embedding, dua tahap: tabel dipilih dengan BM25 atas ringkasan tabel di YAML skema,
+    lalu kolom tabel terpilih diurutkan berdasarkan jumlah term (ter-stem) yang cocok dengan pertanyaan
+    (src/search/table_index.py). Dipakai sebagai fallback saat Qdrant atau embedding tidak tersedia.
+    """
+
+    max_tables: int = SCHEMA_TABLES_K
+    max_columns: int = SCHEMA_COLUMNS_PER_TABLE
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        index = get_schema_table_index()
+        tables = [match.table for match in index.select_tables(query, self.max_tables)]
+        columns = {table: index.rank_columns(table, query, self.max_columns) for table in tables}
+        return build_schema_documents(index, tables, columns, "local")
+
+
+class ResilientRetriever(BaseRetriever):
+    """Retriever utama (Qdrant) lewat circuit breaker + deadline stage `retrieve`; jika gagal, pakai `fallback`."""
+
+    primary: BaseRetriever
+    fallback: BaseRetriever
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        try:
+            return guarded_call([get_breaker(QDRANT_BREAKER)], "retrieve", lambda: self.primary.invoke(query))
+        except Exception as e:
+            metrics.incr("retrieve.fallback_local")
+            set_attributes(**{"retrieve.fallback": "local"})
+            logger.warning("Retriever Qdrant gagal, memakai retriever lokal", error=str(e))
+            return self.fallback.invoke(query)
+
+
+class EntityHintRetriever(BaseRetriever):
+    """
+    Menambahkan dokumen berisi nilai kanonik kolom kategorikal yang disebut di pertanyaan (index trigram,
+    src/search/entity_index.py) ke hasil retriever `base`, sehingga prompt SQL memakai nilai yang benar-benar ada.
+    """
+
+    base: BaseRetriever
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        documents = self.base.invoke(query)
+        try:
+            mentions = find_entity_mentions(query)
+        except Exception as e:
+            logger.warning("Pencarian nilai entitas gagal", error=str(e))
+            return documents
+        set_attributes(**{"retrieve.entity_hints": len(mentions)})
+        if not mentions:
+            return documents
+        metrics.incr("retrieve.entity_hints")
+        hint = Document(page_content=format_entity_hints(mentions), metadata={"source": "entity_index", "retriever": "entity"})
+        return [*documents, hint]
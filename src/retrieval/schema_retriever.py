@@ -0,0 +1,114 @@
+import os
+from typing import Any, Dict, List, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from src.db.config_qdrant import QDRANT_METADATA_KEY, search_points
+from src.search.table_index import (
+    SCHEMA_COLUMNS_PER_TABLE,
+    SCHEMA_TABLES_K,
+    SchemaTableIndex,
+    format_joins,
+    get_schema_table_index,
+)
+from src.utils import metrics
+from src.utils.schema_spec import SCHEMA_YAML_PATH, get_table_names
+from src.utils.tracing import set_attributes
+
+load_dotenv()
+
+# Tabel hasil Qdrant yang skornya lebih rendah dari (skor teratas - margin) tidak diikutkan
+SCHEMA_TABLE_VECTOR_MARGIN = float(os.getenv("SCHEMA_TABLE_VECTOR_MARGIN", "0.1"))
+
+# Jenis point di koleksi Qdrant (payload metadata.kind), ditulis oleh scripts/ingest_schema.py
+KIND_TABLE = "table"
+KIND_COLUMN = "column"
+
+
+def build_schema_documents(index: SchemaTableIndex, tables: List[str], columns: Dict[str, List[Dict[str, Any]]],
+                           retriever: str) -> List[Document]:
+    """Satu dokumen per tabel terpilih (deskripsi, aturan bisnis, kolom relevan) + relasi antar tabel terpilih."""
+    documents = [
+        Document(page_content=index.format_table(table, columns.get(table, [])),
+                 metadata={"source": SCHEMA_YAML_PATH, "retriever": retriever, "table": table})
+        for table in tables
+    ]
+    joins = index.join_paths(tables)
+    if joins:
+        documents.append(Document(page_content=format_joins(joins),
+                                  metadata={"source": SCHEMA_YAML_PATH, "retriever": retriever, "kind": "joins"}))
+    set_attributes(**{"retrieve.tables": ",".join(tables), "retrieve.table_source": retriever})
+    metrics.observe("retrieve.tables", len(tables))
+    return documents
+
+
+def selected_tables(documents: List[Document]) -> List[str]:
+    tables = []
+    for document in documents:
+        table = document.metadata.get("table")
+        if table and table not in tables:
+            tables.append(table)
+    return tables
+
+
+def format_schema_whitelist(documents: List[Document]) -> str:
+    """Whitelist tabel & kolom untuk prompt SQL, hanya dari tabel yang terpilih oleh retriever."""
+    # Dokumen tanpa metadata tabel (retriever lama): semua tabel di YAML
+    return get_schema_table_index().format_whitelist(selected_tables(documents) or get_table_names())
+
+
+def format_schema_context(documents: List[Document]) -> str:
+    return "\n---\n".join(document.page_content for document in documents)
+
+
+def schema_prompt_inputs(documents: List[Document]) -> Dict[str, str]:
+    """Variabel `whitelist` dan `context` untuk prompt SQL dari hasil retriever skema."""
+    return {"whitelist": format_schema_whitelist(documents), "context": format_schema_context(documents)}
+
+
+class QdrantSchemaRetriever(BaseRetriever):
+    """
+    Retrieval skema dua tahap di Qdrant dengan satu embedding pertanyaan: (1) point ringkasan tabel
+    (metadata.kind = table), (2) point kolom yang difilter ke tabel terpilih (metadata.table). Search lewat client
+    async bersama per worker (src/db/config_qdrant.py) dengan HNSW ef tetap. Koleksi lama yang belum di-ingest per
+    tabel tetap bisa dipakai: tahap yang tidak menemukan point memakai index lokal (src/search/table_index.py).
+    """
+
+    collection: str
+    embeddings: Embeddings
+    max_tables: int = SCHEMA_TABLES_K
+    max_columns: int = SCHEMA_COLUMNS_PER_TABLE
+
+    def _search(self, vector: List[float], limit: int, must: Dict[str, Any]) -> List[Tuple[Dict[str, Any], float]]:
+        """(metadata, skor) point hasil search, terurut skor."""
+        points = search_points(vector, limit, must, self.collection)
+        return [((point.payload or {}).get(QDRANT_METADATA_KEY) or {}, point.score) for point in points]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        index = get_schema_table_index()
+        embedding = self.embeddings.embed_query(query)
+
+        hits = [(metadata, score) for metadata, score in self._search(embedding, self.max_tables, {"kind": KIND_TABLE})
+                if metadata.get("table") in index.spec]
+        if hits:
+            cutoff = hits[0][1] - SCHEMA_TABLE_VECTOR_MARGIN
+            tables = list(dict.fromkeys(metadata["table"] for metadata, score in hits if score >= cutoff))
+        else:
+            metrics.incr("retrieve.tables_local")
+            tables = [match.table for match in index.select_tables(query, self.max_tables)]
+
+        found: Dict[str, List[Dict[str, Any]]] = {table: [] for table in tables}
+        for metadata, _ in self._search(embedding, self.max_columns * len(tables), {"kind": KIND_COLUMN, "table": tables}):
+            table = metadata.get("table")
+            column = index.column(table, metadata.get("column")) if table in found else None
+            if column is not None:
+                found[table].append(column)
+        columns = {
+            table: index.order_columns(table, found[table]) if found[table] else index.rank_columns(table, query, self.max_columns)
+            for table in tables
+        }
+        return build_schema_documents(index, tables, columns, "qdrant")
@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel
 
 
@@ -55,4 +56,25 @@ class NLToSQLRequestEndpoint(BaseModel):
                 "unit": "Direktorat Keuangan",
                 "nip": "123456789"
             }
-        }
\ No newline at end of file
+        }
+
+class BatchQuestionItem(BaseModel):
+    question: str
+    unit: str
+    nip: str
+
+
+class BatchNLToSQLRequest(BaseModel):
+    model_name: str
+    items: List[BatchQuestionItem]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "model_name": "meta-llama/llama-3-70b-instruct",
+                "items": [
+                    {"question": "Berapa total pagu anggaran tahun 2024?", "unit": "Direktorat Keuangan", "nip": "123456789"},
+                    {"question": "Unit mana yang anggarannya paling besar?", "unit": "Direktorat Keuangan", "nip": "123456789"}
+                ]
+            }
+        }
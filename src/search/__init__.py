@@ -0,0 +1,4 @@
+"""Full-text search atas riwayat pertanyaan (trx_pertanyaan) untuk dashboard."""
+from src.search.index import schedule_search_sync, search_questions, sync_search_index
+
+__all__ = ["schedule_search_sync", "search_questions", "sync_search_index"]
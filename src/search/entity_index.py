@@ -0,0 +1,223 @@
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.db.entity_values import get_entity_values, get_entity_values_version
+from src.search.indonesian import STOPWORDS
+from src.utils.tracing import get_logger
+
+load_dotenv()
+
+logger = get_logger("entity_index")
+
+# Index trigram (per kata, gaya pg_trgm) atas nilai distinct kolom kategorikal drauk_unit (src/db/entity_values.py).
+# Dipakai untuk (1) mengenali nilai yang disebut di pertanyaan walaupun salah ketik / tidak lengkap, lalu
+# menyuntikkan nilai kanoniknya ke konteks prompt SQL, dan (2) memperbaiki literal string di SQL hasil LLM
+# (src/validation/literal_repair.py). Posting list berupa array numpy sehingga skor semua nilai dihitung
+# dengan satu bincount. Index dibangun ulang otomatis saat nilai entitas berubah.
+ENTITY_HINTS_ENABLED = os.getenv("ENTITY_HINTS_ENABLED", "true").lower() == "true"
+ENTITY_HINT_THRESHOLD = float(os.getenv("ENTITY_HINT_THRESHOLD", "0.45"))
+ENTITY_HINTS_MAX = int(os.getenv("ENTITY_HINTS_MAX", "8"))
+# Kata yang muncul di lebih dari rasio ini dari nilai (mis. "fakultas", "program") tidak cukup untuk menyebut nilai
+ENTITY_GENERIC_WORD_RATIO = float(os.getenv("ENTITY_GENERIC_WORD_RATIO", "0.05"))
+
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+_MAX_CANDIDATES = 50
+_SAME_SPAN_MARGIN = 0.1
+_MAX_PER_SPAN = 3
+
+
+def fold(text: str) -> str:
+    return _WHITESPACE.sub(" ", str(text).strip().lower())
+
+
+def _word_trigrams(word: str) -> Set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    grams: Set[str] = set()
+    for word in _WORD.findall(fold(text)):
+        grams |= _word_trigrams(word)
+    return frozenset(grams)
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+@dataclass
+class EntityMatch:
+    column: str
+    value: str
+    score: float
+    mention: str  # teks di pertanyaan / literal SQL yang cocok dengan nilai
+
+
+class EntityValueIndex:
+    def __init__(self, values: Dict[str, List[str]]):
+        self.columns: List[str] = []
+        self.values: List[str] = []
+        self.grams: List[FrozenSet[str]] = []
+        word_counts: List[int] = []
+        postings: Dict[str, List[int]] = {}
+        self._exact: Dict[Tuple[str, str], str] = {}
+        document_frequency: Counter = Counter()
+
+        for column, column_values in values.items():
+            for value in column_values:
+                folded = fold(value)
+                grams = trigrams(folded)
+                if not grams:
+                    continue
+                entry = len(self.values)
+                self.columns.append(column)
+                self.values.append(value)
+                self.grams.append(grams)
+                words = _WORD.findall(folded)
+                word_counts.append(len(words))
+                document_frequency.update(set(words))
+                self._exact.setdefault((column, folded), value)
+                for gram in grams:
+                    postings.setdefault(gram, []).append(entry)
+
+        self._postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._sizes = np.asarray([len(g) for g in self.grams], dtype=np.float32)
+        self._word_counts = word_counts
+        self._column_masks = {c: np.asarray([col == c for col in self.columns], dtype=bool) for c in set(self.columns)}
+        limit = max(3, ENTITY_GENERIC_WORD_RATIO * len(self.values))
+        self._generic = {word for word, count in document_frequency.items() if count > limit}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def resolve_column(self, name: str) -> Optional[str]:
+        """Nama kolom yang diindex (case-insensitive, tanpa backtick/kualifikasi tabel), atau None."""
+        bare = name.strip("`\"").split(".")[-1].strip("`\"").lower()
+        return next((c for c in self._column_masks if c.lower() == bare), None)
+
+    def exact(self, column: str, text: str) -> Optional[str]:
+        return self._exact.get((column, fold(text)))
+
+    def _overlaps(self, grams) -> np.ndarray:
+        arrays = [self._postings[g] for g in grams if g in self._postings]
+        if not arrays:
+            return np.zeros(len(self.values), dtype=np.float32)
+        return np.bincount(np.concatenate(arrays), minlength=len(self.values)).astype(np.float32)
+
+    def search(self, text: str, column: Optional[str] = None, limit: int = 5, threshold: float = 0.0) -> List[EntityMatch]:
+        """Nilai dengan similarity trigram tertinggi terhadap `text` (opsional hanya satu kolom)."""
+        grams = trigrams(text)
+        if not grams or not self.values:
+            return []
+        overlap = self._overlaps(grams)
+        scores = overlap / (self._sizes + len(grams) - overlap)
+        if column is not None:
+            scores = np.where(self._column_masks.get(column, np.zeros(len(self.values), dtype=bool)), scores, 0.0)
+        candidates = np.nonzero(scores >= max(threshold, 1e-6))[0]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")][:limit]
+        return [EntityMatch(self.columns[i], self.values[i], float(scores[i]), text) for i in ranked]
+
+    def find_mentions(self, question: str, threshold: float = ENTITY_HINT_THRESHOLD,
+                      limit: int = ENTITY_HINTS_MAX) -> List[EntityMatch]:
+        """
+        Nilai yang disebut di pertanyaan: skor = similarity terbaik antara nilai dan rangkaian kata di pertanyaan
+        (panjang jumlah kata nilai ±1). Rangkaian harus memuat kata informatif (bukan stopword/kata umum/angka).
+        """
+        if not self.values:
+            return []
+        folded = fold(question)
+        tokens = [(m.group(0), m.start(), m.end()) for m in _WORD.finditer(folded)]
+        informative = {i for i, (word, _, _) in enumerate(tokens)
+                       if word not in STOPWORDS and word not in self._generic and not word.isdigit()}
+        if not informative:
+            return []
+
+        # Kandidat: nilai yang sebagian besar trigramnya muncul di kata informatif pertanyaan
+        question_grams: Set[str] = set()
+        for i in informative:
+            question_grams |= _word_trigrams(tokens[i][0])
+        coverage = self._overlaps(question_grams) / self._sizes
+        candidates = np.nonzero(coverage >= threshold)[0]
+        candidates = candidates[np.argsort(-coverage[candidates], kind="stable")][:_MAX_CANDIDATES]
+
+        window_grams: Dict[Tuple[int, int], FrozenSet[str]] = {}
+        scored = []
+        for entry in candidates:
+            best, best_span = 0.0, None
+            words = self._word_counts[entry]
+            for length in {max(1, words - 1), words, words + 1}:
+                for start in range(0, len(tokens) - length + 1):
+                    span = (start, start + length)
+                    if not any(i in informative for i in range(*span)):
+                        continue
+                    if span not in window_grams:
+                        window_grams[span] = trigrams(folded[tokens[span[0]][1]:tokens[span[1] - 1][2]])
+                    score = similarity(self.grams[entry], window_grams[span])
+                    if score > best:
+                        best, best_span = score, span
+            if best >= threshold:
+                scored.append((best, int(entry), best_span))
+
+        # Rangkaian kata tidak boleh tumpang tindih; satu rangkaian boleh punya beberapa nilai dengan skor hampir sama
+        scored.sort(key=lambda item: (-item[0], item[2][0] - item[2][1]))
+        chosen: List[EntityMatch] = []
+        spans: Dict[Tuple[int, int], List[float]] = {}
+        for score, entry, span in scored:
+            if len(chosen) >= limit:
+                break
+            if span in spans:
+                if len(spans[span]) >= _MAX_PER_SPAN or score < spans[span][0] - _SAME_SPAN_MARGIN:
+                    continue
+            elif any(span[0] < other[1] and other[0] < span[1] for other in spans):
+                continue
+            spans.setdefault(span, []).append(score)
+            mention = folded[tokens[span[0]][1]:tokens[span[1] - 1][2]]
+            chosen.append(EntityMatch(self.columns[entry], self.values[entry], round(score, 3), mention))
+        return chosen
+
+
+_index_lock = threading.Lock()
+_index: Tuple[int, Optional[EntityValueIndex]] = (-1, None)
+
+
+def get_entity_index() -> EntityValueIndex:
+    """Index untuk nilai entitas terbaru (dibangun ulang jika nilai berubah)."""
+    global _index
+    values = get_entity_values()
+    version = get_entity_values_version()
+    with _index_lock:
+        if _index[0] != version or _index[1] is None:
+            _index = (version, EntityValueIndex(values))
+            logger.info("Index nilai entitas dibangun", values=len(_index[1]))
+        return _index[1]
+
+
+def warm_entity_index():
+    """Memuat nilai entitas dan membangun index di background (saat startup), tanpa menahan import."""
+    threading.Thread(target=get_entity_index, name="entity-index-warmup", daemon=True).start()
+
+
+def find_entity_mentions(question: str) -> List[EntityMatch]:
+    if not ENTITY_HINTS_ENABLED:
+        return []
+    return get_entity_index().find_mentions(question)
+
+
+def format_entity_hints(matches: List[EntityMatch]) -> str:
+    """Teks konteks untuk prompt SQL: nilai kanonik yang harus dipakai untuk filter."""
+    lines = ["Nilai data yang dikenali dari pertanyaan (untuk filter, salin nilai persis seperti tertulis):"]
+    for match in matches:
+        lines.append(f"- Kolom `{match.column}`: '{match.value}' (disebut sebagai \"{match.mention}\")")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,326 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from src.search.indonesian import analyze
+from src.utils import metrics
+from src.utils.tracing import get_logger, span
+
+load_dotenv()
+
+logger = get_logger("search_index")
+
+# Indeks full-text lokal (SQLite FTS5) atas trx_pertanyaan.user_promt dan output_analisa.
+# Teks di-stem (bahasa Indonesia) sebelum masuk FTS5; metadata (unit, nip, udcr) dan teks asli disimpan
+# di tabel terpisah agar hasil bisa dikembalikan tanpa query ke MySQL.
+# Sinkronisasi inkremental berdasarkan id_pertanyaan: dipicu setiap insert audit (dikoalesi, di background),
+# dan `python scripts/rebuild_search_index.py` untuk pengisian awal / rebuild.
+# id auto-increment tidak selalu commit berurutan (transaksi dengan id lebih kecil bisa commit belakangan), jadi
+# SEARCH_SYNC_OVERLAP_IDS id terakhir di bawah kursor selalu diperiksa ulang, dan setiap SEARCH_RECONCILE_S jumlah
+# baris dibandingkan dengan trx_pertanyaan (jika beda: id yang hilang diindeks, id yang sudah dihapus dibuang).
+SEARCH_INDEX_PATH = os.getenv(
+    "SEARCH_INDEX_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "search_index.sqlite3"),
+)
+SEARCH_SYNC_ENABLED = os.getenv("SEARCH_SYNC_ENABLED", "true").lower() == "true"
+SEARCH_SYNC_BATCH = int(os.getenv("SEARCH_SYNC_BATCH", "5000"))
+SEARCH_SYNC_OVERLAP_IDS = int(os.getenv("SEARCH_SYNC_OVERLAP_IDS", "1000"))
+SEARCH_RECONCILE_S = float(os.getenv("SEARCH_RECONCILE_S", "3600"))
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", "100"))
+SEARCH_ANALISA_PREVIEW_CHARS = int(os.getenv("SEARCH_ANALISA_PREVIEW_CHARS", "300"))
+# Bobot bm25 per kolom: kecocokan di pertanyaan lebih relevan daripada di jawaban
+SEARCH_PROMPT_WEIGHT = float(os.getenv("SEARCH_PROMPT_WEIGHT", "2.0"))
+SEARCH_ANALISA_WEIGHT = float(os.getenv("SEARCH_ANALISA_WEIGHT", "1.0"))
+
+_local = threading.local()
+_last_reconcile = 0.0
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        os.makedirs(os.path.dirname(os.path.abspath(SEARCH_INDEX_PATH)), exist_ok=True)
+        connection = sqlite3.connect(SEARCH_INDEX_PATH, timeout=10, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        _local.connection = connection
+    return connection
+
+
+def get_search_index() -> sqlite3.Connection:
+    global _schema_ready
+    connection = _connect()
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                connection.executescript("""
+                    CREATE TABLE IF NOT EXISTS search_docs (
+                        id_pertanyaan INTEGER PRIMARY KEY,
+                        unit TEXT,
+                        nip TEXT,
+                        udcr TEXT,
+                        user_promt TEXT,
+                        output_analisa TEXT
+                    );
+                    CREATE INDEX IF NOT EXISTS idx_search_docs_udcr ON search_docs (udcr);
+                    CREATE INDEX IF NOT EXISTS idx_search_docs_unit ON search_docs (unit, udcr);
+                    CREATE INDEX IF NOT EXISTS idx_search_docs_nip ON search_docs (nip, udcr);
+                    CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+                        prompt_terms, analisa_terms, tokenize = 'unicode61 remove_diacritics 2'
+                    );
+                """)
+                _schema_ready = True
+    return connection
+
+
+def _format_udcr(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+def index_documents(rows: List[Dict[str, Any]]) -> int:
+    """Menambah/mengganti dokumen (baris trx_pertanyaan) di indeks; idempoten per id_pertanyaan."""
+    if not rows:
+        return 0
+    connection = get_search_index()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        for row in rows:
+            doc_id = int(row["id_pertanyaan"])
+            prompt = row.get("user_promt") or ""
+            analisa = row.get("output_analisa") or ""
+            connection.execute(
+                "INSERT OR REPLACE INTO search_docs (id_pertanyaan, unit, nip, udcr, user_promt, output_analisa) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_id, row.get("unit"), None if row.get("nip") is None else str(row["nip"]),
+                 _format_udcr(row.get("udcr")), prompt, analisa[:SEARCH_ANALISA_PREVIEW_CHARS]),
+            )
+            connection.execute("DELETE FROM search_fts WHERE rowid = ?", (doc_id,))
+            connection.execute(
+                "INSERT INTO search_fts (rowid, prompt_terms, analisa_terms) VALUES (?, ?, ?)",
+                (doc_id, " ".join(analyze(prompt)), " ".join(analyze(analisa))),
+            )
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    metrics.incr("search.indexed", len(rows))
+    return len(rows)
+
+
+def last_indexed_id() -> int:
+    row = get_search_index().execute("SELECT MAX(id_pertanyaan) AS last_id FROM search_docs").fetchone()
+    return row["last_id"] or 0
+
+
+def _indexed_ids(after_id: int, up_to_id: Optional[int] = None) -> List[int]:
+    sql, params = "SELECT id_pertanyaan FROM search_docs WHERE id_pertanyaan > ?", [after_id]
+    if up_to_id is not None:
+        sql += " AND id_pertanyaan <= ?"
+        params.append(up_to_id)
+    return [row[0] for row in get_search_index().execute(sql + " ORDER BY id_pertanyaan", params)]
+
+
+def remove_documents(ids: List[int]) -> int:
+    if not ids:
+        return 0
+    connection = get_search_index()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        for doc_id in ids:
+            connection.execute("DELETE FROM search_docs WHERE id_pertanyaan = ?", (doc_id,))
+            connection.execute("DELETE FROM search_fts WHERE rowid = ?", (doc_id,))
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    metrics.incr("search.removed", len(ids))
+    return len(ids)
+
+
+def _index_missing(source_ids: List[int], after_id: int, up_to_id: int) -> int:
+    """Mengindeks id di (after_id, up_to_id] yang ada di trx_pertanyaan tetapi belum ada di indeks."""
+    from src.db.trx_pertanyaan_repo import get_trx_pertanyaan_by_ids
+
+    missing = sorted(set(source_ids) - set(_indexed_ids(after_id, up_to_id)))
+    total = 0
+    for start in range(0, len(missing), SEARCH_SYNC_BATCH):
+        total += index_documents(get_trx_pertanyaan_by_ids(missing[start:start + SEARCH_SYNC_BATCH]))
+    if total:
+        metrics.incr("search.late_rows", total)
+    return total
+
+
+def reconcile_search_index() -> Dict[str, int]:
+    """
+    Menyamakan isi indeks dengan trx_pertanyaan jika jumlah barisnya berbeda: id yang belum terindeks ditambahkan,
+    id yang sudah tidak ada (retensi audit) dihapus. Hanya id yang dibandingkan, per halaman.
+    """
+    global _last_reconcile
+    from src.db.trx_pertanyaan_repo import count_trx_pertanyaan, get_trx_pertanyaan_ids_after
+
+    _last_reconcile = time.monotonic()
+    indexed_count = get_search_index().execute("SELECT COUNT(*) FROM search_docs").fetchone()[0]
+    source_count = count_trx_pertanyaan()
+    summary = {"source": source_count, "indexed": indexed_count, "added": 0, "removed": 0}
+    if source_count == indexed_count:
+        return summary
+
+    cursor, page = 0, SEARCH_SYNC_BATCH * 10
+    while True:
+        source_ids = get_trx_pertanyaan_ids_after(cursor, page)
+        up_to = source_ids[-1] if len(source_ids) == page else None
+        summary["added"] += _index_missing(source_ids, cursor, up_to if up_to is not None else last_indexed_id())
+        summary["removed"] += remove_documents(sorted(set(_indexed_ids(cursor, up_to)) - set(source_ids)))
+        if up_to is None:
+            break
+        cursor = up_to
+    metrics.incr("search.reconciled")
+    logger.info("Indeks pencarian direkonsiliasi", **summary)
+    return summary
+
+
+def sync_search_index(max_batches: Optional[int] = None) -> int:
+    """
+    Mengambil baris trx_pertanyaan dengan id > id terakhir di indeks, ditambah baris yang commit terlambat di
+    jendela SEARCH_SYNC_OVERLAP_IDS di bawahnya; mengembalikan jumlah yang diindeks.
+    """
+    from src.db.trx_pertanyaan_repo import get_trx_pertanyaan_after, get_trx_pertanyaan_ids_after
+
+    cursor = last_indexed_id()
+    total, batches = 0, 0
+    if cursor and SEARCH_SYNC_OVERLAP_IDS > 0:
+        window_start = max(0, cursor - SEARCH_SYNC_OVERLAP_IDS)
+        source_ids = [i for i in get_trx_pertanyaan_ids_after(window_start, SEARCH_SYNC_OVERLAP_IDS) if i <= cursor]
+        total += _index_missing(source_ids, window_start, cursor)
+
+    while max_batches is None or batches < max_batches:
+        rows = get_trx_pertanyaan_after(cursor, SEARCH_SYNC_BATCH)
+        total += index_documents(rows)
+        batches += 1
+        if len(rows) < SEARCH_SYNC_BATCH:
+            break
+        cursor = int(rows[-1]["id_pertanyaan"])
+
+    if SEARCH_RECONCILE_S > 0 and time.monotonic() - _last_reconcile >= SEARCH_RECONCILE_S:
+        total += reconcile_search_index()["added"]
+    return total
+
+
+class _SyncScheduler:
+    """Sinkronisasi di satu thread background; permintaan yang datang saat sync berjalan digabung jadi satu."""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-sync")
+        self._lock = threading.Lock()
+        self._pending = False
+
+    def schedule(self):
+        with self._lock:
+            if self._pending:
+                return
+            self._pending = True
+        self._executor.submit(self._run)
+
+    def _run(self):
+        with self._lock:
+            self._pending = False
+        try:
+            sync_search_index()
+        except Exception as e:
+            logger.error("Sinkronisasi indeks pencarian gagal", error=str(e))
+
+
+_scheduler = _SyncScheduler()
+
+
+def schedule_search_sync():
+    """Dipanggil dari jalur insert audit; tidak menambah latensi request."""
+    if SEARCH_SYNC_ENABLED:
+        _scheduler.schedule()
+
+
+def build_match_query(terms: List[str], mode: str = "all") -> str:
+    # Term sudah berupa huruf/angka hasil analyze(); tanda kutip tetap dipakai agar aman untuk sintaks FTS5
+    quoted = [f'"{term}"*' for term in dict.fromkeys(terms)]
+    return (" OR " if mode == "any" else " AND ").join(quoted)
+
+
+def search_questions(
+    query: str,
+    unit: Optional[str] = None,
+    nip: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    page: int = 1,
+    page_size: int = 20,
+    mode: str = "all",
+) -> Optional[Dict[str, Any]]:
+    """
+    Pencarian full-text dengan ranking bm25 dan filter unit/nip/tanggal.
+    Mengembalikan None jika query kosong setelah stopword dibuang. Paginasi memakai `has_more`
+    (tanpa COUNT(*) atas seluruh hasil, agar tetap cepat di jutaan baris).
+    """
+    terms = analyze(query)
+    if not terms:
+        return None
+    page = max(page, 1)
+    page_size = max(1, min(page_size, SEARCH_MAX_PAGE_SIZE))
+
+    conditions, params = ["search_fts MATCH ?"], [build_match_query(terms, mode)]
+    if unit:
+        conditions.append("d.unit = ?")
+        params.append(unit)
+    if nip:
+        conditions.append("d.nip = ?")
+        params.append(str(nip))
+    if date_from:
+        conditions.append("d.udcr >= ?")
+        params.append(date_from.isoformat())
+    if date_to:
+        conditions.append("d.udcr < ?")
+        params.append((date_to + timedelta(days=1)).isoformat())
+
+    sql = f"""
+        SELECT d.id_pertanyaan, d.unit, d.nip, d.udcr, d.user_promt, d.output_analisa,
+               bm25(search_fts, {SEARCH_PROMPT_WEIGHT}, {SEARCH_ANALISA_WEIGHT}) AS score
+        FROM search_fts JOIN search_docs d ON d.id_pertanyaan = search_fts.rowid
+        WHERE {" AND ".join(conditions)}
+        ORDER BY score
+        LIMIT ? OFFSET ?
+    """
+    params += [page_size + 1, (page - 1) * page_size]
+
+    with span("search", **{"search.terms": len(terms), "search.mode": mode}) as search_span:
+        start = time.perf_counter()
+        rows = get_search_index().execute(sql, params).fetchall()
+        metrics.observe("search.query_ms", (time.perf_counter() - start) * 1000)
+        if search_span is not None:
+            search_span.set(**{"search.results": len(rows)})
+
+    results = []
+    for row in rows[:page_size]:
+        item = dict(row)
+        item["score"] = round(-item["score"], 4)  # bm25 FTS5: makin kecil makin relevan
+        results.append(item)
+    return {
+        "type": "SUCCESS",
+        "query": query,
+        "terms": terms,
+        "page": page,
+        "page_size": page_size,
+        "has_more": len(rows) > page_size,
+        "results": results,
+    }
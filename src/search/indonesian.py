@@ -0,0 +1,96 @@
+import re
+from functools import lru_cache
+from typing import List
+
+# Tokenisasi + stemming bahasa Indonesia berbasis aturan (varian sederhana Nazief-Adriani tanpa kamus):
+# partikel (-lah, -kah, ...), kata ganti milik (-ku, -mu, -nya), akhiran (-kan, -an), lalu awalan
+# (me-, pe-, ber-, ter-, di-, ke-, se-) dengan aturan peluluhan. Yang penting: teks yang diindeks dan
+# query di-stem dengan aturan yang sama, sehingga "anggaran"/"menganggarkan" bertemu di "anggar".
+
+STOPWORDS = frozenset("""
+ada adalah agar akan aku anda apa apakah atas atau bagaimana bagi bahwa baik banyak beberapa belum berapa
+berikan bisa boleh dalam dan dapat dari daripada dengan di dia hal hanya harus hingga ia ingin ini itu jadi
+jika juga kalau kami kamu kapan karena ke kepada ketika kita lagi lain lalu maka mana masih mau melalui
+menjadi mereka milik mohon namun oleh pada para per perlu pula saat saja sama sampai saya sebagai sebelum
+secara sedang sehingga sejak semua sendiri seperti serta setiap siapa sudah supaya tahu tampilkan tanpa
+telah tentang tersebut tetapi tolong tunjukkan untuk yaitu yakni yang
+""".split())
+
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+_VOWELS = "aeiou"
+MIN_STEM_LENGTH = 3
+
+_PARTICLES = ("lah", "kah", "tah", "pun")
+_POSSESSIVES = ("nya", "ku", "mu")
+# Akhiran -i tidak dilepas: tanpa kamus terlalu sering salah (beli, pakai, realisasi)
+_SUFFIXES = ("kan", "an")
+# Kata umum di data anggaran yang kebetulan diawali "awalan"
+_PROTECTED = frozenset("""
+belanja berkas dinas diklat kelas kertas kesehatan keuangan medis pelayanan perguruan semester seminar
+sekolah sekretariat senat sertifikasi server sewa teknik teknologi terminal
+""".split())
+
+
+def _strip_suffix(word: str, suffixes) -> str:
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH + 1:
+            return word[: -len(suffix)]
+    return word
+
+
+def _strip_prefix(word: str) -> str:
+    """Satu awalan dengan aturan peluluhan (meny- -> s, mem- -> p, men- -> t, meng- -> k)."""
+    def long_enough(stem: str) -> bool:
+        return len(stem) >= MIN_STEM_LENGTH
+
+    for base in ("me", "pe"):
+        if not word.startswith(base):
+            continue
+        rest = word[2:]
+        if rest.startswith("ng"):
+            stem = rest[2:]                                         # mengambil -> ambil, menggunakan -> guna
+            return stem if long_enough(stem) else word
+        if rest.startswith("ny") and rest[2:3] in _VOWELS:
+            stem = "s" + rest[2:]                                   # menyusun -> susun
+            return stem if long_enough(stem) else word
+        if rest.startswith("m"):
+            stem = rest[1:]
+            if stem[:1] in _VOWELS:
+                stem = "p" + stem                                   # memakai -> pakai
+            return stem if long_enough(stem) else word              # membuat -> buat
+        if rest.startswith("n"):
+            stem = rest[1:]
+            if stem[:1] in _VOWELS:
+                stem = "t" + stem                                   # menulis -> tulis
+            return stem if long_enough(stem) else word              # mendapat -> dapat
+        if base == "pe" and rest.startswith("r"):
+            stem = rest[1:]                                         # perjalanan -> jalan(an)
+            return stem if long_enough(stem) else word
+        if rest[:1] in "lrwy" or base == "pe":
+            return rest if long_enough(rest) else word              # melihat -> lihat, pekerja -> kerja
+        return word
+
+    for prefix in ("ber", "ter", "be", "di", "ke", "se"):
+        if word.startswith(prefix):
+            stem = word[len(prefix):]
+            if prefix == "be" and not stem.startswith("ker"):
+                continue                                            # hanya bekerja -> kerja
+            return stem if long_enough(stem) else word
+    return word
+
+
+@lru_cache(maxsize=50000)
+def stem(word: str) -> str:
+    if len(word) <= MIN_STEM_LENGTH + 1 or word.isdigit() or word in _PROTECTED:
+        return word
+    stemmed = _strip_suffix(word, _PARTICLES)
+    stemmed = _strip_suffix(stemmed, _POSSESSIVES)
+    stemmed = _strip_suffix(stemmed, _SUFFIXES)
+    return _strip_prefix(stemmed)
+
+
+def analyze(text: str) -> List[str]:
+    """Teks -> daftar term ter-stem (huruf kecil, tanpa stopword)."""
+    if not text:
+        return []
+    return [stem(token) for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
@@ -0,0 +1,193 @@
+import os
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.search.indonesian import analyze
+from src.utils.schema_spec import load_schema_spec
+
+load_dotenv()
+
+# Retrieval skema dua tahap untuk skema dengan banyak tabel: (1) tabel dipilih dengan BM25 atas ringkasan tabel
+# (nama, deskripsi, aturan bisnis, nama/label/sinonim kolom, contoh pertanyaan), (2) kolom diurutkan hanya di dalam
+# tabel terpilih. Prompt SQL hanya memuat maksimal SCHEMA_TABLES_K tabel, sehingga ukuran prompt dan waktu retrieval
+# tidak ikut tumbuh dengan jumlah tabel di schema_description.yml. Posting list berupa array numpy: skor semua tabel
+# dihitung dengan satu penjumlahan per term pertanyaan.
+SCHEMA_TABLES_K = int(os.getenv("SCHEMA_TABLES_K", "3"))
+# Tabel dengan skor di bawah rasio ini dari skor tabel teratas tidak diikutkan
+SCHEMA_TABLE_RELATIVE_SCORE = float(os.getenv("SCHEMA_TABLE_RELATIVE_SCORE", "0.5"))
+SCHEMA_COLUMNS_PER_TABLE = int(os.getenv("SCHEMA_COLUMNS_PER_TABLE", "15"))
+# Skor tabel teratas minimal sebesar rasio ini dari bobot satu term yang hanya ada di satu tabel; di bawahnya
+# pertanyaan hanya cocok dengan term umum ("anggaran", "total") dan tabel default yang dipakai
+SCHEMA_TABLE_MIN_SCORE = float(os.getenv("SCHEMA_TABLE_MIN_SCORE", "0.25"))
+# Tabel yang dipakai jika tidak ada tabel yang cukup cocok (default: tabel pertama di YAML)
+SCHEMA_DEFAULT_TABLES = [t.strip() for t in os.getenv("SCHEMA_DEFAULT_TABLES", "").split(",") if t.strip()]
+
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+
+@dataclass
+class TableMatch:
+    table: str
+    score: float
+
+
+def _column_terms(column: Dict[str, Any], with_description: bool) -> List[str]:
+    parts = [str(column.get("name", "")).replace("_", " "), str(column.get("label", "")), " ".join(column.get("synonyms", []))]
+    if with_description:
+        parts.append(str(column.get("description", "")))
+    return analyze(" ".join(parts))
+
+
+def format_column(column: Dict[str, Any]) -> str:
+    # Baris kolom di konteks prompt SQL (juga isi point kolom di scripts/ingest_schema.py)
+    synonyms = ", ".join(column.get("synonyms", []))
+    return (
+        f"- Kolom `{column.get('name')}` (tipe data: {column.get('data_type', 'tipe tidak diketahui')}): "
+        f"{column.get('description')}. Pengguna mungkin menyebut kolom ini sebagai: '{synonyms}'.\n"
+    )
+
+
+class SchemaTableIndex:
+    def __init__(self, spec: Dict[str, Dict[str, Any]]):
+        self.spec = spec
+        self.tables: List[str] = list(spec)
+        self._columns: Dict[str, List[Tuple[Dict[str, Any], FrozenSet[str]]]] = {}
+        term_counts: List[Counter] = []
+
+        for table in self.tables:
+            details = spec[table] or {}
+            counts = Counter(analyze(table.replace("_", " ")))
+            counts.update(analyze(str(details.get("description", ""))))
+            for rule in details.get("business_rules", []) or []:
+                counts.update(analyze(str(rule)))
+            for question in details.get("common_questions", []) or []:
+                counts.update(analyze(str(question.get("question", ""))))
+            columns = []
+            for column in details.get("columns", []) or []:
+                if not column.get("name"):
+                    continue
+                counts.update(_column_terms(column, with_description=False))
+                columns.append((column, frozenset(_column_terms(column, with_description=True))))
+            self._columns[table] = columns
+            term_counts.append(counts)
+
+        lengths = np.asarray([sum(c.values()) for c in term_counts], dtype=np.float32)
+        average = max(float(lengths.mean()), 1.0) if len(lengths) else 1.0
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for position, counts in enumerate(term_counts):
+            for term, count in counts.items():
+                ids, frequencies = postings.setdefault(term, ([], []))
+                ids.append(position)
+                frequencies.append(count)
+
+        # Bobot BM25 per (term, tabel) dihitung saat build; query cukup menjumlahkan bobot
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, (ids, frequencies) in postings.items():
+            ids = np.asarray(ids, dtype=np.int32)
+            tf = np.asarray(frequencies, dtype=np.float32)
+            idf = np.log(1 + (len(self.tables) - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = tf + _BM25_K1 * (1 - _BM25_B + _BM25_B * lengths[ids] / average)
+            self._postings[term] = (ids, (idf * tf * (_BM25_K1 + 1) / norm).astype(np.float32))
+        self._min_score = SCHEMA_TABLE_MIN_SCORE * np.log(1 + (len(self.tables) - 0.5) / 1.5)
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def default_tables(self) -> List[str]:
+        return [t for t in SCHEMA_DEFAULT_TABLES if t in self.spec] or self.tables[:1]
+
+    def select_tables(self, question: str, limit: int = SCHEMA_TABLES_K) -> List[TableMatch]:
+        """Tahap 1: tabel paling relevan untuk pertanyaan (BM25), atau tabel default jika tidak ada yang cocok."""
+        scores = np.zeros(len(self.tables), dtype=np.float32)
+        for term in set(analyze(question)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        ranked = np.argsort(-scores, kind="stable")[:limit]
+        if not len(ranked) or scores[ranked[0]] <= 0 or scores[ranked[0]] < self._min_score:
+            return [TableMatch(table, 0.0) for table in self.default_tables()[:limit]]
+        cutoff = scores[ranked[0]] * SCHEMA_TABLE_RELATIVE_SCORE
+        return [TableMatch(self.tables[i], round(float(scores[i]), 4)) for i in ranked if scores[i] >= cutoff]
+
+    def rank_columns(self, table: str, question: str, limit: int = SCHEMA_COLUMNS_PER_TABLE) -> List[Dict[str, Any]]:
+        """Tahap 2: kolom tabel dengan term (ter-stem) paling banyak cocok, dalam urutan kolom di YAML."""
+        terms = set(analyze(question))
+        columns = self._columns.get(table, [])
+        ranked = sorted(range(len(columns)), key=lambda i: (-len(terms & columns[i][1]), i))
+        return [columns[i][0] for i in sorted(ranked[:limit])]
+
+    def columns(self, table: str) -> List[Dict[str, Any]]:
+        return [column for column, _ in self._columns.get(table, [])]
+
+    def column(self, table: str, name: str) -> Optional[Dict[str, Any]]:
+        return next((column for column, _ in self._columns.get(table, []) if column.get("name") == name), None)
+
+    def order_columns(self, table: str, columns: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Kolom unik dalam urutan YAML (hasil Qdrant diurutkan skor)."""
+        names = {column.get("name") for column in columns}
+        return [column for column in self.columns(table) if column.get("name") in names]
+
+    def join_paths(self, tables: List[str]) -> List[Dict[str, str]]:
+        """Relasi (key `joins` di YAML) yang kedua sisinya ada di `tables`."""
+        selected = set(tables)
+        joins, seen = [], set()
+        for table in tables:
+            for join in (self.spec.get(table) or {}).get("joins", []) or []:
+                target, condition = join.get("table"), join.get("on")
+                key = (frozenset((table, target)), condition)
+                if target in selected and condition and key not in seen:
+                    seen.add(key)
+                    joins.append({"from": table, **join})
+        return joins
+
+    def format_table(self, table: str, columns: List[Dict[str, Any]]) -> str:
+        details = self.spec.get(table) or {}
+        text = f"Informasi detail untuk tabel database bernama '{table}':\n"
+        text += f"Deskripsi umum tabel: {details.get('description', 'Tidak ada deskripsi.')}\n"
+        rules = details.get("business_rules", []) or []
+        if rules:
+            text += "Aturan bisnis:\n" + "".join(f"- {rule}\n" for rule in rules)
+        text += "Tabel ini memiliki kolom-kolom sebagai berikut:\n\n"
+        return text + "".join(format_column(column) for column in columns)
+
+    def format_whitelist(self, tables: List[str]) -> str:
+        return "\n".join(
+            f"- Tabel `{table}`: [{', '.join(column['name'] for column in self.columns(table))}]" for table in tables
+        )
+
+    def table_summary(self, table: str) -> str:
+        """Teks ringkasan tabel untuk embedding tahap 1 (scripts/ingest_schema.py)."""
+        details = self.spec.get(table) or {}
+        text = f"Tabel database '{table}': {details.get('description', '')}\n"
+        rules = details.get("business_rules", []) or []
+        if rules:
+            text += "Aturan bisnis: " + " ".join(str(rule) for rule in rules) + "\n"
+        column_labels = []
+        for column in self.columns(table):
+            synonyms = ", ".join(column.get("synonyms", []))
+            column_labels.append(f"{column['name']} ({synonyms})" if synonyms else column["name"])
+        text += "Kolom: " + "; ".join(column_labels) + "\n"
+        questions = [str(q.get("question", "")) for q in details.get("common_questions", []) or []]
+        if questions:
+            text += "Contoh pertanyaan: " + " ".join(questions) + "\n"
+        return text
+
+
+def format_joins(joins: List[Dict[str, str]]) -> str:
+    lines = ["Relasi antar tabel (gunakan kondisi ini untuk JOIN):"]
+    for join in joins:
+        description = f" -- {join['description']}" if join.get("description") else ""
+        lines.append(f"- `{join['from']}` JOIN `{join['table']}` ON {join['on']}{description}")
+    return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=1)
+def get_schema_table_index() -> SchemaTableIndex:
+    """Index tabel dari schema_description.yml (di-cache per proses, seperti load_schema_spec)."""
+    return SchemaTableIndex(load_schema_spec())
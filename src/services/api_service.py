@@ -1,3 +1,4 @@
+from typing import Any, Dict, Optional, Tuple
 from pydantic import BaseModel
 from src.nl2sql_service import (
     create_nl2sql_chain,
@@ -7,10 +8,20 @@ from src.nl2sql_service import (
     create_analysis_with_conversation_chain,
 )
 from src.db.executor import execute_sql_query
+from src.db.rollups import rewrite_for_rollup
+from src.services.conversation_store import estimate_tokens, get_conversation_store
+from src.retrieval.intent_classifier import route_question
+from src.utils.answer_templates import is_template_enabled, render_template_answer
 from src.utils.chain_wrapper import run_with_gemini_token_count
+from src.utils.hedging import hedged_call
 from src.utils.token_usage import merge_usage
-from src.validation import is_safe_select_query, sanitize_sql_output
+from src.validation import is_safe_select_query, repair_sql_literals, sanitize_sql_output
 from src.db.trx_pertanyaan_repo import insert_trx_pertanyaan
+from src.utils.question import normalize_question
+from src.utils.singleflight import SingleFlight
+from src.utils.tracing import get_logger, set_attributes
+
+logger = get_logger("api_service")
 
 # Base untuk payload
 class NLToSQLGeminiRequest(BaseModel):
@@ -22,9 +33,24 @@ class NLToSQLGeminiRequest(BaseModel):
     token_out: int = 0
     token_total: int = 0
 
-def route_and_generate_sql(payload: NLToSQLGeminiRequest):
-    router_chain = create_router_chain(payload.model_name) # check promt ( klasifikasi )
-    klasifikasi, usage_router = run_with_gemini_token_count(router_chain, {"payload.question": payload.question}, payload.model_name)
+# Request identik yang sedang berjalan bersamaan (pertanyaan, model, unit) hanya dijalankan sekali
+GEMINI_PIPELINE_FLIGHT = SingleFlight("gemini_pipeline")
+
+
+def _route_and_generate_sql_pipeline(payload: NLToSQLGeminiRequest) -> Tuple[Dict[str, Any], Optional[Dict[str, str]]]:
+    usage_router = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+
+    def llm_route() -> str:
+        nonlocal usage_router
+        output, usage_router = hedged_call(
+            "router",
+            lambda model: run_with_gemini_token_count(create_router_chain(model), {"payload.question": payload.question}, model), # check promt ( klasifikasi )
+            payload.model_name,
+            provider="gemini",
+        )
+        return output
+
+    klasifikasi, _ = route_question(payload.question, llm_route)
     usage = {
         "router_input": usage_router["input_tokens"],
         "router_output": usage_router["output_tokens"],
@@ -32,10 +58,14 @@ def route_and_generate_sql(payload: NLToSQLGeminiRequest):
     }
 
     if "pengetahuan_umum" in klasifikasi.lower():
-        return {"type": "REJECTED", "answer": "Maaf, saya hanya menjawab data perusahaan.", "token_usage": {"model": payload.model_name, **usage}}
+        return {"type": "REJECTED", "answer": "Maaf, saya hanya menjawab data perusahaan.", "token_usage": {"model": payload.model_name, **usage}}, None
 
-    sql_chain = create_nl2sql_chain(payload.model_name) # generate sql ( no to sql )
-    sql_query, usage_sql = run_with_gemini_token_count(sql_chain, payload.question, payload.model_name)
+    sql_query, usage_sql = hedged_call(
+        "sql",
+        lambda model: run_with_gemini_token_count(create_nl2sql_chain(model), payload.question, model), # generate sql ( no to sql )
+        payload.model_name,
+        provider="gemini",
+    )
     usage = merge_usage(usage, {
         "sql_input": usage_sql["input_tokens"],
         "sql_output": usage_sql["output_tokens"],
@@ -43,63 +73,87 @@ def route_and_generate_sql(payload: NLToSQLGeminiRequest):
     })
 
     if "error" in sql_query.lower() or len(sql_query) < 5:
-        return {"type": "SQL_GENERATION_FAILED", "answer": "Tidak dapat membuat query SQL.", "token_usage": {"model": payload.model_name, **usage}}
+        return {"type": "SQL_GENERATION_FAILED", "answer": "Tidak dapat membuat query SQL.", "token_usage": {"model": payload.model_name, **usage}}, None
 
     if not is_safe_select_query(sql_query):
-        return {"type": "UNSAFE_SQL_QUERY", "answer": "Query tidak aman.", "generated_sql": sql_query, "token_usage": {"model": payload.model_name, **usage}}
+        return {"type": "UNSAFE_SQL_QUERY", "answer": "Query tidak aman.", "generated_sql": sql_query, "token_usage": {"model": payload.model_name, **usage}}, None
 
-    sql_result_df = execute_sql_query(sql_query)
+    sql_query, repairs = repair_sql_literals(sql_query)
+    executed_sql, rollup = rewrite_for_rollup(sql_query)
+    sql_result_df = execute_sql_query(executed_sql)
 
     if isinstance(sql_result_df, str):
-        return {"type": "SQL_EXECUTION_ERROR", "answer": sql_result_df, "generated_sql": sql_query, "token_usage": {"model": payload.model_name, **usage}}
+        return {"type": "SQL_EXECUTION_ERROR", "answer": sql_result_df, "generated_sql": sql_query, "token_usage": {"model": payload.model_name, **usage}}, None
 
     sql_result_for_llm = "Query berhasil dieksekusi, namun tidak ada data yang ditemukan."
 
     if not sql_result_df.empty:
         sql_result_for_llm = sql_result_df.to_string()
 
-    analysis_chain = create_analysis_chain(payload.model_name) # analisa dan reasoning dari hasil sql
-    final_answer, usage_analysis = run_with_gemini_token_count(
-        analysis_chain,
-        {"payload.question": payload.question, "sql_result": sql_result_for_llm},
-        payload.model_name
-    )
+    # Hasil kosong/satu nilai/satu baris dijawab lewat template, tanpa LLM analisis
+    templated = render_template_answer(sql_result_df, sql_query) if is_template_enabled("gemini") else None
+    if templated is not None:
+        final_answer, answer_source = templated[0], "template"
+        usage_analysis = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    else:
+        final_answer, usage_analysis = hedged_call(
+            "analysis",
+            lambda model: run_with_gemini_token_count(
+                create_analysis_chain(model), # analisa dan reasoning dari hasil sql
+                {"payload.question": payload.question, "sql_result": sql_result_for_llm},
+                model
+            ),
+            payload.model_name,
+            provider="gemini",
+        )
+        answer_source = "llm"
     usage = merge_usage(usage, {
         "analysis_input": usage_analysis["input_tokens"],
         "analysis_output": usage_analysis["output_tokens"],
         "analysis_total": usage_analysis["total_tokens"],
     })
 
-    print("usage", usage)
-
-     # Step 6: INSERT TO DATABASE
-    try:
-        insert_trx_pertanyaan(
-            unit=payload.unit,
-            nip=payload.nip,
-            user_prompt=payload.question,
-            token_in=0,
-            token_out=0,
-            token_total=0,
-            output_query=sql_query,
-            output_data_raw=sql_result_for_llm,
-            output_analisa=final_answer
-        )
-    except Exception as e:
-        print(f"❌ Insert ke trx_pertanyaan gagal: {e}")
+    set_attributes(**{f"tokens.{k}": v for k, v in usage.items()})
+    logger.debug("Token usage pipeline Gemini", model=payload.model_name, usage=usage)
 
     return {
         "type": "SUCCESS",
         "answer": final_answer,
         "generated_sql": sql_query,
         "raw_data": sql_result_df.to_dict(orient="records"),
+        "answer_source": answer_source,
+        "rollup": rollup,
+        "literal_repairs": repairs,
         "token_usage": {"model": payload.model_name, **usage, "grand_total": sum(v for k, v in usage.items() if k.endswith("_total"))}
-    }
+    }, {"output_query": sql_query, "output_data_raw": sql_result_for_llm, "output_analisa": final_answer}
+
+
+def route_and_generate_sql(payload: NLToSQLGeminiRequest):
+    key = (normalize_question(payload.question), payload.model_name, payload.unit)
+    (response, audit), shared = GEMINI_PIPELINE_FLIGHT.do(key, lambda: _route_and_generate_sql_pipeline(payload))
+
+    # Step 6: INSERT TO DATABASE (selalu per request, juga untuk hasil yang di-share)
+    if audit is not None:
+        try:
+            insert_trx_pertanyaan(
+                unit=payload.unit,
+                nip=payload.nip,
+                user_prompt=payload.question,
+                token_in=0,
+                token_out=0,
+                token_total=0,
+                **audit
+            )
+        except Exception as e:
+            logger.error("Insert ke trx_pertanyaan gagal", error=str(e))
+
+    return {**response, "coalesced": shared}
 
 
 def generate_sql_only(question: str, model_name: str):
-    router_chain = create_router_chain(model_name)
-    klasifikasi = router_chain.invoke({"payload.question": question})
+    klasifikasi, _ = route_question(
+        question, lambda: create_router_chain(model_name).invoke({"payload.question": question})
+    )
     if "pengetahuan_umum" in klasifikasi.lower():
         return {"type": "REJECTED", "answer": "Maaf, saya hanya menjawab data perusahaan."}
 
@@ -108,24 +162,46 @@ def generate_sql_only(question: str, model_name: str):
     return {"type": "SQL_GENERATED", "sql_query": sql_query}
 
 
-def contextual_nl_to_sql(question: str, conversation_history: str):
+def contextual_nl_to_sql(question: str, conversation_id: str):
+    conversations = get_conversation_store()
+    conversation_history = conversations.get_history(conversation_id)
+
     sql_with_conv = create_nl2sql_with_conversation_chain()
-    raw_sql_query = sql_with_conv.invoke({"payload.question": question, "chat_history": conversation_history})
+    raw_sql_query = sql_with_conv.invoke({"question": question, "chat_history": conversation_history})
     sql_query = sanitize_sql_output(raw_sql_query)
     if "error" in sql_query.lower() or len(sql_query) < 5:
-        return {"type": "SQL_GENERATION_FAILED", "answer": "Tidak dapat membuat query SQL."}
+        return {"type": "SQL_GENERATION_FAILED", "answer": "Tidak dapat membuat query SQL.", "conversation_id": conversation_id}
     if not is_safe_select_query(sql_query):
-        return {"type": "UNSAFE_SQL_QUERY", "answer": "Query tidak aman.", "generated_sql": sql_query}
+        return {"type": "UNSAFE_SQL_QUERY", "answer": "Query tidak aman.", "generated_sql": sql_query, "conversation_id": conversation_id}
 
-    sql_result_df = execute_sql_query(sql_query)
+    sql_query, repairs = repair_sql_literals(sql_query)
+    executed_sql, rollup = rewrite_for_rollup(sql_query)
+    sql_result_df = execute_sql_query(executed_sql)
     if isinstance(sql_result_df, str):
-        return {"type": "SQL_EXECUTION_ERROR", "answer": sql_result_df, "generated_sql": sql_query}
+        return {"type": "SQL_EXECUTION_ERROR", "answer": sql_result_df, "generated_sql": sql_query, "conversation_id": conversation_id}
 
     sql_result_for_llm = "Query berhasil dieksekusi, namun tidak ada data yang ditemukan."
     if not sql_result_df.empty:
         sql_result_for_llm = sql_result_df.to_string()
 
-    analysis_chain = create_analysis_with_conversation_chain()
-    final_answer = analysis_chain.invoke({"payload.question": question, "chat_history": conversation_history, "sql_result": sql_result_for_llm})
+    templated = render_template_answer(sql_result_df, sql_query) if is_template_enabled("contextual") else None
+    if templated is not None:
+        final_answer = templated[0]
+    else:
+        analysis_chain = create_analysis_with_conversation_chain()
+        final_answer = analysis_chain.invoke({"question": question, "chat_history": conversation_history, "sql_result": sql_result_for_llm})
+
+    # Hanya turn yang sukses yang masuk memori
+    conversations.append_turn(conversation_id, question, sql_query, final_answer)
 
-    return {"type": "SUCCESS", "answer": final_answer, "generated_sql": sql_query, "raw_data": sql_result_df.to_dict(orient="records")}
+    return {
+        "type": "SUCCESS",
+        "answer": final_answer,
+        "generated_sql": sql_query,
+        "raw_data": sql_result_df.to_dict(orient="records"),
+        "conversation_id": conversation_id,
+        "history_tokens": estimate_tokens(conversation_history),
+        "answer_source": "template" if templated is not None else "llm",
+        "rollup": rollup,
+        "literal_repairs": repairs,
+    }
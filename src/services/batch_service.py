@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from src.db.trx_pertanyaan_repo import insert_trx_pertanyaan_bulk
+from src.middleware.admission import ADMISSION, LANE_BATCH, AdmissionRejected
+from src.schemas import BatchNLToSQLRequest
+from src.services.openrouter_service import NLToSQLRequest, run_openrouter_pipeline
+from src.utils import metrics
+from src.utils.local_store import get_local_store
+from src.utils.question import normalize_question
+from src.utils.stage_limits import StageLimits, use_stage_limits
+
+load_dotenv()
+
+# Batch job untuk laporan malam: pertanyaan identik didedupe, pipeline dijalankan paralel
+# (dibatasi per stage), hasil per item disimpan di local store agar bisa di-poll/stream dari worker mana pun.
+# Catatan: job dijalankan oleh worker yang menerimanya; pipeline tetap lewat lane "batch" admission controller.
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "4"))
+BATCH_STAGE_PARALLELISM = {
+    "router": int(os.getenv("BATCH_PARALLELISM_ROUTER", "4")),
+    "sql": int(os.getenv("BATCH_PARALLELISM_SQL", "2")),
+    "execute": int(os.getenv("BATCH_PARALLELISM_EXECUTE", "2")),
+    "analysis": int(os.getenv("BATCH_PARALLELISM_ANALYSIS", "2")),
+}
+BATCH_ADMISSION_TIMEOUT_MS = float(os.getenv("BATCH_ADMISSION_TIMEOUT_MS", "600000"))
+BATCH_STREAM_POLL_S = float(os.getenv("BATCH_STREAM_POLL_S", "0.5"))
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+
+
+def _init_tables():
+    store = get_local_store()
+    store.execute("""
+        CREATE TABLE IF NOT EXISTS batch_jobs (
+            job_id TEXT PRIMARY KEY,
+            model_name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            unique_questions INTEGER NOT NULL,
+            completed INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            finished_at REAL
+        )
+    """)
+    store.execute("""
+        CREATE TABLE IF NOT EXISTS batch_items (
+            job_id TEXT NOT NULL,
+            item_index INTEGER NOT NULL,
+            question TEXT NOT NULL,
+            unit TEXT NOT NULL,
+            nip TEXT NOT NULL,
+            status TEXT NOT NULL,
+            result_json TEXT,
+            completed_seq INTEGER,
+            PRIMARY KEY (job_id, item_index)
+        )
+    """)
+
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _ensure_tables():
+    global _initialized
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                _init_tables()
+                _initialized = True
+
+
+def submit_batch_job(request: BatchNLToSQLRequest) -> Dict[str, Any]:
+    """Mendaftarkan batch job dan menjalankannya di background. Mengembalikan job handle."""
+    if not request.items:
+        return {"type": "INVALID_BATCH", "answer": "Daftar pertanyaan kosong."}
+    if len(request.items) > BATCH_MAX_ITEMS:
+        return {"type": "INVALID_BATCH", "answer": f"Maksimal {BATCH_MAX_ITEMS} pertanyaan per batch."}
+
+    _ensure_tables()
+    job_id = uuid.uuid4().hex
+
+    # Dedupe: (pertanyaan ternormalisasi, model, unit) -> indeks item
+    groups: Dict[Tuple[str, str, str], List[int]] = {}
+    for index, item in enumerate(request.items):
+        key = (normalize_question(item.question), request.model_name, item.unit)
+        groups.setdefault(key, []).append(index)
+
+    store = get_local_store()
+    store.execute("BEGIN")
+    store.execute(
+        "INSERT INTO batch_jobs (job_id, model_name, status, total, unique_questions, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (job_id, request.model_name, STATUS_PENDING, len(request.items), len(groups), time.time()),
+    )
+    store.executemany(
+        "INSERT INTO batch_items (job_id, item_index, question, unit, nip, status) VALUES (?, ?, ?, ?, ?, ?)",
+        [(job_id, i, item.question, item.unit, item.nip, STATUS_PENDING) for i, item in enumerate(request.items)],
+    )
+    store.execute("COMMIT")
+
+    threading.Thread(
+        target=_run_job, args=(job_id, request, list(groups.values())), name=f"batch-{job_id[:8]}", daemon=True
+    ).start()
+    metrics.incr("batch.jobs_submitted")
+    return {"type": "BATCH_ACCEPTED", "job_id": job_id, "status": STATUS_PENDING,
+            "total": len(request.items), "unique_questions": len(groups)}
+
+
+def _run_one(request: BatchNLToSQLRequest, first_index: int, limits: StageLimits) -> Tuple[Dict[str, Any], Optional[Dict[str, str]]]:
+    item = request.items[first_index]
+    payload = NLToSQLRequest(question=item.question, model_name=request.model_name, unit=item.unit, nip=item.nip)
+    try:
+        with ADMISSION.admit(LANE_BATCH, BATCH_ADMISSION_TIMEOUT_MS), use_stage_limits(limits):
+            return run_openrouter_pipeline(payload)
+    except AdmissionRejected as e:
+        return {"type": "REJECTED_BY_ADMISSION", "answer": "Server sedang sibuk.", "reason": e.reason}, None
+
+
+def _run_job(job_id: str, request: BatchNLToSQLRequest, groups: List[List[int]]):
+    store = get_local_store()
+    store.execute("UPDATE batch_jobs SET status = ? WHERE job_id = ?", (STATUS_RUNNING, job_id))
+    limits = StageLimits(BATCH_STAGE_PARALLELISM)
+    audit_rows: List[Dict[str, Any]] = []
+    completed_seq = 0
+    seq_lock = threading.Lock()
+
+    def process(indices: List[int]):
+        nonlocal completed_seq
+        response, audit = _run_one(request, indices[0], limits)
+        result_json = json.dumps(response, default=str)
+
+        # Koneksi sqlite per thread (lihat local_store)
+        thread_store = get_local_store()
+        # Seq dibagikan dan di-commit di bawah lock yang sama: stream membaca dengan kursor `completed_seq > last_seq`,
+        # jadi seq yang lebih tinggi tidak boleh terlihat sebelum seq yang lebih rendah
+        with seq_lock:
+            completed_seq += 1
+            seq = completed_seq
+            if audit is not None:
+                for index in indices:
+                    item = request.items[index]
+                    audit_rows.append({"unit": item.unit, "nip": item.nip, "user_prompt": item.question, **audit})
+
+            thread_store.execute("BEGIN")
+            thread_store.executemany(
+                "UPDATE batch_items SET status = ?, result_json = ?, completed_seq = ? WHERE job_id = ? AND item_index = ?",
+                [(STATUS_DONE, result_json, seq, job_id, index) for index in indices],
+            )
+            thread_store.execute(
+                "UPDATE batch_jobs SET completed = completed + ? WHERE job_id = ?", (len(indices), job_id)
+            )
+            thread_store.execute("COMMIT")
+
+    try:
+        with ThreadPoolExecutor(max_workers=BATCH_PARALLELISM, thread_name_prefix="batch-item") as executor:
+            list(executor.map(process, groups))
+    finally:
+        # Audit ditulis sekaligus di akhir job (satu transaksi)
+        insert_trx_pertanyaan_bulk(audit_rows)
+        store.execute(
+            "UPDATE batch_jobs SET status = ?, finished_at = ? WHERE job_id = ?", (STATUS_DONE, time.time(), job_id)
+        )
+        metrics.incr("batch.jobs_completed")
+        metrics.incr("batch.pipeline_runs_saved", sum(len(indices) - 1 for indices in groups))
+
+
+def _item_to_dict(row) -> Dict[str, Any]:
+    return {
+        "index": row["item_index"],
+        "question": row["question"],
+        "unit": row["unit"],
+        "nip": row["nip"],
+        "status": row["status"],
+        "result": json.loads(row["result_json"]) if row["result_json"] else None,
+    }
+
+
+def get_batch_job(job_id: str, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+    """Status job beserta hasil per item (dipaginasi)."""
+    _ensure_tables()
+    store = get_local_store()
+    job = store.execute("SELECT * FROM batch_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if job is None:
+        return None
+    rows = store.execute(
+        "SELECT * FROM batch_items WHERE job_id = ? ORDER BY item_index LIMIT ? OFFSET ?", (job_id, limit, offset)
+    ).fetchall()
+    return {**dict(job), "offset": offset, "limit": limit, "items": [_item_to_dict(row) for row in rows]}
+
+
+def stream_batch_job(job_id: str) -> Iterator[str]:
+    """NDJSON: satu baris per item sesuai urutan selesai, diakhiri baris status job."""
+    _ensure_tables()
+    last_seq = 0
+    while True:
+        # StreamingResponse mengiterasi generator sync di thread threadpool yang bisa berbeda tiap iterasi;
+        # koneksi sqlite per thread diambil ulang setiap poll
+        store = get_local_store()
+        job = store.execute("SELECT status, total, completed FROM batch_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if job is None:
+            yield json.dumps({"type": "NOT_FOUND", "job_id": job_id}) + "\n"
+            return
+
+        rows = store.execute(
+            "SELECT * FROM batch_items WHERE job_id = ? AND completed_seq > ? ORDER BY completed_seq, item_index",
+            (job_id, last_seq),
+        ).fetchall()
+        for row in rows:
+            last_seq = max(last_seq, row["completed_seq"])
+            yield json.dumps(_item_to_dict(row), default=str) + "\n"
+
+        if job["status"] == STATUS_DONE and not rows:
+            yield json.dumps({"type": "BATCH_DONE", "job_id": job_id, "total": job["total"]}) + "\n"
+            return
+        time.sleep(BATCH_STREAM_POLL_S)
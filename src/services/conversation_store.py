@@ -0,0 +1,252 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Set
+
+from dotenv import load_dotenv
+
+from src.utils import metrics
+from src.utils.local_store import get_local_store
+from src.utils.tracing import get_logger
+
+load_dotenv()
+
+logger = get_logger("conversation_store")
+
+# Memori percakapan untuk endpoint kontekstual, disimpan di local store (dibagi antar worker).
+# Prompt dijaga tetap kecil: turn terbaru disimpan verbatim sampai CONVERSATION_RECENT_TOKENS,
+# turn yang lebih lama dipadatkan ke ringkasan bergulir (maks CONVERSATION_SUMMARY_MAX_TOKENS) oleh LLM di background.
+CONVERSATION_RECENT_TOKENS = int(os.getenv("CONVERSATION_RECENT_TOKENS", "600"))
+CONVERSATION_SUMMARY_MAX_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_MAX_TOKENS", "200"))
+CONVERSATION_MAX_TURN_TOKENS = int(os.getenv("CONVERSATION_MAX_TURN_TOKENS", "300"))
+CONVERSATION_TTL_S = int(os.getenv("CONVERSATION_TTL_S", "3600"))
+CONVERSATION_MAX_ACTIVE = int(os.getenv("CONVERSATION_MAX_ACTIVE", "1000"))
+
+EMPTY_HISTORY = "Tidak ada riwayat percakapan."
+
+
+def estimate_tokens(text: str) -> int:
+    # Estimasi kasar yang sama dengan budget token admission (panjang teks // 4)
+    return len(text) // 4
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[: max_chars - 3].rstrip() + "..."
+
+
+def format_turn(question: str, generated_sql: str, answer: str) -> str:
+    turn = f"Pengguna: {question}\nSQL: {generated_sql}\nAsisten: {answer}"
+    return _truncate_tokens(turn, CONVERSATION_MAX_TURN_TOKENS)
+
+
+def _default_summarizer(summary: str, turns: str) -> str:
+    from src.nl2sql_service import create_conversation_summary_chain
+    return create_conversation_summary_chain().invoke({
+        "summary": summary or "-",
+        "turns": turns,
+        "max_words": CONVERSATION_SUMMARY_MAX_TOKENS * 3 // 4,
+    })
+
+
+class ConversationStore:
+    """
+    Riwayat percakapan per `conversation_id` dengan budget token, ringkasan bergulir,
+    dan eviction percakapan idle (TTL) serta yang paling lama tidak dipakai (LRU).
+    """
+
+    def __init__(self, summarizer: Callable[[str, str], str] = _default_summarizer):
+        self._summarizer = summarizer
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversation-summary")
+        self._pending: Set[str] = set()
+        self._pending_lock = threading.Lock()
+        store = get_local_store()
+        store.execute("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                summarized_upto INTEGER NOT NULL DEFAULT 0,
+                last_access REAL NOT NULL
+            )
+        """)
+        store.execute("""
+            CREATE TABLE IF NOT EXISTS conversation_turns (
+                conversation_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                PRIMARY KEY (conversation_id, seq)
+            )
+        """)
+        store.execute("CREATE INDEX IF NOT EXISTS idx_conversations_last_access ON conversations (last_access)")
+
+    def _recent_turns(self, conversation_id: str, summarized_upto: int) -> List:
+        """Turn terbaru (belum diringkas) yang muat di budget, urut dari yang paling lama."""
+        rows = get_local_store().execute(
+            "SELECT seq, content, tokens FROM conversation_turns WHERE conversation_id = ? AND seq > ? ORDER BY seq DESC",
+            (conversation_id, summarized_upto),
+        ).fetchall()
+        recent, used = [], 0
+        for row in rows:
+            if recent and used + row["tokens"] > CONVERSATION_RECENT_TOKENS:
+                break
+            recent.append(row)
+            used += row["tokens"]
+        return list(reversed(recent))
+
+    def get_history(self, conversation_id: str) -> str:
+        """Riwayat untuk prompt: ringkasan + turn terbaru verbatim. Ukurannya dibatasi, tidak tumbuh linear."""
+        store = get_local_store()
+        conversation = store.execute(
+            "SELECT summary, summarized_upto, last_access FROM conversations WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        if conversation is None:
+            return EMPTY_HISTORY
+        now = time.time()
+        if conversation["last_access"] < now - CONVERSATION_TTL_S:
+            # Eviction hanya berjalan saat append_turn; percakapan yang sudah kedaluwarsa tidak boleh dipakai lagi
+            self._delete([conversation_id])
+            metrics.incr("conversation.expired_on_read")
+            return EMPTY_HISTORY
+
+        store.execute("UPDATE conversations SET last_access = ? WHERE conversation_id = ?", (now, conversation_id))
+        parts = []
+        if conversation["summary"]:
+            parts.append(f"Ringkasan percakapan sebelumnya: {conversation['summary']}")
+        # Turn lama yang belum selesai diringkas sengaja tidak dimasukkan agar prompt tetap di bawah budget
+        parts.extend(row["content"] for row in self._recent_turns(conversation_id, conversation["summarized_upto"]))
+
+        history = "\n\n".join(parts) or EMPTY_HISTORY
+        metrics.observe("conversation.history_tokens", estimate_tokens(history))
+        return history
+
+    def append_turn(self, conversation_id: str, question: str, generated_sql: str, answer: str):
+        content = format_turn(question, generated_sql, answer)
+        now = time.time()
+        store = get_local_store()
+        store.execute("BEGIN IMMEDIATE")
+        try:
+            store.execute(
+                "INSERT INTO conversations (conversation_id, last_access) VALUES (?, ?) "
+                "ON CONFLICT (conversation_id) DO UPDATE SET last_access = excluded.last_access",
+                (conversation_id, now),
+            )
+            store.execute(
+                """
+                INSERT INTO conversation_turns (conversation_id, seq, content, tokens)
+                SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM conversation_turns WHERE conversation_id = ?
+                """,
+                (conversation_id, content, estimate_tokens(content), conversation_id),
+            )
+            store.execute("COMMIT")
+        except Exception:
+            store.execute("ROLLBACK")
+            raise
+
+        self._schedule_compaction(conversation_id)
+        self.evict()
+
+    def _schedule_compaction(self, conversation_id: str):
+        conversation = get_local_store().execute(
+            "SELECT summarized_upto FROM conversations WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        if conversation is None:
+            return
+        recent = self._recent_turns(conversation_id, conversation["summarized_upto"])
+        oldest_recent = recent[0]["seq"] if recent else conversation["summarized_upto"] + 1
+        if oldest_recent - 1 <= conversation["summarized_upto"]:
+            return  # semua turn masih muat di budget
+
+        with self._pending_lock:
+            if conversation_id in self._pending:
+                return
+            self._pending.add(conversation_id)
+        self._executor.submit(self._compact, conversation_id, oldest_recent - 1)
+
+    def _compact(self, conversation_id: str, upto: int):
+        """Memadatkan turn dengan seq <= upto ke ringkasan bergulir (dijalankan di background)."""
+        try:
+            store = get_local_store()
+            conversation = store.execute(
+                "SELECT summary, summarized_upto FROM conversations WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+            if conversation is None or upto <= conversation["summarized_upto"]:
+                return
+            rows = store.execute(
+                "SELECT content FROM conversation_turns WHERE conversation_id = ? AND seq > ? AND seq <= ? ORDER BY seq",
+                (conversation_id, conversation["summarized_upto"], upto),
+            ).fetchall()
+
+            start = time.perf_counter()
+            summary = self._summarizer(conversation["summary"], "\n\n".join(row["content"] for row in rows))
+            metrics.observe("conversation.summary_ms", (time.perf_counter() - start) * 1000)
+            summary = _truncate_tokens(summary.strip(), CONVERSATION_SUMMARY_MAX_TOKENS)
+
+            store.execute("BEGIN IMMEDIATE")
+            try:
+                store.execute(
+                    "UPDATE conversations SET summary = ?, summarized_upto = ? "
+                    "WHERE conversation_id = ? AND summarized_upto < ?",
+                    (summary, upto, conversation_id, upto),
+                )
+                store.execute(
+                    "DELETE FROM conversation_turns WHERE conversation_id = ? AND seq <= ?", (conversation_id, upto)
+                )
+                store.execute("COMMIT")
+            except Exception:
+                store.execute("ROLLBACK")
+                raise
+            metrics.incr("conversation.summarized")
+        except Exception as e:
+            logger.error("Gagal meringkas percakapan", conversation_id=conversation_id, error=str(e))
+            return
+        finally:
+            with self._pending_lock:
+                self._pending.discard(conversation_id)
+
+        # Turn yang masuk selama peringkasan mungkin sudah melewati budget lagi
+        self._schedule_compaction(conversation_id)
+
+    def evict(self):
+        """Hapus percakapan idle melebihi TTL, lalu yang paling lama tidak dipakai jika melebihi kapasitas."""
+        store = get_local_store()
+        expired = store.execute(
+            "SELECT conversation_id FROM conversations WHERE last_access < ?", (time.time() - CONVERSATION_TTL_S,)
+        ).fetchall()
+        overflow = store.execute(
+            "SELECT conversation_id FROM conversations ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+            (CONVERSATION_MAX_ACTIVE,),
+        ).fetchall()
+        victims = {row["conversation_id"] for row in expired} | {row["conversation_id"] for row in overflow}
+        if not victims:
+            return
+
+        self._delete(victims)
+        metrics.incr("conversation.evicted", len(victims))
+
+    @staticmethod
+    def _delete(conversation_ids):
+        params = [(conversation_id,) for conversation_id in conversation_ids]
+        store = get_local_store()
+        store.execute("BEGIN IMMEDIATE")
+        try:
+            store.executemany("DELETE FROM conversation_turns WHERE conversation_id = ?", params)
+            store.executemany("DELETE FROM conversations WHERE conversation_id = ?", params)
+            store.execute("COMMIT")
+        except Exception:
+            store.execute("ROLLBACK")
+            raise
+
+
+_conversation_store: Optional[ConversationStore] = None
+_conversation_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationStore:
+    global _conversation_store
+    if _conversation_store is None:
+        with _conversation_store_lock:
+            if _conversation_store is None:
+                _conversation_store = ConversationStore()
+    return _conversation_store
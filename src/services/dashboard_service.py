@@ -1,4 +1,8 @@
+from datetime import date
+from typing import Optional
+
 from src.db.trx_pertanyaan_repo import get_all_trx_pertanyaan, get_trx_pertanyaan_by_nip, get_trx_pertanyaan_by_id
+from src.search import search_questions
 
 def get_all_trx_pertanyaan_service(limit: int = 300):
     return get_all_trx_pertanyaan(limit)
@@ -7,4 +11,16 @@ def get_trx_pertanyaan_by_nip_service(nip: int):
     return get_trx_pertanyaan_by_nip(nip)
 
 def get_trx_pertanyaan_by_id_service(id: int):
-    return get_trx_pertanyaan_by_id(id)
\ No newline at end of file
+    return get_trx_pertanyaan_by_id(id)
+
+def search_trx_pertanyaan_service(
+    q: str,
+    unit: Optional[str] = None,
+    nip: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    page: int = 1,
+    page_size: int = 20,
+    mode: str = "all",
+):
+    return search_questions(q, unit, nip, date_from, date_to, page, page_size, mode)
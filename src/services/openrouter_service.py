@@ -1,15 +1,34 @@
-from typing import Dict, Any
+import os
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 from pydantic import SecretStr, BaseModel
 
 from src.db.config_openrouter import get_openrouter_config
-from src.db.executor import execute_sql_query
-from src.validation import is_safe_select_query, sanitize_sql_output
-from src.retrieval.dependencies import get_retriever
+from src.db.executor import READONLY_BREAKER, execute_sql_query
+from src.db.rollups import rewrite_for_rollup
+from src.validation import is_safe_select_query, is_schema_valid_query, repair_sql_literals, sanitize_sql_output
+from src.retrieval.dependencies import get_retriever, warm_retriever
+from src.retrieval.intent_classifier import route_question
+from src.retrieval.schema_retriever import schema_prompt_inputs
+from src.search.entity_index import warm_entity_index
 from src.db.trx_pertanyaan_repo import insert_trx_pertanyaan
+from src.services.precompute_service import lookup_precomputed
+from src.services.sql_template_service import learn_sql_template, match_sql_template
+from src.utils import metrics
+from src.utils.answer_templates import is_template_enabled, render_template_answer
+from src.utils.hedging import hedged_call
+from src.utils.http_client import get_shared_http_client
+from src.utils.question import normalize_question
+from src.utils.resilience import CircuitOpenError, DeadlineExceeded, ensure_available
+from src.utils.singleflight import SingleFlight
+from src.utils.stage_limits import stage_gate
+from src.utils.token_usage import SPAN_TOKEN_USAGE_CALLBACK
+from src.utils.tracing import get_logger, set_attributes, span
+
+logger = get_logger("openrouter_service")
 
 # ======================================================================
 # ========== KOMPONEN STATIS (DIBUAT SEKALI SAAT STARTUP) ==========
@@ -19,6 +38,10 @@ from src.db.trx_pertanyaan_repo import insert_trx_pertanyaan
 
 # 1. Inisialisasi Retriever (Operasi paling 'mahal' dan penting)
 RETRIEVER = get_retriever()
+# Model embedding dan koneksi Qdrant dipanaskan di background (search pertama tidak menanggung setup)
+warm_retriever()
+# Nilai kolom kategorikal drauk_unit untuk hint prompt & perbaikan literal dimuat di background
+warm_entity_index()
 
 # 2. Inisialisasi semua Prompt Template
 ROUTER_PROMPT = PromptTemplate.from_template("""
@@ -32,22 +55,23 @@ Kategori:
 
 SQL_PROMPT = PromptTemplate(
     template="""
-Anda adalah asisten AI yang bertugas mengubah bahasa natural menjadi query SQL yang valid untuk tabel bernama `drauk_unit`.
-DAFTAR KOLOM YANG VALID (Whitelist):
-[Tahun_Anggaran, Kode_DRAUK, Indikator_Tujuan, Kode_SS, Sasaran_Strategis, Kode_IKSS, Indikator_Kinerja_Sasaran_Strategis, Kode_PS, Program_Strategis, Kode_IKPS, Indikator_Kinerja_Program_Strategis, Kode_Unit, Nama_Unit, Tipe_Unit, Kegiatan_Universitas, Indikator_Capaian, Kegiatan_Unit, Kode_Standar_Kegiatan, Standar_Kegiatan, FTE, Detail_Kegiatan, Kelompok_Pagu, Akun, COA, Nama_COA, Satuan_Kegiatan, Barjas, Volume_1, Satuan_1, Volume_2, Satuan_2, Volume_3, Satuan_3, Volume_4, Satuan_4, Harga_Satuan, Sumber_Dana, Detail_Sumber_Dana, Jumlah, Realisasi, Sisa]
+Anda adalah asisten AI yang bertugas mengubah bahasa natural menjadi query SQL yang valid untuk tabel-tabel pada daftar di bawah ini.
+DAFTAR TABEL DAN KOLOM YANG VALID (Whitelist):
+{whitelist}
 ATURAN PALING PENTING:
-1. GUNAKAN HANYA nama kolom dari "DAFTAR KOLOM YANG VALID" di atas. Jangan mengarang atau mengubah nama kolom.
+1. GUNAKAN HANYA nama tabel dan kolom dari "DAFTAR TABEL DAN KOLOM YANG VALID" di atas. Jangan mengarang atau mengubah nama tabel/kolom.
 2. PENULISAN NAMA KOLOM HARUS SAMA PERSIS (case-sensitive). Jangan mengubah `Kegiatan_Unit` menjadi `kegiatan_unit`.
 3. Gunakan "Konteks Skema" di bawah ini untuk memahami arti setiap kolom.
-4. Untuk permintaan "terbesar", "tertinggi", gunakan `ORDER BY ... DESC LIMIT ...`.
-5. Untuk permintaan "terkecil", "terendah", gunakan `ORDER BY ... ASC LIMIT ...`.
-6. Kembalikan HANYA string query SQL mentah, tanpa format ```sql.
+4. Jika butuh lebih dari satu tabel, gunakan JOIN sesuai "Relasi antar tabel" di Konteks Skema.
+5. Untuk permintaan "terbesar", "tertinggi", gunakan `ORDER BY ... DESC LIMIT ...`.
+6. Untuk permintaan "terkecil", "terendah", gunakan `ORDER BY ... ASC LIMIT ...`.
+7. Kembalikan HANYA string query SQL mentah, tanpa format ```sql.
 Konteks Skema:
 {context}
 Pertanyaan Pengguna: {question}
 Query SQL:
 """,
-    input_variables=["context", "question"]
+    input_variables=["whitelist", "context", "question"]
 )
 
 ANALYSIS_PROMPT = PromptTemplate.from_template("""
@@ -62,7 +86,11 @@ SIMPLE_CHAT_PROMPT = ChatPromptTemplate.from_messages([
     ("human", "{prompt}")
 ])
 
-# 3. Inisialisasi daftar model (lebih efisien sebagai konstanta)
+# 3. Cascade SQL generation: model cepat/murah dicoba lebih dulu (pisahkan dengan koma, kosongkan untuk menonaktifkan).
+# Eskalasi ke model yang diminta jika SQL tidak aman, tidak sesuai skema, error saat eksekusi, atau hasilnya kosong.
+SQL_CASCADE_MODELS = [m.strip() for m in os.getenv("SQL_CASCADE_MODELS", "anthropic/claude-3-haiku").split(",") if m.strip()]
+
+# 4. Inisialisasi daftar model (lebih efisien sebagai konstanta)
 AVAILABLE_MODELS_DATA = {
     "popular_models": [
         {"id": "anthropic/claude-3-opus", "name": "Claude 3 Opus", "provider": "Anthropic", "description": "Most capable model, best for complex tasks"},
@@ -78,8 +106,13 @@ AVAILABLE_MODELS_DATA = {
 # ======================================================================
 # ========== HELPER & WORKFLOW (DIPANGGIL PER-REQUEST) ==========
 # ======================================================================
+@lru_cache(maxsize=64)
 def create_openrouter_llm(model_name: str, temperature: float = 0.0):
-    """Helper untuk membuat ChatOpenAI instance dengan OpenRouter config"""
+    """
+    Helper untuk membuat ChatOpenAI instance dengan OpenRouter config.
+    Instance di-cache per (model, temperature) dan semuanya memakai HTTP client bersama
+    (keep-alive pool + retry 429/5xx), jadi tidak ada handshake TCP/TLS baru per stage.
+    """
     config = get_openrouter_config()
     
     return ChatOpenAI(
@@ -88,6 +121,9 @@ def create_openrouter_llm(model_name: str, temperature: float = 0.0):
         base_url=config["base_url"],
         temperature=temperature,
         max_completion_tokens=2000,
+        http_client=get_shared_http_client(),
+        max_retries=0,  # retry ditangani RetryTransport
+        callbacks=[SPAN_TOKEN_USAGE_CALLBACK],  # token usage dicatat ke span llm.call
         default_headers={
             "HTTP-Referer": "https://github.com/yogga18/nl-to-sql-with-rag.git",
             "X-Title": str(config["app_name"]) if config["app_name"] is not None else ""
@@ -104,77 +140,213 @@ class NLToSQLRequest(BaseModel):
     token_out: int = 0
     token_total: int = 0
 
-def openrouter_nl_to_sql_workflow(payload: NLToSQLRequest) -> Dict[str, Any]:
-    """Workflow lengkap yang dioptimalkan untuk performa."""
+def get_sql_cascade_tiers(requested_model: str) -> List[str]:
+    """Urutan model untuk SQL generation: tier murah dari SQL_CASCADE_MODELS, lalu model yang diminta."""
+    tiers = [m for m in SQL_CASCADE_MODELS if m != requested_model]
+    return tiers + [requested_model]
+
+
+def _generate_sql(model_name: str, question: str, context) -> str:
+    def invoke(model: str) -> str:
+        sql_chain = SQL_PROMPT | create_openrouter_llm(model, temperature=0.0) | StrOutputParser()
+        return sql_chain.invoke({**schema_prompt_inputs(context), "question": question})
+
+    raw_sql_query = hedged_call("sql", invoke, model_name)
+    return sanitize_sql_output(raw_sql_query)
+
+# Request identik yang sedang berjalan bersamaan (pertanyaan, model, unit) hanya dijalankan sekali
+PIPELINE_FLIGHT = SingleFlight("openrouter_pipeline")
+
+# Hasil pipeline yang boleh diganti jawaban precomputed (termasuk yang basi) jika ada
+CACHED_FALLBACK_TYPES = {"ERROR", "DEPENDENCY_UNAVAILABLE", "SQL_EXECUTION_ERROR"}
+
+
+def run_openrouter_pipeline(payload: NLToSQLRequest) -> Tuple[Dict[str, Any], Optional[Dict[str, str]]]:
+    """
+    Menjalankan router -> SQL -> validasi -> eksekusi -> analisis.
+    Mengembalikan (response, audit); audit berisi field trx_pertanyaan jika workflow sukses.
+    """
     try:
-        # Step 1: ROUTER (Optimasi: Gunakan model super cepat untuk tugas sederhana ini)
-        llm_router = create_openrouter_llm("anthropic/claude-3-haiku", temperature=0.0)
-        router_chain = ROUTER_PROMPT | llm_router | StrOutputParser()
-        klasifikasi = router_chain.invoke({"question": payload.question})
-
-        if "pengetahuan_umum" in klasifikasi.lower():
-            return {"type": "REJECTED", "answer": "Maaf, saya hanya dapat menjawab pertanyaan terkait data perusahaan...", "model_used": payload.model_name, "step": "router"}
-
-        # Step 2: SQL GENERATION
-        llm_sql = create_openrouter_llm(payload.model_name, temperature=0.0)
-        sql_chain = (
-            {"context": RETRIEVER, "question": RunnablePassthrough()}
-            | SQL_PROMPT
-            | llm_sql
-            | StrOutputParser()
-        )
-        raw_sql_query = sql_chain.invoke(payload.question)
-        sql_query = sanitize_sql_output(raw_sql_query)
+        # Step 0: TEMPLATE SQL (pertanyaan yang hanya beda tahun/unit/program dari template terkonfirmasi:
+        # SQL dipakai ulang dengan bound parameter, tanpa router dan LLM SQL)
+        sql_result_df, repairs = None, []
+        template = match_sql_template(payload.question)
+        if template is not None:
+            with stage_gate("execute"):
+                executed_sql, rollup = rewrite_for_rollup(template.sql_template)
+                sql_result_df = execute_sql_query(executed_sql, template.params)
+            if isinstance(sql_result_df, str):
+                metrics.incr("sql_template.execution_error")
+                logger.warning("SQL template gagal dieksekusi, kembali ke pipeline normal", template=template.template_key)
+                sql_result_df = None
+            else:
+                sql_query, model, tier, router_source = template.sql, "template", None, "template"
+                attempts = [{"model": "template", "outcome": "answered", "template": template.template_key}]
+
+        if sql_result_df is None:
+            # MySQL read-only tidak tersedia: router dan SQL LLM tidak dipanggil untuk query yang tidak bisa dieksekusi
+            ensure_available(READONLY_BREAKER)
+
+            # Step 1: ROUTER (classifier lokal, eskalasi ke model super cepat jika ragu)
+            def llm_route() -> str:
+                def invoke(model: str) -> str:
+                    router_chain = ROUTER_PROMPT | create_openrouter_llm(model, temperature=0.0) | StrOutputParser()
+                    return router_chain.invoke({"question": payload.question})
+                try:
+                    return hedged_call("router", invoke, "anthropic/claude-3-haiku")
+                except (CircuitOpenError, DeadlineExceeded) as e:
+                    # Router LLM tidak tersedia: anggap pertanyaan data, validasi SQL tetap menyaring hasilnya
+                    metrics.incr("router.degraded")
+                    logger.warning("Router LLM tidak tersedia, diasumsikan data_perusahaan", error=str(e))
+                    return "data_perusahaan"
+
+            klasifikasi, router_source = route_question(payload.question, llm_route)
+
+            if "pengetahuan_umum" in klasifikasi.lower():
+                return {"type": "REJECTED", "answer": "Maaf, saya hanya dapat menjawab pertanyaan terkait data perusahaan...", "model_used": payload.model_name, "router_source": router_source, "step": "router"}, None
+
+            # Step 2-4: SQL GENERATION -> VALIDATION -> EXECUTION (cascade: model murah dulu)
+            with span("retrieve") as retrieve_span:
+                context = RETRIEVER.invoke(payload.question)
+                if retrieve_span is not None:
+                    retrieve_span.set(**{"retrieve.documents": len(context)})
+            tiers = get_sql_cascade_tiers(payload.model_name)
+            attempts = []
 
-        if not sql_query or "error" in sql_query.lower() or len(sql_query) < 10:
-            return {"type": "SQL_GENERATION_FAILED", "answer": "Tidak dapat membuat query SQL dari pertanyaan Anda...", "model_used": payload.model_name, "step": "sql_generation"}
+            for tier, model in enumerate(tiers):
+                is_last_tier = tier == len(tiers) - 1
+                try:
+                    sql_query = _generate_sql(model, payload.question, context)
+                except Exception:
+                    if is_last_tier:
+                        raise
+                    sql_query = ""  # error provider di tier murah -> eskalasi
 
-        # Step 3: VALIDATION
-        if not is_safe_select_query(sql_query):
-            return {"type": "UNSAFE_SQL_QUERY", "answer": "Query yang dihasilkan tidak aman...", "generated_sql": sql_query, "model_used": payload.model_name, "step": "validation"}
+                if not sql_query or "error" in sql_query.lower() or len(sql_query) < 10:
+                    outcome = "generation_failed"
+                    if is_last_tier:
+                        return {"type": "SQL_GENERATION_FAILED", "answer": "Tidak dapat membuat query SQL dari pertanyaan Anda...", "model_used": payload.model_name, "cascade": attempts + [{"model": model, "outcome": outcome}], "step": "sql_generation"}, None
+                # Step 3: VALIDATION
+                elif not is_safe_select_query(sql_query):
+                    outcome = "unsafe"
+                    if is_last_tier:
+                        return {"type": "UNSAFE_SQL_QUERY", "answer": "Query yang dihasilkan tidak aman...", "generated_sql": sql_query, "model_used": payload.model_name, "cascade": attempts + [{"model": model, "outcome": outcome}], "step": "validation"}, None
+                elif not is_last_tier and not is_schema_valid_query(sql_query):
+                    outcome = "schema_invalid"
+                else:
+                    # Step 4: EXECUTION (literal kategorikal diganti nilai kanonik dari data jika salah ketik)
+                    sql_query, repairs = repair_sql_literals(sql_query)
+                    with stage_gate("execute"):
+                        # Rewrite: agregat yang cocok diarahkan ke tabel rollup
+                        executed_sql, rollup = rewrite_for_rollup(sql_query)
+                        sql_result_df = execute_sql_query(executed_sql)
+                    if isinstance(sql_result_df, str):
+                        outcome = "execution_error"
+                        if is_last_tier:
+                            return {"type": "SQL_EXECUTION_ERROR", "answer": f"Terjadi error saat eksekusi query: {sql_result_df}", "generated_sql": sql_query, "model_used": payload.model_name, "cascade": attempts + [{"model": model, "outcome": outcome}], "step": "execution"}, None
+                    elif sql_result_df.empty and not is_last_tier:
+                        outcome = "empty_result"
+                    else:
+                        attempts.append({"model": model, "outcome": "answered"})
+                        metrics.incr(f"cascade.tier{tier}.answered")
+                        if not sql_result_df.empty:
+                            # SQL tervalidasi dan ada hasil: jadi bahan template untuk variasi literal pertanyaan ini
+                            learn_sql_template(payload.question, sql_query, model)
+                        break
 
-        # Step 4: EXECUTION
-        sql_result_df = execute_sql_query(sql_query)
-        if isinstance(sql_result_df, str):
-            return {"type": "SQL_EXECUTION_ERROR", "answer": f"Terjadi error saat eksekusi query: {sql_result_df}", "generated_sql": sql_query, "model_used": payload.model_name, "step": "execution"}
+                attempts.append({"model": model, "outcome": outcome})
+                metrics.incr(f"cascade.escalated.{outcome}")
 
         sql_result_for_llm = "Query berhasil dieksekusi, namun tidak ada data yang ditemukan."
         if not sql_result_df.empty:
             sql_result_for_llm = sql_result_df.to_string(index=False)
 
-        # Step 5: ANALYSIS
-        llm_analysis = create_openrouter_llm(payload.model_name, temperature=0.1)
-        analysis_chain = ANALYSIS_PROMPT | llm_analysis | StrOutputParser()
-        final_answer = analysis_chain.invoke({"question": payload.question, "sql_result": sql_result_for_llm})
-
-        # Step 6: INSERT TO DATABASE
-        try:
-            insert_trx_pertanyaan(
-                unit= payload.unit,
-                nip= payload.nip,
-                user_prompt=payload.question,
-                token_in=0,
-                token_out=0,
-                token_total=0,
-                output_query=sql_query,
-                output_data_raw=sql_result_for_llm,
-                output_analisa=final_answer
-            )
-        except Exception as e:
-            print(f"❌ Insert ke trx_pertanyaan gagal: {e}")
-
-
-        return {
+        # Step 5: ANALYSIS (hasil kosong/satu nilai/satu baris dijawab lewat template, tanpa LLM)
+        templated = render_template_answer(sql_result_df, sql_query) if is_template_enabled("openrouter") else None
+        if templated is not None:
+            final_answer, answer_source = templated[0], "template"
+        else:
+            def invoke_analysis(model: str) -> str:
+                analysis_chain = ANALYSIS_PROMPT | create_openrouter_llm(model, temperature=0.1) | StrOutputParser()
+                return analysis_chain.invoke({"question": payload.question, "sql_result": sql_result_for_llm})
+
+            try:
+                final_answer, answer_source = hedged_call("analysis", invoke_analysis, payload.model_name), "llm"
+            except (CircuitOpenError, DeadlineExceeded) as e:
+                # Data sudah didapat; kembalikan tanpa analisis LLM daripada menggagalkan request
+                metrics.incr("analysis.degraded")
+                logger.warning("LLM analisis tidak tersedia, jawaban tanpa analisis", error=str(e))
+                final_answer = f"Query berhasil dieksekusi dan menghasilkan {len(sql_result_df)} baris data. Analisis otomatis sedang tidak tersedia."
+                answer_source = "fallback"
+        set_attributes(**{"pipeline.sql_model": model, "pipeline.sql_tier": tier, "pipeline.rows": len(sql_result_df),
+                          "pipeline.answer_source": answer_source, "pipeline.rollup": rollup})
+
+        response = {
             "type": "SUCCESS",
             "answer": final_answer,
             "generated_sql": sql_query,
             "raw_data": sql_result_df.to_dict(orient="records"),
             "data_count": len(sql_result_df),
-            "model_used": payload.model_name, "step": "completed"
+            "model_used": payload.model_name, "router_source": router_source,
+            "sql_model": model, "sql_tier": tier, "cascade": attempts, "answer_source": answer_source, "rollup": rollup,
+            "literal_repairs": repairs, "step": "completed"
         }
+        audit = {"output_query": sql_query, "output_data_raw": sql_result_for_llm, "output_analisa": final_answer}
+        return response, audit
+
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        logger.error("Dependensi pipeline OpenRouter tidak tersedia", error=str(e), model=payload.model_name)
+        response = {"type": "DEPENDENCY_UNAVAILABLE", "answer": "Layanan sedang mengalami gangguan, silakan coba beberapa saat lagi.", "model_used": payload.model_name, "error": str(e), "step": "dependency"}
+        if isinstance(e, CircuitOpenError):
+            response["retry_after"] = round(e.retry_after)
+        return response, None
+
+    except Exception as e:
+        logger.error("Pipeline OpenRouter gagal", error=str(e), model=payload.model_name)
+        return {"type": "ERROR", "answer": f"Terjadi error dalam proses: {str(e)}", "model_used": payload.model_name, "error": str(e), "step": "exception"}, None
+
 
+def _insert_audit(payload: NLToSQLRequest, audit: Dict[str, str]):
+    # Step 6: INSERT TO DATABASE (selalu per request, juga untuk hasil yang di-share)
+    try:
+        insert_trx_pertanyaan(
+            unit= payload.unit,
+            nip= payload.nip,
+            user_prompt=payload.question,
+            token_in=0,
+            token_out=0,
+            token_total=0,
+            **audit
+        )
     except Exception as e:
-        return {"type": "ERROR", "answer": f"Terjadi error dalam proses: {str(e)}", "model_used": payload.model_name, "error": str(e), "step": "exception"}
+        logger.error("Insert ke trx_pertanyaan gagal", error=str(e))
+
+
+def openrouter_nl_to_sql_workflow(payload: NLToSQLRequest) -> Dict[str, Any]:
+    """Workflow lengkap yang dioptimalkan untuk performa."""
+    precomputed = lookup_precomputed(payload.question)
+    if precomputed is not None:
+        response, audit = precomputed
+        _insert_audit(payload, audit)
+        # model_used: model yang menghasilkan jawaban tersimpan, bukan model yang diminta request ini
+        return {**response, "coalesced": False}
+
+    key = (normalize_question(payload.question), payload.model_name, payload.unit)
+    (response, audit), shared = PIPELINE_FLIGHT.do(key, lambda: run_openrouter_pipeline(payload))
+
+    if audit is None and response.get("type") in CACHED_FALLBACK_TYPES:
+        # Pipeline gagal (dependensi bermasalah): jawaban precomputed walaupun dari versi data lama lebih baik daripada error
+        cached = lookup_precomputed(payload.question, allow_stale=True)
+        if cached is not None:
+            metrics.incr("pipeline.fallback_cached")
+            cached_response, audit = cached
+            response = {**cached_response, "fallback": "cached_answer", "fallback_reason": response["type"]}
+
+    if audit is not None:
+        _insert_audit(payload, audit)
+
+    # Salinan dangkal agar request yang berbagi hasil tidak saling mengubah dict yang sama
+    return {**response, "coalesced": shared}
 
 def get_available_models() -> Dict[str, list]:
     """Mengembalikan daftar model populer yang tersedia."""
@@ -0,0 +1,211 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from src.db.data_version import get_data_fingerprint
+from src.db.trx_pertanyaan_repo import get_top_user_prompts
+from src.utils import metrics
+from src.utils.local_store import get_local_store
+from src.utils.tracing import get_logger
+from src.utils.question import normalize_question
+from src.utils.schema_spec import get_common_questions
+
+load_dotenv()
+
+logger = get_logger("precompute_service")
+
+# Jawaban yang sudah dihitung sebelumnya untuk pertanyaan umum (YAML) dan yang paling sering ditanyakan
+# (trx_pertanyaan). Diisi oleh scripts/precompute_answers.py (terjadwal), dibaca per request tanpa LLM/DB.
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "true").lower() == "true"
+PRECOMPUTE_TOP_N = int(os.getenv("PRECOMPUTE_TOP_N", "50"))
+PRECOMPUTE_MIN_COUNT = int(os.getenv("PRECOMPUTE_MIN_COUNT", "3"))
+PRECOMPUTE_MODEL_NAME = os.getenv("PRECOMPUTE_MODEL_NAME", "openai/gpt-4o")
+
+SOURCE_COMMON = "common_question"
+SOURCE_TRENDING = "trending"
+
+
+def _init_tables():
+    store = get_local_store()
+    store.execute("""
+        CREATE TABLE IF NOT EXISTS precomputed_answers (
+            question_key TEXT PRIMARY KEY,
+            question TEXT NOT NULL,
+            source TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            model_used TEXT,
+            generated_sql TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            raw_data_json TEXT NOT NULL,
+            data_count INTEGER NOT NULL,
+            output_data_raw TEXT NOT NULL,
+            data_version TEXT NOT NULL,
+            computed_at REAL NOT NULL
+        )
+    """)
+    # Tabel dari versi sebelum kolom model_used ada
+    columns = {row["name"] for row in store.execute("PRAGMA table_info(precomputed_answers)")}
+    if "model_used" not in columns:
+        store.execute("ALTER TABLE precomputed_answers ADD COLUMN model_used TEXT")
+    store.execute("""
+        CREATE TABLE IF NOT EXISTS precompute_state (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+
+
+_tables_ready = False
+
+
+def _ensure_tables():
+    global _tables_ready
+    if not _tables_ready:
+        _init_tables()
+        _tables_ready = True
+
+
+def get_current_data_version() -> Optional[str]:
+    _ensure_tables()
+    row = get_local_store().execute("SELECT value FROM precompute_state WHERE name = 'data_version'").fetchone()
+    return row["value"] if row else None
+
+
+def _set_current_data_version(version: str):
+    get_local_store().execute(
+        "INSERT INTO precompute_state (name, value) VALUES ('data_version', ?) "
+        "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+        (version,),
+    )
+
+
+def lookup_precomputed(question: str, allow_stale: bool = False) -> Optional[Tuple[Dict[str, Any], Dict[str, str]]]:
+    """
+    Mengembalikan (response, audit) jika pertanyaan (setelah normalisasi) sudah di-precompute
+    untuk versi data terbaru; None jika tidak ada atau sudah basi.
+    `allow_stale=True` (fallback saat dependensi gagal) juga menerima jawaban dari versi data lama.
+    """
+    if not PRECOMPUTE_ENABLED:
+        return None
+    try:
+        _ensure_tables()
+        if allow_stale:
+            row = get_local_store().execute(
+                "SELECT a.*, a.data_version <> COALESCE(s.value, '') AS stale FROM precomputed_answers a "
+                "LEFT JOIN precompute_state s ON s.name = 'data_version' WHERE a.question_key = ?",
+                (normalize_question(question),),
+            ).fetchone()
+        else:
+            row = get_local_store().execute(
+                """
+                SELECT a.*, 0 AS stale FROM precomputed_answers a
+                JOIN precompute_state s ON s.name = 'data_version' AND s.value = a.data_version
+                WHERE a.question_key = ?
+                """,
+                (normalize_question(question),),
+            ).fetchone()
+    except Exception as e:
+        logger.error("Gagal membaca precomputed answer", error=str(e))
+        return None
+
+    if row is None:
+        metrics.incr("precompute.miss")
+        return None
+
+    metrics.incr("precompute.hit")
+    response = {
+        "type": "SUCCESS",
+        "answer": row["answer"],
+        "generated_sql": row["generated_sql"],
+        "raw_data": json.loads(row["raw_data_json"]),
+        "data_count": row["data_count"],
+        "model_used": row["model_used"] or PRECOMPUTE_MODEL_NAME,
+        "sql_model": row["model_name"],
+        "precomputed": True,
+        "computed_at": row["computed_at"],
+        "stale": bool(row["stale"]),
+        "step": "precomputed",
+    }
+    audit = {"output_query": row["generated_sql"], "output_data_raw": row["output_data_raw"], "output_analisa": row["answer"]}
+    return response, audit
+
+
+def collect_precompute_questions(top_n: int = PRECOMPUTE_TOP_N, min_count: int = PRECOMPUTE_MIN_COUNT) -> List[Tuple[str, str]]:
+    """(pertanyaan, sumber) unik per normalisasi: common_questions YAML lalu top-N riwayat."""
+    candidates = [(item["question"], SOURCE_COMMON) for item in get_common_questions() if item.get("question")]
+    candidates += [(prompt, SOURCE_TRENDING) for prompt, count in get_top_user_prompts(top_n) if count >= min_count]
+
+    questions, seen = [], set()
+    for question, source in candidates:
+        key = normalize_question(question)
+        if key and key not in seen:
+            seen.add(key)
+            questions.append((question, source))
+    return questions
+
+
+def _store_answer(question: str, source: str, model_name: str, response: Dict[str, Any],
+                  audit: Dict[str, str], data_version: str):
+    get_local_store().execute(
+        """
+        INSERT OR REPLACE INTO precomputed_answers (
+            question_key, question, source, model_name, model_used, generated_sql, answer,
+            raw_data_json, data_count, output_data_raw, data_version, computed_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            normalize_question(question), question, source, response.get("sql_model", model_name),
+            response.get("model_used", model_name),
+            response["generated_sql"], response["answer"], json.dumps(response["raw_data"], default=str),
+            response["data_count"], audit["output_data_raw"], data_version, time.time(),
+        ),
+    )
+
+
+def refresh_precomputed_answers(model_name: str = PRECOMPUTE_MODEL_NAME, top_n: int = PRECOMPUTE_TOP_N,
+                                min_count: int = PRECOMPUTE_MIN_COUNT, force: bool = False) -> Dict[str, Any]:
+    """
+    Menjalankan pipeline penuh (router -> SQL -> validasi -> eksekusi -> analisis) untuk setiap pertanyaan
+    yang belum punya jawaban pada versi data saat ini. Jika fingerprint drauk_unit berubah, semua dihitung ulang.
+    """
+    # Import di sini agar lookup per request tidak bergantung pada inisialisasi retriever/LLM
+    from src.services.openrouter_service import NLToSQLRequest, run_openrouter_pipeline
+
+    _ensure_tables()
+    store = get_local_store()
+    data_version = get_data_fingerprint()
+    data_changed = data_version != get_current_data_version()
+    if data_changed:
+        # Jawaban untuk versi data lama langsung berhenti disajikan
+        _set_current_data_version(data_version)
+
+    summary = {"data_version": data_version, "data_changed": data_changed, "computed": 0, "skipped": 0, "failed": []}
+    for question, source in collect_precompute_questions(top_n, min_count):
+        existing = store.execute(
+            "SELECT data_version FROM precomputed_answers WHERE question_key = ?", (normalize_question(question),)
+        ).fetchone()
+        if not force and existing is not None and existing["data_version"] == data_version:
+            summary["skipped"] += 1
+            continue
+
+        payload = NLToSQLRequest(question=question, model_name=model_name, unit="", nip="")
+        response, audit = run_openrouter_pipeline(payload)
+        if audit is None or response.get("type") != "SUCCESS":
+            summary["failed"].append({"question": question, "type": response.get("type"), "answer": response.get("answer")})
+            continue
+
+        _store_answer(question, source, model_name, response, audit, data_version)
+        summary["computed"] += 1
+
+    # Jawaban versi lama untuk pertanyaan yang gagal dihitung ulang disimpan sebagai fallback saat dependensi bermasalah
+    # (lookup_precomputed(..., allow_stale=True)); sisanya dihapus
+    failed_keys = [normalize_question(item["question"]) for item in summary["failed"]]
+    store.execute(
+        f"DELETE FROM precomputed_answers WHERE data_version <> ? "
+        f"AND question_key NOT IN ({', '.join('?' for _ in failed_keys)})",
+        (data_version, *failed_keys),
+    )
+    metrics.incr("precompute.refreshed", summary["computed"])
+    return summary
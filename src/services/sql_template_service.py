@@ -0,0 +1,336 @@
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import sqlparse
+from dotenv import load_dotenv
+from sqlparse.tokens import Name, Number, String
+
+from src.db.entity_values import get_entity_values, get_entity_values_version
+from src.utils import metrics
+from src.utils.local_store import get_local_store
+from src.utils.question import normalize_question
+from src.utils.tracing import get_logger
+from src.validation import is_safe_select_query, is_schema_valid_query
+
+load_dotenv()
+
+logger = get_logger("sql_template_service")
+
+# Cache template pertanyaan -> SQL berparameter. Dari setiap SQL hasil LLM yang valid (aman, sesuai skema, ada hasil),
+# literal yang juga disebut di pertanyaan (tahun, nilai ENTITY_VALUE_COLUMNS seperti Nama_Unit/Program_Strategis)
+# dijadikan slot di kedua sisi: "total anggaran {Nama_Unit} tahun {year}" -> "... WHERE Nama_Unit = :slot_0 AND
+# Tahun_Anggaran = :slot_1". Pertanyaan baru yang bentuknya sama persis setelah slot dikenali langsung memakai SQL
+# template dengan bound parameter, tanpa router dan LLM SQL. Template baru dipakai setelah dikonfirmasi
+# SQL_TEMPLATE_MIN_CONFIRMATIONS generasi dengan nilai slot berbeda; jika ada keraguan, pipeline normal yang jalan.
+SQL_TEMPLATES_ENABLED = os.getenv("SQL_TEMPLATES_ENABLED", "true").lower() == "true"
+SQL_TEMPLATE_MIN_CONFIRMATIONS = int(os.getenv("SQL_TEMPLATE_MIN_CONFIRMATIONS", "2"))
+# Nilai entitas yang lebih pendek tidak dikenali sebagai slot (terlalu mudah cocok dengan kata biasa)
+SQL_TEMPLATE_MIN_VALUE_CHARS = int(os.getenv("SQL_TEMPLATE_MIN_VALUE_CHARS", "4"))
+
+SLOT_YEAR = "year"
+_YEAR_PATTERN = re.compile(r"(?<!\w)((?:19|20)\d{2})(?!\w)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class TemplateMatch:
+    template_key: str
+    sql_template: str  # SQL dengan placeholder :slot_<i>, dieksekusi dengan `params`
+    params: Dict[str, Any]
+    sql: str  # SQL dengan literal, untuk response dan audit
+
+
+class AmbiguousSlots(Exception):
+    """Nilai di pertanyaan bisa berarti lebih dari satu slot; template tidak boleh dipakai."""
+
+
+def _init_tables():
+    get_local_store().execute("""
+        CREATE TABLE IF NOT EXISTS sql_templates (
+            template_key TEXT PRIMARY KEY,
+            sql_template TEXT NOT NULL,
+            slots_json TEXT NOT NULL,
+            confirmations INTEGER NOT NULL,
+            conflicts INTEGER NOT NULL DEFAULT 0,
+            hits INTEGER NOT NULL DEFAULT 0,
+            last_values_json TEXT NOT NULL,
+            example_question TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+
+
+_tables_ready = False
+
+
+def _ensure_tables():
+    global _tables_ready
+    if not _tables_ready:
+        _init_tables()
+        _tables_ready = True
+
+
+# ======================================================================
+# ========== SLOT DI SISI PERTANYAAN ==========
+# ======================================================================
+def _fold(value: str) -> str:
+    return _WHITESPACE.sub(" ", value.strip().lower())
+
+
+class _EntityMatcher:
+    """Regex gabungan semua nilai entitas (terpanjang dulu) + peta nilai ter-fold -> [(kolom, nilai asli)]."""
+
+    def __init__(self, values: Dict[str, List[str]]):
+        self.lookup: Dict[str, List[Tuple[str, str]]] = {}
+        for column, column_values in values.items():
+            for value in column_values:
+                folded = _fold(value)
+                if len(folded) >= SQL_TEMPLATE_MIN_VALUE_CHARS and not _YEAR_PATTERN.fullmatch(folded):
+                    self.lookup.setdefault(folded, []).append((column, value))
+        alternatives = sorted(self.lookup, key=len, reverse=True)
+        self.pattern = (
+            re.compile(r"(?<!\w)(?:" + "|".join(re.escape(v) for v in alternatives) + r")(?!\w)")
+            if alternatives else None
+        )
+
+
+_matcher_lock = threading.Lock()
+_matcher: Tuple[int, Optional[_EntityMatcher]] = (-1, None)
+
+
+def _get_matcher() -> _EntityMatcher:
+    global _matcher
+    values = get_entity_values()
+    version = get_entity_values_version()
+    with _matcher_lock:
+        if _matcher[0] != version or _matcher[1] is None:
+            _matcher = (version, _EntityMatcher(values))
+        return _matcher[1]
+
+
+def extract_question_slots(question: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    (template_key, [(tipe slot, nilai)]) dari pertanyaan; slot urut sesuai posisi di pertanyaan.
+    AmbiguousSlots jika satu sebutan cocok dengan lebih dari satu nilai/kolom.
+    """
+    normalized = normalize_question(question)
+    if "{" in normalized or "}" in normalized:
+        raise AmbiguousSlots("pertanyaan mengandung kurung kurawal")
+
+    spans: List[Tuple[int, int, str, str]] = []
+    matcher = _get_matcher()
+    if matcher.pattern is not None:
+        for match in matcher.pattern.finditer(normalized):
+            candidates = matcher.lookup[match.group(0)]
+            if len(candidates) > 1:
+                raise AmbiguousSlots(f"'{match.group(0)}' cocok dengan {len(candidates)} nilai")
+            column, value = candidates[0]
+            spans.append((match.start(), match.end(), column, value))
+
+    for match in _YEAR_PATTERN.finditer(normalized):
+        if not any(start < match.end() and match.start() < end for start, end, _, _ in spans):
+            spans.append((match.start(), match.end(), SLOT_YEAR, match.group(1)))
+
+    spans.sort()
+    key_parts, slots, cursor = [], [], 0
+    for start, end, slot_type, value in spans:
+        key_parts.append(normalized[cursor:start])
+        key_parts.append("{" + slot_type + "}")
+        slots.append((slot_type, value))
+        cursor = end
+    key_parts.append(normalized[cursor:])
+    return "".join(key_parts), slots
+
+
+# ======================================================================
+# ========== SLOT DI SISI SQL ==========
+# ======================================================================
+def _literal_value(token) -> Optional[Tuple[str, bool]]:
+    """(nilai, numerik?) untuk literal integer atau string '...'; None untuk token lain."""
+    if token.ttype in Number.Integer:
+        return token.value, True
+    if token.ttype in String.Single:
+        return token.value[1:-1].replace("''", "'").replace("\\'", "'"), False
+    return None
+
+
+def _quote(value: Any) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def parameterize_sql(sql: str, slots: List[Tuple[str, str]]) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Mengganti literal SQL yang sama dengan nilai slot pertanyaan menjadi :slot_<i>.
+    None jika ada slot yang tidak muncul sebagai literal, literal cocok dengan lebih dari satu slot,
+    atau satu slot tahun dipakai sebagai angka dan string sekaligus.
+    """
+    folded_slots = [_fold(value) for _, value in slots]
+    if len(set(folded_slots)) != len(folded_slots):
+        return None  # nilai sama di dua slot: tidak jelas literal mana milik slot mana
+
+    statements = [s for s in sqlparse.parse(sql) if str(s).strip().strip(";")]
+    if len(statements) != 1:
+        return None
+    specs: List[Dict[str, Any]] = [{"type": slot_type, "numeric": None} for slot_type, _ in slots]
+    parts = []
+    for token in statements[0].flatten():
+        if token.ttype in Name.Placeholder:
+            return None
+        literal = _literal_value(token)
+        index = None
+        if literal is not None:
+            value, numeric = literal
+            matches = [i for i, folded in enumerate(folded_slots)
+                       if _fold(value) == folded and (not numeric or slots[i][0] == SLOT_YEAR)]
+            if len(matches) > 1:
+                return None
+            if matches:
+                index = matches[0]
+                if specs[index]["numeric"] not in (None, numeric):
+                    return None
+                specs[index]["numeric"] = numeric
+        parts.append(f":slot_{index}" if index is not None else token.value)
+
+    if any(spec["numeric"] is None for spec in specs):
+        return None  # slot pertanyaan tidak terikat ke SQL (mis. LIKE '%...%' atau nilai diubah LLM)
+    return "".join(parts).strip().rstrip(";").strip(), specs
+
+
+def _bind(slots: List[Tuple[str, str]], specs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {f"slot_{i}": int(value) if spec["numeric"] else value for i, ((_, value), spec) in enumerate(zip(slots, specs))}
+
+
+def render_sql(sql_template: str, params: Dict[str, Any]) -> str:
+    """SQL template dengan placeholder diganti literal (untuk ditampilkan/diaudit, bukan untuk dieksekusi)."""
+    parts = []
+    for token in sqlparse.parse(sql_template)[0].flatten():
+        if token.ttype in Name.Placeholder and token.value[1:] in params:
+            parts.append(_quote(params[token.value[1:]]))
+        else:
+            parts.append(token.value)
+    return "".join(parts)
+
+
+# ======================================================================
+# ========== LOOKUP & LEARN ==========
+# ======================================================================
+def match_sql_template(question: str) -> Optional[TemplateMatch]:
+    """Template terkonfirmasi untuk pertanyaan ini beserta parameter slotnya; None jika tidak ada atau ragu."""
+    if not SQL_TEMPLATES_ENABLED:
+        return None
+    try:
+        template_key, slots = extract_question_slots(question)
+        if not slots:
+            return None
+        _ensure_tables()
+        row = get_local_store().execute(
+            "SELECT sql_template, slots_json, confirmations, conflicts FROM sql_templates WHERE template_key = ?",
+            (template_key,),
+        ).fetchone()
+    except AmbiguousSlots as e:
+        metrics.incr("sql_template.ambiguous")
+        logger.debug("Slot pertanyaan ambigu, template dilewati", reason=str(e))
+        return None
+    except Exception as e:
+        logger.error("Gagal membaca template SQL", error=str(e))
+        return None
+
+    if row is None:
+        metrics.incr("sql_template.miss")
+        return None
+    if row["confirmations"] < SQL_TEMPLATE_MIN_CONFIRMATIONS:
+        metrics.incr("sql_template.unconfirmed")
+        return None
+
+    specs = json.loads(row["slots_json"])
+    if [spec["type"] for spec in specs] != [slot_type for slot_type, _ in slots]:
+        metrics.incr("sql_template.ambiguous")
+        return None
+    params = _bind(slots, specs)
+    sql = render_sql(row["sql_template"], params)
+    if not is_safe_select_query(sql):
+        return None
+
+    metrics.incr("sql_template.hit")
+    get_local_store().execute("UPDATE sql_templates SET hits = hits + 1 WHERE template_key = ?", (template_key,))
+    return TemplateMatch(template_key=template_key, sql_template=row["sql_template"], params=params, sql=sql)
+
+
+def learn_sql_template(question: str, sql: str, model_name: str) -> Optional[str]:
+    """
+    Mencatat template dari SQL hasil LLM yang sudah tervalidasi dan berhasil dieksekusi.
+    Mengembalikan template_key jika pertanyaan punya slot yang terikat ke SQL, selain itu None.
+    """
+    if not SQL_TEMPLATES_ENABLED:
+        return None
+    try:
+        template_key, slots = extract_question_slots(question)
+        if not slots or not is_schema_valid_query(sql):
+            return None
+        parameterized = parameterize_sql(sql, slots)
+        if parameterized is None:
+            metrics.incr("sql_template.unbound")
+            return None
+        sql_template, specs = parameterized
+        values = [value for _, value in slots]
+
+        _ensure_tables()
+        store = get_local_store()
+        row = store.execute(
+            "SELECT sql_template, slots_json, last_values_json FROM sql_templates WHERE template_key = ?",
+            (template_key,),
+        ).fetchone()
+        now = time.time()
+        if row is None:
+            store.execute(
+                "INSERT OR IGNORE INTO sql_templates (template_key, sql_template, slots_json, confirmations, "
+                "last_values_json, example_question, model_name, updated_at) VALUES (?, ?, ?, 1, ?, ?, ?, ?)",
+                (template_key, sql_template, json.dumps(specs), json.dumps(values), question, model_name, now),
+            )
+            metrics.incr("sql_template.learned")
+        elif row["sql_template"] == sql_template and row["slots_json"] == json.dumps(specs):
+            # Hanya generasi dengan nilai slot berbeda yang menambah keyakinan bahwa bentuk SQL tidak bergantung nilai
+            if json.loads(row["last_values_json"]) != values:
+                store.execute(
+                    "UPDATE sql_templates SET confirmations = confirmations + 1, last_values_json = ?, updated_at = ? "
+                    "WHERE template_key = ?",
+                    (json.dumps(values), now, template_key),
+                )
+                metrics.incr("sql_template.confirmed")
+        else:
+            # Bentuk SQL berbeda untuk pertanyaan yang sama: mulai ulang dari konfirmasi pertama
+            store.execute(
+                "UPDATE sql_templates SET sql_template = ?, slots_json = ?, confirmations = 1, conflicts = conflicts + 1, "
+                "last_values_json = ?, example_question = ?, model_name = ?, updated_at = ? WHERE template_key = ?",
+                (sql_template, json.dumps(specs), json.dumps(values), question, model_name, now, template_key),
+            )
+            metrics.incr("sql_template.conflict")
+        return template_key
+    except AmbiguousSlots:
+        return None
+    except Exception as e:
+        logger.error("Gagal menyimpan template SQL", error=str(e))
+        return None
+
+
+def list_sql_templates(limit: int = 100) -> List[Dict[str, Any]]:
+    _ensure_tables()
+    rows = get_local_store().execute(
+        "SELECT template_key, sql_template, slots_json, confirmations, conflicts, hits, example_question, model_name, "
+        "updated_at FROM sql_templates ORDER BY hits DESC, updated_at DESC LIMIT ?",
+        (limit,),
+    ).fetchall()
+    templates = []
+    for row in rows:
+        item = dict(row)
+        item["slots"] = json.loads(item.pop("slots_json"))
+        templates.append(item)
+    return templates
@@ -0,0 +1,228 @@
+import math
+import os
+import re
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+import sqlparse
+from dotenv import load_dotenv
+from sqlparse.sql import Function, Identifier, IdentifierList
+from sqlparse.tokens import DML, Keyword, Wildcard
+
+from src.utils import metrics
+from src.utils.schema_spec import get_columns
+
+load_dotenv()
+
+# Jawaban deterministik untuk hasil yang sepele (kosong, satu nilai, satu baris) tanpa LLM analisis.
+# Bisa diatur per endpoint; hasil multi-baris selalu dianalisis oleh LLM.
+ANSWER_TEMPLATE_ENDPOINTS = {
+    "openrouter": os.getenv("ANSWER_TEMPLATES_OPENROUTER", "true").lower() == "true",
+    "gemini": os.getenv("ANSWER_TEMPLATES_GEMINI", "true").lower() == "true",
+    # Jawaban percakapan biasanya merujuk turn sebelumnya, jadi default tetap lewat LLM
+    "contextual": os.getenv("ANSWER_TEMPLATES_CONTEXTUAL", "false").lower() == "true",
+}
+
+SHAPE_EMPTY = "empty"
+SHAPE_SCALAR = "scalar"
+SHAPE_SINGLE_ROW = "single_row"
+SHAPE_MULTI_ROW = "multi_row"
+
+CURRENCY_COLUMNS = {"jumlah", "realisasi", "sisa", "harga_satuan"}
+PLAIN_NUMBER_COLUMNS = {"tahun_anggaran", "kode_drauk"}
+
+_AGGREGATE_LABELS = {
+    "sum": "total",
+    "avg": "rata-rata",
+    "count": "jumlah",
+    "max": "nilai tertinggi",
+    "min": "nilai terendah",
+}
+
+# Satu item SELECT yang utuh: `FUNC([DISTINCT] [tbl.]kolom)` atau `[tbl.]kolom`; ekspresi lain (selisih, rasio,
+# ROUND(...), CASE) tidak ditebak dan hasilnya dianalisis LLM
+_AGGREGATE_EXPR = re.compile(r"^(\w+)\s*\(\s*(?:distinct\s+)?(?:`?\w+`?\s*\.\s*)?`?(\w+|\*)`?\s*\)$", re.IGNORECASE)
+_COLUMN_EXPR = re.compile(r"^(?:`?\w+`?\s*\.\s*)?`?(\w+)`?$")
+_WHITESPACE = re.compile(r"\s+")
+
+EMPTY_ANSWER = "Tidak ada data yang ditemukan untuk pertanyaan Anda."
+
+
+def is_template_enabled(endpoint: str) -> bool:
+    return ANSWER_TEMPLATE_ENDPOINTS.get(endpoint, False)
+
+
+def classify_result_shape(df: pd.DataFrame) -> str:
+    if df.empty:
+        return SHAPE_EMPTY
+    if len(df) > 1:
+        return SHAPE_MULTI_ROW
+    return SHAPE_SCALAR if len(df.columns) == 1 else SHAPE_SINGLE_ROW
+
+
+@lru_cache(maxsize=1)
+def _column_labels() -> Dict[str, str]:
+    """Label kolom dari YAML (`label`), fallback ke nama kolom yang dirapikan."""
+    labels = {}
+    for column in get_columns():
+        name = column.get("name")
+        if name:
+            labels[name.lower()] = column.get("label") or name.replace("_", " ").lower()
+    return labels
+
+
+def _key(name: str) -> str:
+    return _WHITESPACE.sub("", name).strip("`").lower()
+
+
+def _expression(expression: str) -> Optional[Tuple[Optional[str], str]]:
+    """(fungsi agregat, kolom skema) jika `expression` persis agregat atas satu kolom atau kolom polos."""
+    expression = expression.strip()
+    labels = _column_labels()
+    match = _AGGREGATE_EXPR.match(expression)
+    if match:
+        func, column = match.group(1).lower(), match.group(2).lower()
+        if func in _AGGREGATE_LABELS and (column in labels or (column == "*" and func == "count")):
+            return func, column
+        return None
+    match = _COLUMN_EXPR.match(expression)
+    if match and match.group(1).lower() in labels:
+        return None, match.group(1).lower()
+    return None
+
+
+def _select_items(sql: str) -> Tuple[Dict[str, Optional[Tuple[Optional[str], str]]], bool]:
+    """
+    (nama kolom hasil -> (fungsi agregat, kolom) atau None jika tidak bisa dipastikan, ada `*` di SELECT)
+    dari daftar SELECT terluar query.
+    """
+    items: Dict[str, Optional[Tuple[Optional[str], str]]] = {}
+    statements = sqlparse.parse(sql or "")
+    if not statements:
+        return items, False
+    tokens = [token for token in statements[0].tokens if not token.is_whitespace]
+    start = next((i for i, token in enumerate(tokens) if token.ttype in DML and token.value.upper() == "SELECT"), None)
+    if start is None:
+        return items, False
+    position = start + 1
+    while position < len(tokens) and tokens[position].ttype in Keyword and tokens[position].value.upper() in ("DISTINCT", "ALL"):
+        position += 1
+    if position >= len(tokens):
+        return items, False
+    select_list = tokens[position]
+    selected = list(select_list.get_identifiers()) if isinstance(select_list, IdentifierList) else [select_list]
+
+    wildcard = False
+    for item in selected:
+        text = str(item).strip()
+        if item.ttype in Wildcard or text.endswith("*") and not text.endswith("(*)"):
+            wildcard = True
+            continue
+        alias = item.get_alias() if isinstance(item, (Identifier, Function)) else None
+        expression = text
+        if alias:
+            expression = re.sub(rf"\s+(?:as\s+)?`?{re.escape(alias)}`?$", "", text, flags=re.IGNORECASE)
+        resolved = _expression(expression)
+        if alias:
+            items[_key(alias)] = resolved
+        elif resolved is not None and resolved[0] is None:
+            items[resolved[1]] = resolved
+        else:
+            items[_key(expression)] = resolved
+    return items, wildcard
+
+
+def _resolve_column(name: str, items: Dict[str, Optional[Tuple[Optional[str], str]]],
+                    wildcard: bool) -> Optional[Tuple[Optional[str], str]]:
+    """(fungsi agregat, kolom skema) untuk nama kolom hasil query, atau None jika tidak bisa dipastikan."""
+    key = _key(name)
+    if key in items:
+        return items[key]
+    if not items and not wildcard:
+        # Tanpa SQL: nama kolom hasil driver untuk item tanpa alias (`SUM(Jumlah)`, `Nama_Unit`)
+        return _expression(name)
+    if wildcard and key in _column_labels():
+        return None, key
+    return None
+
+
+def _label(name: str, func: Optional[str], column: Optional[str]) -> str:
+    labels = _column_labels()
+    if column in labels:
+        base = labels[column]
+    elif column == "*":
+        base = "data"
+    else:
+        base = name.replace("_", " ").lower()
+    if func in _AGGREGATE_LABELS and not base.startswith(_AGGREGATE_LABELS[func]):
+        return f"{_AGGREGATE_LABELS[func]} {base}"
+    return base
+
+
+def format_number(value: Any, decimals: int = 2) -> str:
+    """Format angka Indonesia: titik pemisah ribuan, koma desimal, tanpa ',00'."""
+    formatted = f"{float(value):,.{decimals}f}".replace(",", "#").replace(".", ",").replace("#", ".")
+    return formatted[: -(decimals + 1)] if decimals and formatted.endswith("," + "0" * decimals) else formatted
+
+
+def format_rupiah(value: Any) -> str:
+    return f"Rp {format_number(value)}"
+
+
+def _is_number(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float, Decimal)):
+        return True
+    return hasattr(value, "dtype") and getattr(value.dtype, "kind", "") in "iuf"
+
+
+def _format_value(value: Any, func: Optional[str], column: Optional[str]) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NaT:
+        return "tidak tersedia"
+    if not _is_number(value):
+        return str(value)
+    if func == "count":
+        return format_number(value, 0)
+    if column in CURRENCY_COLUMNS:
+        return format_rupiah(value)
+    if column in PLAIN_NUMBER_COLUMNS and func is None:
+        return str(int(value))
+    return format_number(value)
+
+
+def render_template_answer(df: pd.DataFrame, sql: str = "") -> Optional[Tuple[str, str]]:
+    """
+    Mengembalikan (jawaban, shape) untuk hasil kosong/satu nilai/satu baris,
+    atau None jika hasil perlu dianalisis LLM (multi-baris, atau ada kolom yang tidak bisa dipetakan ke kolom skema).
+    """
+    shape = classify_result_shape(df)
+    if shape == SHAPE_MULTI_ROW:
+        return None
+
+    # SUM/MAX tanpa baris yang cocok menghasilkan satu nilai NULL
+    if shape == SHAPE_SCALAR and pd.isna(df.iloc[0, 0]):
+        shape = SHAPE_EMPTY
+    if shape == SHAPE_EMPTY:
+        metrics.incr(f"answer_template.{shape}")
+        return EMPTY_ANSWER, shape
+
+    items, wildcard = _select_items(sql)
+    row = df.iloc[0]
+    parts = []
+    for name in df.columns:
+        resolved = _resolve_column(str(name), items, wildcard)
+        if resolved is None:
+            # Ekspresi yang tidak dikenali (selisih, rasio, alias bebas): label dan format angka tidak bisa dipastikan
+            metrics.incr("answer_template.unresolved")
+            return None
+        func, column = resolved
+        parts.append((_label(str(name), func, column), _format_value(row[name], func, column)))
+
+    metrics.incr(f"answer_template.{shape}")
+    if shape == SHAPE_SCALAR:
+        label, value = parts[0]
+        return f"{label[:1].upper()}{label[1:]} adalah {value}.", shape
+    return "Berikut hasilnya: " + ", ".join(f"{label} {value}" for label, value in parts) + ".", shape
@@ -1,5 +1,7 @@
 from typing import Tuple, Dict, Any
 
+from src.utils.tracing import set_attributes
+
 def run_with_gemini_token_count(chain, inputs: Any, model_name: str) -> Tuple[Any, Dict[str, int]]:
     """
     Jalankan chain sekaligus hitung token input/output untuk Gemini.
@@ -25,4 +27,5 @@ def run_with_gemini_token_count(chain, inputs: Any, model_name: str) -> Tuple[An
         "output_tokens": output_tokens,
         "total_tokens": input_tokens + output_tokens,
     }
+    set_attributes(**{f"llm.{k}": v for k, v in usage.items()})
     return output, usage
\ No newline at end of file
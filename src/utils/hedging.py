@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+from src.utils import metrics
+from src.utils.profiling import bind_profile
+from src.utils.resilience import guarded_call, llm_breakers
+from src.utils.tracing import bind_context, get_logger, set_attributes, span
+from src.utils.stage_limits import stage_gate
+
+load_dotenv()
+
+logger = get_logger("hedging")
+
+T = TypeVar("T")
+
+# Hedging permintaan LLM: jika panggilan belum selesai setelah delay (persentil latensi stage),
+# kirim duplikat ke model yang sama / model fallback, pakai yang selesai lebih dulu.
+# Aktifkan per stage, mis. HEDGE_STAGES="router,sql,analysis". Kosong = nonaktif.
+HEDGE_STAGES = {s.strip() for s in os.getenv("HEDGE_STAGES", "").split(",") if s.strip()}
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "1000"))
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv("HEDGE_DEFAULT_DELAY_MS", "8000"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Budget per stage: setiap panggilan menambah HEDGE_MAX_RATIO token (maks HEDGE_BURST), satu hedge memakai 1 token
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+HEDGE_BURST = float(os.getenv("HEDGE_BURST", "3"))
+HEDGE_MAX_WORKERS = int(os.getenv("HEDGE_MAX_WORKERS", "64"))
+
+
+def get_fallback_model(stage: str) -> Optional[str]:
+    """Model hedge per stage, mis. HEDGE_FALLBACK_MODEL_SQL; None = model yang sama."""
+    return os.getenv(f"HEDGE_FALLBACK_MODEL_{stage.upper()}") or None
+
+
+def get_breaker_fallback_model(stage: str) -> Optional[str]:
+    """Model alternatif saat model utama gagal / breaker-nya terbuka: BREAKER_FALLBACK_MODEL_<STAGE>, default model hedge."""
+    return os.getenv(f"BREAKER_FALLBACK_MODEL_{stage.upper()}") or get_fallback_model(stage)
+
+
+class _HedgeBudget:
+    def __init__(self, ratio: float, burst: float):
+        self._ratio = ratio
+        self._burst = burst
+        self._tokens: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record_call(self, stage: str):
+        with self._lock:
+            self._tokens[stage] = min(self._burst, self._tokens.get(stage, self._burst) + self._ratio)
+
+    def try_acquire(self, stage: str) -> bool:
+        with self._lock:
+            tokens = self._tokens.get(stage, self._burst)
+            if tokens < 1:
+                return False
+            self._tokens[stage] = tokens - 1
+            return True
+
+
+_budget = _HedgeBudget(HEDGE_MAX_RATIO, HEDGE_BURST)
+_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="llm-hedge")
+
+
+def _latency_metric(stage: str) -> str:
+    return f"llm.{stage}.latency_ms"
+
+
+def _hedge_delay(stage: str) -> float:
+    name = _latency_metric(stage)
+    if metrics.sample_count(name) < HEDGE_MIN_SAMPLES:
+        delay_ms = HEDGE_DEFAULT_DELAY_MS
+    else:
+        delay_ms = metrics.percentile(name, HEDGE_PERCENTILE, HEDGE_DEFAULT_DELAY_MS)
+    return max(HEDGE_MIN_DELAY_MS, delay_ms) / 1000
+
+
+def _traced(call: Callable[[str], T], hedge: bool = False) -> Callable[[str], T]:
+    def run(model: str) -> T:
+        with span("llm.call", **{"llm.model": model, "llm.hedge": hedge}):
+            return call(model)
+    return run
+
+
+def _submit(stage: str, call: Callable[[str], T], model: str, hedge: bool = False) -> Future:
+    start = time.perf_counter()
+    # Span aktif dan profile request ikut dibawa ke thread executor
+    future = _executor.submit(bind_context(bind_profile(_traced(call, hedge))), model)
+    # Latensi dicatat per panggilan (termasuk yang kalah) agar persentil tidak bias
+    future.add_done_callback(
+        lambda f: metrics.observe(_latency_metric(stage), (time.perf_counter() - start) * 1000)
+    )
+    return future
+
+
+def hedged_call(stage: str, call: Callable[[str], T], model: str, provider: str = "openrouter") -> T:
+    """
+    Menjalankan `call(model)` untuk satu stage pipeline dengan hedging opsional.
+    Panggilan yang kalah dibatalkan jika belum mulai; jika sudah berjalan, hasilnya diabaikan.
+    Setiap model dipanggil lewat circuit breaker (provider + model) dan deadline stage; jika gagal atau breaker-nya
+    terbuka, model alternatif stage (lihat get_breaker_fallback_model) dicoba.
+    """
+    with stage_gate(stage), span(f"llm.{stage}", **{"llm.model": model}):
+        candidates = [model]
+        fallback = get_breaker_fallback_model(stage)
+        if fallback and fallback != model:
+            candidates.append(fallback)
+
+        for index, candidate in enumerate(candidates):
+            try:
+                result = guarded_call(
+                    llm_breakers(provider, candidate), stage, lambda: _hedged_call(stage, call, candidate)
+                )
+            except Exception as e:
+                if index == len(candidates) - 1:
+                    raise
+                logger.warning("Model gagal, mencoba model alternatif", stage=stage, model=candidate,
+                               fallback=candidates[index + 1], error=str(e))
+                continue
+            if index > 0:
+                metrics.incr(f"llm.{stage}.fallback_model")
+                set_attributes(**{"llm.fallback_model": candidate})
+            return result
+        raise RuntimeError("unreachable")
+
+
+def _hedged_call(stage: str, call: Callable[[str], T], model: str) -> T:
+    metrics.incr(f"hedge.{stage}.calls")
+    _budget.record_call(stage)
+
+    if stage not in HEDGE_STAGES:
+        start = time.perf_counter()
+        try:
+            return _traced(call)(model)
+        finally:
+            metrics.observe(_latency_metric(stage), (time.perf_counter() - start) * 1000)
+
+    primary = _submit(stage, call, model)
+    done, _ = wait([primary], timeout=_hedge_delay(stage))
+    if done or not _budget.try_acquire(stage):
+        return primary.result()
+
+    metrics.incr(f"hedge.{stage}.issued")
+    hedge = _submit(stage, call, get_fallback_model(stage) or model, hedge=True)
+
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        winner = next((f for f in done if f.exception() is None), None)
+        if winner is not None:
+            for loser in pending:
+                loser.cancel()
+            if winner is hedge:
+                metrics.incr(f"hedge.{stage}.won")
+            return winner.result()
+
+    # Keduanya gagal: laporkan error panggilan utama
+    return primary.result()
+
+
+def hedge_stats() -> Dict[str, Dict[str, float]]:
+    """Hedge rate dan win rate per stage untuk endpoint /metrics."""
+    counters = metrics.snapshot()["counters"]
+    stats = {}
+    for name, calls in counters.items():
+        if not (name.startswith("hedge.") and name.endswith(".calls")) or not calls:
+            continue
+        stage = name[len("hedge."):-len(".calls")]
+        issued = counters.get(f"hedge.{stage}.issued", 0)
+        won = counters.get(f"hedge.{stage}.won", 0)
+        stats[stage] = {
+            "enabled": stage in HEDGE_STAGES,
+            "calls": calls,
+            "hedges": issued,
+            "hedge_rate": issued / calls,
+            "hedge_wins": won,
+            "win_rate": won / issued if issued else 0.0,
+        }
+    return stats
@@ -0,0 +1,94 @@
+import os
+import random
+import time
+from functools import lru_cache
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Satu HTTP client per proses untuk semua panggilan OpenRouter:
+# koneksi keep-alive dipakai ulang antar stage dan antar request (tanpa TCP/TLS handshake baru).
+OPENROUTER_HTTP_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_HTTP_MAX_CONNECTIONS", "100"))
+OPENROUTER_HTTP_MAX_KEEPALIVE = int(os.getenv("OPENROUTER_HTTP_MAX_KEEPALIVE", "20"))
+OPENROUTER_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("OPENROUTER_HTTP_KEEPALIVE_EXPIRY", "60"))
+OPENROUTER_HTTP_TIMEOUT = float(os.getenv("OPENROUTER_HTTP_TIMEOUT", "60"))
+OPENROUTER_HTTP2 = os.getenv("OPENROUTER_HTTP2", "false").lower() == "true"
+OPENROUTER_HTTP_MAX_RETRIES = int(os.getenv("OPENROUTER_HTTP_MAX_RETRIES", "3"))
+OPENROUTER_HTTP_BACKOFF_BASE = float(os.getenv("OPENROUTER_HTTP_BACKOFF_BASE", "0.5"))
+OPENROUTER_HTTP_BACKOFF_MAX = float(os.getenv("OPENROUTER_HTTP_BACKOFF_MAX", "8"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (dependensi opsional: pip install "httpx[http2]")
+        return True
+    except ImportError:
+        return False
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Transport yang mengulang request pada 429/5xx dan error koneksi dengan jittered backoff."""
+
+    def __init__(self, transport: httpx.BaseTransport, max_retries: int, backoff_base: float, backoff_max: float):
+        self._transport = transport
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(self._backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        # Full jitter: acak di [0, base * 2^attempt]
+        return random.uniform(0, min(self._backoff_max, self._backoff_base * (2 ** attempt)))
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(self._max_retries + 1):
+            try:
+                response = self._transport.handle_request(request)
+            except (httpx.ConnectError, httpx.RemoteProtocolError):
+                # Koneksi keep-alive yang sudah ditutup server / gagal konek: aman diulang
+                if attempt == self._max_retries:
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self._max_retries:
+                return response
+
+            response.read()
+            response.close()
+            time.sleep(self._delay(attempt, response))
+        raise RuntimeError("unreachable")
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+def build_http_client(http2: bool = OPENROUTER_HTTP2) -> httpx.Client:
+    limits = httpx.Limits(
+        max_connections=OPENROUTER_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENROUTER_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=OPENROUTER_HTTP_KEEPALIVE_EXPIRY,
+    )
+    transport = httpx.HTTPTransport(limits=limits, http2=http2 and _http2_available())
+    return httpx.Client(
+        transport=RetryTransport(
+            transport, OPENROUTER_HTTP_MAX_RETRIES, OPENROUTER_HTTP_BACKOFF_BASE, OPENROUTER_HTTP_BACKOFF_MAX
+        ),
+        timeout=OPENROUTER_HTTP_TIMEOUT,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_shared_http_client() -> httpx.Client:
+    """HTTP client bersama (process-wide) untuk OpenRouter."""
+    return build_http_client()
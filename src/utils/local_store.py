@@ -0,0 +1,29 @@
+import os
+import sqlite3
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Penyimpanan state lokal yang dibagi oleh semua worker uvicorn di satu host (file SQLite, mode WAL).
+# Dipakai sebagai stand-in untuk state store bersama (mis. Redis) pada deployment satu host.
+LOCAL_STORE_PATH = os.getenv(
+    "LOCAL_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "local_store.sqlite3"),
+)
+
+_local = threading.local()
+
+
+def get_local_store() -> sqlite3.Connection:
+    """Koneksi SQLite per thread ke LOCAL_STORE_PATH (koneksi sqlite tidak boleh dibagi antar thread)."""
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        os.makedirs(os.path.dirname(os.path.abspath(LOCAL_STORE_PATH)), exist_ok=True)
+        connection = sqlite3.connect(LOCAL_STORE_PATH, timeout=5, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        _local.connection = connection
+    return connection
@@ -0,0 +1,66 @@
+import threading
+from collections import deque
+from typing import Deque, Dict, Any
+
+# Registry metrik sederhana per proses (per worker uvicorn).
+# Counter untuk kejadian, histogram (reservoir terbatas) untuk latensi.
+HISTOGRAM_WINDOW = 1000
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+_histograms: Dict[str, Deque[float]] = {}
+
+
+def incr(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, value: float) -> None:
+    with _lock:
+        window = _histograms.get(name)
+        if window is None:
+            window = _histograms[name] = deque(maxlen=HISTOGRAM_WINDOW)
+        window.append(value)
+
+
+def get_counter(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def sample_count(name: str) -> int:
+    with _lock:
+        return len(_histograms.get(name, ()))
+
+
+def percentile(name: str, pct: float, default: float = 0.0) -> float:
+    """Persentil dari observasi terakhir (0-100); `default` jika belum ada data."""
+    with _lock:
+        values = sorted(_histograms.get(name, ()))
+    if not values:
+        return default
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def snapshot() -> Dict[str, Any]:
+    """Salinan semua metrik untuk endpoint /metrics."""
+    with _lock:
+        counters = dict(_counters)
+        windows = {name: sorted(values) for name, values in _histograms.items()}
+
+    histograms = {}
+    for name, values in windows.items():
+        if not values:
+            continue
+        pick = lambda pct: values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+        histograms[name] = {
+            "count": len(values),
+            "avg": sum(values) / len(values),
+            "p50": pick(50),
+            "p95": pick(95),
+            "p99": pick(99),
+            "max": values[-1],
+        }
+    return {"counters": counters, "histograms": histograms}
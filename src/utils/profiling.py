@@ -0,0 +1,272 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Set, TypeVar
+
+from dotenv import load_dotenv
+
+from src.utils import metrics
+from src.utils.local_store import get_local_store
+from src.utils.tracing import get_logger
+
+load_dotenv()
+
+logger = get_logger("profiling")
+
+# Profiling per request (opt-in): header `X-Profile-Token` berisi PROFILING_TOKEN, atau sampling acak
+# PROFILING_SAMPLE_RATE (0-1) untuk request POST. Thread yang menjalankan pipeline di-sample stack-nya setiap
+# PROFILING_INTERVAL_MS; hasilnya disimpan di local store dalam format collapsed stack (flamegraph.pl, speedscope).
+# Tanpa PROFILING_TOKEN dan dengan sample rate 0, middleware tidak dipasang dan sampler tidak pernah berjalan.
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_MAX_STORED = int(os.getenv("PROFILING_MAX_STORED", "200"))
+PROFILING_ENABLED = bool(PROFILING_TOKEN) or PROFILING_SAMPLE_RATE > 0
+
+PROFILE_HEADER = "x-profile-token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+T = TypeVar("T")
+
+
+class Profile:
+    """Stack sample satu request dari semua thread yang menjalankan pipeline-nya."""
+
+    def __init__(self, profile_id: str, method: str, path: str, trigger: str, client_request_id: str = ""):
+        self.profile_id = profile_id
+        self.client_request_id = client_request_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = 0.0
+        self.status: Optional[int] = None
+        self._lock = threading.Lock()
+        self._threads: Dict[int, int] = {}  # ident -> jumlah attach (thread executor bisa dipakai ulang)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+    def add_thread(self, ident: int):
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+
+    def remove_thread(self, ident: int):
+        with self._lock:
+            remaining = self._threads.get(ident, 0) - 1
+            if remaining > 0:
+                self._threads[ident] = remaining
+            else:
+                self._threads.pop(ident, None)
+
+    def threads(self) -> List[int]:
+        with self._lock:
+            return list(self._threads)
+
+    def record(self, stack: str):
+        with self._lock:
+            self.stacks[stack] += 1
+            self.samples += 1
+
+    def finish(self, status: Optional[int]):
+        self.status = status
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+
+    def collapsed(self) -> str:
+        """Format collapsed stack: `frame;frame;frame jumlah` per baris (root di kiri)."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    marker = f"{os.sep}src{os.sep}"
+    short = filename[filename.rfind(marker) + 1:] if marker in filename else os.path.basename(filename)
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({short}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class _Sampler:
+    """Satu thread sampler per worker; hanya aktif selama ada request yang di-profile."""
+
+    def __init__(self, interval_s: float):
+        self._interval = interval_s
+        self._condition = threading.Condition()
+        self._active: Set[Profile] = set()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile):
+        with self._condition:
+            self._active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def remove(self, profile: Profile):
+        with self._condition:
+            self._active.discard(profile)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._condition:
+                while not self._active:
+                    self._condition.wait()
+                profiles = list(self._active)
+            frames = sys._current_frames()
+            for profile in profiles:
+                for ident in profile.threads():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != own:
+                        profile.record(_collapse(frame))
+            del frames
+            time.sleep(self._interval)
+
+
+_sampler = _Sampler(PROFILING_INTERVAL_MS / 1000)
+_current_profile: ContextVar[Optional[Profile]] = ContextVar("request_profile", default=None)
+
+
+def should_profile(method: str, token: str) -> Optional[str]:
+    """Alasan request di-profile ("header"/"sampled"), atau None."""
+    if PROFILING_TOKEN and token and hmac.compare_digest(token, PROFILING_TOKEN):
+        return "header"
+    if PROFILING_SAMPLE_RATE > 0 and method == "POST" and random.random() < PROFILING_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def is_admin_token(token: str) -> bool:
+    return bool(PROFILING_TOKEN) and bool(token) and hmac.compare_digest(token, PROFILING_TOKEN)
+
+
+def start_profile(method: str, path: str, trigger: str, client_request_id: str = ""):
+    """
+    Membuat profile dan menjadikannya profile aktif di context saat ini; kembalikan (profile, token reset).
+    Id profile selalu dibuat server; X-Request-Id dari klien hanya disimpan sebagai keterangan (tidak unik).
+    """
+    profile = Profile(uuid.uuid4().hex[:16], method, path, trigger, client_request_id)
+    _sampler.add(profile)
+    metrics.incr(f"profiling.started.{trigger}")
+    return profile, _current_profile.set(profile)
+
+
+def stop_profile(profile: Profile, context_token, status: Optional[int]):
+    _current_profile.reset(context_token)
+    _sampler.remove(profile)
+    profile.finish(status)
+
+
+def current_profile() -> Optional[Profile]:
+    return _current_profile.get() if PROFILING_ENABLED else None
+
+
+@contextmanager
+def profiled_thread(profile: Optional[Profile] = None):
+    """Mendaftarkan thread saat ini ke profile aktif (no-op jika request tidak di-profile)."""
+    profile = profile or current_profile()
+    if profile is None:
+        yield
+        return
+    ident = threading.get_ident()
+    profile.add_thread(ident)
+    try:
+        yield
+    finally:
+        profile.remove_thread(ident)
+
+
+def bind_profile(call: Callable[..., T]) -> Callable[..., T]:
+    """Membungkus callable yang akan dijalankan di thread executor agar ikut ter-sample."""
+    profile = current_profile()
+    if profile is None:
+        return call
+
+    def wrapper(*args, **kwargs):
+        with profiled_thread(profile):
+            return call(*args, **kwargs)
+    return wrapper
+
+
+# ======================================================================
+# ========== PENYIMPANAN (LOCAL STORE, DIBAGI ANTAR WORKER) ==========
+# ======================================================================
+_tables_ready = False
+
+
+def _ensure_tables():
+    global _tables_ready
+    if not _tables_ready:
+        store = get_local_store()
+        # Tabel lama dengan key request_id dari klien: profile hanya data diagnostik, dibuat ulang
+        columns = {row["name"] for row in store.execute("PRAGMA table_info(request_profiles)")}
+        if columns and "profile_id" not in columns:
+            store.execute("DROP TABLE request_profiles")
+        store.execute("""
+            CREATE TABLE IF NOT EXISTS request_profiles (
+                profile_id TEXT PRIMARY KEY,
+                client_request_id TEXT,
+                method TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status INTEGER,
+                trigger_source TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                duration_ms REAL NOT NULL,
+                samples INTEGER NOT NULL,
+                collapsed TEXT NOT NULL
+            )
+        """)
+        _tables_ready = True
+
+
+def save_profile(profile: Profile):
+    try:
+        _ensure_tables()
+        store = get_local_store()
+        store.execute(
+            "INSERT INTO request_profiles (profile_id, client_request_id, method, path, status, trigger_source, "
+            "started_at, duration_ms, samples, collapsed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (profile.profile_id, profile.client_request_id or None, profile.method, profile.path, profile.status, profile.trigger,
+             profile.started_at, profile.duration_ms, profile.samples, profile.collapsed()),
+        )
+        store.execute(
+            "DELETE FROM request_profiles WHERE profile_id NOT IN "
+            "(SELECT profile_id FROM request_profiles ORDER BY started_at DESC LIMIT ?)",
+            (PROFILING_MAX_STORED,),
+        )
+    except Exception as e:
+        logger.error("Gagal menyimpan profile", profile_id=profile.profile_id, error=str(e))
+
+
+def list_profiles(limit: int = 50) -> List[Dict[str, Any]]:
+    _ensure_tables()
+    rows = get_local_store().execute(
+        "SELECT profile_id, client_request_id, method, path, status, trigger_source, started_at, duration_ms, samples "
+        "FROM request_profiles ORDER BY started_at DESC LIMIT ?",
+        (limit,),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_profile_collapsed(profile_id: str) -> Optional[str]:
+    _ensure_tables()
+    row = get_local_store().execute(
+        "SELECT collapsed FROM request_profiles WHERE profile_id = ?", (profile_id,)
+    ).fetchone()
+    return row["collapsed"] if row else None
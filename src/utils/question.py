@@ -0,0 +1,10 @@
+import re
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s\?\.!,;:]+$")
+
+
+def normalize_question(question: str) -> str:
+    """Bentuk kanonik pertanyaan: huruf kecil, spasi dirapikan, tanda baca akhir dibuang."""
+    normalized = _WHITESPACE.sub(" ", question.strip().lower())
+    return _TRAILING_PUNCT.sub("", normalized)
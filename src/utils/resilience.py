@@ -0,0 +1,363 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from dotenv import load_dotenv
+
+from src.utils import metrics
+from src.utils.profiling import bind_profile
+from src.utils.tracing import bind_context, get_logger, set_attributes
+
+load_dotenv()
+
+logger = get_logger("resilience")
+
+T = TypeVar("T")
+
+# Deadline dan circuit breaker untuk dependensi pipeline (LLM per provider dan per model, Qdrant, MySQL).
+# - REQUEST_DEADLINE_MS: batas total satu request pipeline (dihitung setelah lolos admission); 0 = tanpa batas
+# - STAGE_DEADLINE_<STAGE>_MS: batas per stage (router, retrieve, sql, execute, analysis, audit); dipotong sisa deadline request
+# Panggilan yang melewati deadline ditinggalkan (thread-nya selesai sendiri, hasilnya diabaikan) dan dihitung gagal.
+# Breaker terbuka setelah BREAKER_FAILURE_THRESHOLD kegagalan berturut-turut; selama BREAKER_RESET_TIMEOUT_S panggilan
+# langsung ditolak (CircuitOpenError), lalu BREAKER_HALF_OPEN_MAX panggilan percobaan menentukan breaker tertutup lagi.
+RESILIENCE_ENABLED = os.getenv("RESILIENCE_ENABLED", "true").lower() == "true"
+REQUEST_DEADLINE_MS = float(os.getenv("REQUEST_DEADLINE_MS", "90000"))
+DEFAULT_STAGE_DEADLINES_MS = {
+    "router": 10000,
+    "retrieve": 5000,
+    "sql": 45000,
+    "execute": 30000,
+    "analysis": 30000,
+    "audit": 5000,
+}
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT_S = float(os.getenv("BREAKER_RESET_TIMEOUT_S", "30"))
+BREAKER_HALF_OPEN_MAX = int(os.getenv("BREAKER_HALF_OPEN_MAX", "1"))
+# Thread untuk panggilan ber-deadline, per dependensi: panggilan LLM yang macet tidak menghabiskan thread
+# Qdrant/MySQL (dan tidak membuat breaker dependensi yang sehat ikut terbuka karena antre)
+DEADLINE_MAX_WORKERS = int(os.getenv("DEADLINE_MAX_WORKERS", "64"))
+# Stage -> dependensi yang dipanggil stage itu (stage lain: executor sendiri per nama stage)
+STAGE_DEPENDENCIES = {
+    "router": "llm",
+    "sql": "llm",
+    "analysis": "llm",
+    "retrieve": "qdrant",
+    "execute": "mysql.readonly",
+    "audit": "mysql.primary",
+}
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str, timeout_s: float):
+        super().__init__(f"Deadline stage '{stage}' terlewati ({timeout_s * 1000:.0f} ms)")
+        self.stage = stage
+        self.timeout_s = timeout_s
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit breaker '{name}' terbuka, coba lagi dalam {retry_after:.0f} detik")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def get_stage_deadline_ms(stage: str) -> float:
+    """Deadline stage dari STAGE_DEADLINE_<STAGE>_MS (0 = tanpa batas)."""
+    value = os.getenv(f"STAGE_DEADLINE_{stage.upper()}_MS")
+    return float(value) if value else float(DEFAULT_STAGE_DEADLINES_MS.get(stage, 0))
+
+
+# ======================================================================
+# ========== DEADLINE ==========
+# ======================================================================
+_request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(stage: str) -> ThreadPoolExecutor:
+    dependency = STAGE_DEPENDENCIES.get(stage, stage)
+    executor = _executors.get(dependency)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(dependency)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=DEADLINE_MAX_WORKERS, thread_name_prefix=f"deadline-{dependency.replace('.', '-')}"
+                )
+                _executors[dependency] = executor
+    return executor
+
+
+@contextmanager
+def request_deadline(timeout_ms: float = REQUEST_DEADLINE_MS):
+    """Menetapkan deadline total untuk pipeline di context ini (tidak memperpanjang deadline yang sudah ada)."""
+    if not RESILIENCE_ENABLED or timeout_ms <= 0:
+        yield
+        return
+    deadline = time.monotonic() + timeout_ms / 1000
+    current = _request_deadline.get()
+    token = _request_deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+def remaining_s() -> Optional[float]:
+    deadline = _request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def stage_timeout(stage: str, request_bound: bool = True) -> Tuple[Optional[float], bool]:
+    """
+    (waktu dalam detik yang boleh dipakai stage ini atau None = tanpa batas, True jika batasnya sisa deadline request
+    dan bukan deadline stage). Jika `request_bound`, dipotong sisa deadline request (DeadlineExceeded jika sudah habis).
+    """
+    if not RESILIENCE_ENABLED:
+        return None, False
+    stage_ms = get_stage_deadline_ms(stage)
+    timeout = stage_ms / 1000 if stage_ms > 0 else None
+    remaining = remaining_s() if request_bound else None
+    if remaining is not None:
+        if remaining <= 0:
+            metrics.incr(f"deadline.{stage}.exhausted")
+            raise DeadlineExceeded(stage, 0)
+        if timeout is None or remaining < timeout:
+            return remaining, True
+    return timeout, False
+
+
+def _run_with_timeout(stage: str, fn: Callable[[], T], timeout: Optional[float]) -> T:
+    if timeout is None:
+        return fn()
+    future = _get_executor(stage).submit(bind_context(bind_profile(fn)))
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        metrics.incr(f"deadline.{stage}.exceeded")
+        set_attributes(**{"deadline.exceeded": stage})
+        raise DeadlineExceeded(stage, timeout) from None
+
+
+def call_with_deadline(stage: str, fn: Callable[[], T]) -> T:
+    """
+    Menjalankan `fn` dengan batas waktu stage. Tanpa deadline, `fn` dijalankan langsung di thread ini;
+    dengan deadline, dijalankan di thread executor (span dan profile ikut terbawa) dan ditunggu sampai batasnya.
+    """
+    return _run_with_timeout(stage, fn, stage_timeout(stage)[0])
+
+
+# ======================================================================
+# ========== CIRCUIT BREAKER ==========
+# ======================================================================
+class CircuitBreaker:
+    """Breaker per dependensi (per worker): closed -> open setelah kegagalan berturut-turut -> half_open -> closed."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        reset_timeout_s: float,
+        half_open_max: int,
+        is_failure: Optional[Callable[[BaseException], bool]] = None,
+    ):
+        self.name = name
+        # Error yang tidak dihitung (mis. SQL salah dari LLM) berarti dependensinya sehat
+        self.is_failure = is_failure or (lambda e: True)
+        self._failure_threshold = failure_threshold
+        self._reset_timeout_s = reset_timeout_s
+        self._half_open_max = half_open_max
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._last_error: Optional[str] = None
+        self._totals = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def _current_state(self) -> str:
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self._reset_timeout_s:
+            self._state = STATE_HALF_OPEN
+            self._trials = 0
+        return self._state
+
+    def acquire(self):
+        """Izin satu panggilan; CircuitOpenError jika breaker terbuka (atau kuota percobaan half-open habis)."""
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_CLOSED:
+                return
+            if state == STATE_HALF_OPEN and self._trials < self._half_open_max:
+                self._trials += 1
+                return
+            self._totals["rejected"] += 1
+            retry_after = max(0.0, self._reset_timeout_s - (time.monotonic() - self._opened_at))
+        metrics.incr(f"breaker.{self.name}.rejected")
+        raise CircuitOpenError(self.name, retry_after)
+
+    def release_trial(self):
+        """Mengembalikan slot percobaan half-open yang tidak jadi dipakai."""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def is_available(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            return state == STATE_CLOSED or (state == STATE_HALF_OPEN and self._trials < self._half_open_max)
+
+    def record_success(self):
+        with self._lock:
+            self._totals["successes"] += 1
+            self._consecutive_failures = 0
+            if self._state != STATE_CLOSED:
+                logger.info("Circuit breaker tertutup kembali", breaker=self.name)
+            self._state = STATE_CLOSED
+
+    def record_failure(self, error: BaseException):
+        with self._lock:
+            self._totals["failures"] += 1
+            self._consecutive_failures += 1
+            self._last_error = f"{type(error).__name__}: {error}"[:300]
+            if self._state == STATE_HALF_OPEN or (
+                self._state == STATE_CLOSED and self._consecutive_failures >= self._failure_threshold
+            ):
+                self._state = STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._totals["opened"] += 1
+                opened = True
+            else:
+                opened = False
+        metrics.incr(f"breaker.{self.name}.failures")
+        if opened:
+            metrics.incr(f"breaker.{self.name}.opened")
+            logger.warning("Circuit breaker terbuka", breaker=self.name, error=self._last_error)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            status = {
+                "state": state,
+                "consecutive_failures": self._consecutive_failures,
+                "last_error": self._last_error,
+                **self._totals,
+            }
+            if state == STATE_OPEN:
+                status["retry_after_s"] = round(self._reset_timeout_s - (time.monotonic() - self._opened_at), 1)
+            return status
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, is_failure: Optional[Callable[[BaseException], bool]] = None) -> CircuitBreaker:
+    """Breaker bernama (dibuat saat pertama dipakai); `is_failure` dari pemanggilan pertama yang dipakai."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT_S, BREAKER_HALF_OPEN_MAX, is_failure
+                )
+                _breakers[name] = breaker
+    return breaker
+
+
+def ensure_available(name: str):
+    """
+    CircuitOpenError jika breaker `name` sedang terbuka, tanpa memakai slot percobaan half-open. Untuk gagal cepat
+    sebelum stage mahal (LLM) yang hasilnya tetap tidak bisa dipakai tanpa dependensi itu.
+    """
+    breaker = _breakers.get(name)
+    if breaker is not None and not breaker.is_available():
+        metrics.incr(f"breaker.{name}.rejected")
+        raise CircuitOpenError(name, breaker.status().get("retry_after_s", 0.0))
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    for candidate in (getattr(error, "status_code", None), getattr(error, "code", None),
+                      getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(candidate, int):
+            return candidate
+    return None
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """Error 4xx (model tidak dikenal, request tidak valid) hanya menyangkut model itu, bukan provider-nya."""
+    status = _status_code(error)
+    return not (status is not None and 400 <= status < 500 and status not in (408, 429))
+
+
+def llm_breakers(provider: str, model: str) -> List[CircuitBreaker]:
+    """Breaker provider (mis. openrouter, gemini) dan breaker model."""
+    return [get_breaker(f"llm.{provider}", is_provider_failure), get_breaker(f"llm.{provider}.{model}")]
+
+
+def guarded_call(
+    breakers: List[CircuitBreaker],
+    stage: str,
+    fn: Callable[[], T],
+    request_bound: bool = True,
+) -> T:
+    """
+    Panggilan lewat breaker + deadline stage. Timeout karena sisa deadline request (sudah habis, atau lebih pendek
+    dari deadline stage) tidak memengaruhi breaker; error yang tidak dihitung breaker (lihat CircuitBreaker.is_failure)
+    diteruskan sebagai respons sehat.
+    """
+    if not RESILIENCE_ENABLED:
+        return fn()
+    timeout, budget_bound = stage_timeout(stage, request_bound)
+    acquired = []
+    try:
+        for breaker in breakers:
+            breaker.acquire()
+            acquired.append(breaker)
+    except CircuitOpenError:
+        # Breaker lain sudah memberi izin (mungkin slot percobaan half-open): kembalikan
+        for breaker in acquired:
+            breaker.release_trial()
+        raise
+    try:
+        result = _run_with_timeout(stage, fn, timeout)
+    except BaseException as e:
+        for breaker in breakers:
+            if isinstance(e, DeadlineExceeded) and budget_bound:
+                # Yang habis sisa deadline request (mis. antre admission), bukan deadline stage: bukan kesalahan dependency
+                breaker.release_trial()
+            elif isinstance(e, DeadlineExceeded) or breaker.is_failure(e):
+                breaker.record_failure(e)
+            else:
+                breaker.record_success()
+        raise
+    for breaker in breakers:
+        breaker.record_success()
+    return result
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.status() for breaker in sorted(breakers, key=lambda b: b.name)}
+
+
+def reset_breakers():
+    """Menghapus semua breaker (state kembali closed saat dipakai lagi); dipakai script fault injection."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def deadline_settings() -> Dict[str, float]:
+    stages = {stage: get_stage_deadline_ms(stage) for stage in DEFAULT_STAGE_DEADLINES_MS}
+    return {"request_ms": REQUEST_DEADLINE_MS, **{f"{stage}_ms": value for stage, value in stages.items()}}
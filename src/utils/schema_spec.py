@@ -0,0 +1,49 @@
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+# Sumber metadata skema yang sama dengan yang di-ingest ke vector DB
+SCHEMA_YAML_PATH = os.getenv(
+    "SCHEMA_YAML_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "..", "data", "schema_description.yml"),
+)
+
+
+@lru_cache(maxsize=1)
+def load_schema_spec() -> Dict[str, Any]:
+    """Membaca bagian `spec` dari schema_description.yml (di-cache per proses)."""
+    with open(SCHEMA_YAML_PATH, "r", encoding="utf-8") as f:
+        return (yaml.safe_load(f) or {}).get("spec", {})
+
+
+def get_table_names() -> List[str]:
+    return list(load_schema_spec().keys())
+
+
+def get_columns(table: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Definisi kolom satu tabel, atau semua tabel jika `table` None."""
+    spec = load_schema_spec()
+    tables = [table] if table else list(spec.keys())
+    columns = []
+    for name in tables:
+        columns.extend(spec.get(name, {}).get("columns", []))
+    return columns
+
+
+def get_column_names(table: Optional[str] = None) -> List[str]:
+    return [column["name"] for column in get_columns(table) if column.get("name")]
+
+
+def get_common_questions(table: Optional[str] = None) -> List[Dict[str, str]]:
+    spec = load_schema_spec()
+    tables = [table] if table else list(spec.keys())
+    questions = []
+    for name in tables:
+        questions.extend(spec.get(name, {}).get("common_questions", []))
+    return questions
+
+
+def get_column_synonyms(table: Optional[str] = None) -> Dict[str, List[str]]:
+    return {column["name"]: list(column.get("synonyms", [])) for column in get_columns(table) if column.get("name")}
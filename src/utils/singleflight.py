@@ -0,0 +1,51 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from src.utils import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Menggabungkan eksekusi yang identik dan sedang berjalan bersamaan.
+    Pemanggil pertama (leader) menjalankan fungsi, pemanggil lain dengan key yang sama
+    menunggu dan memakai hasil yang sama. Setelah selesai, key dilepas (bukan cache).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Jalankan `fn` untuk `key`; kembalikan (hasil, shared) dengan shared=True bagi follower."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.incr(f"singleflight.{self.name}.shared")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        metrics.incr(f"singleflight.{self.name}.executed")
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
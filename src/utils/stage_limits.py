@@ -0,0 +1,33 @@
+import threading
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class StageLimits:
+    """Batas paralelisme per stage pipeline (router, sql, execute, analysis) untuk satu batch job."""
+
+    def __init__(self, limits: Dict[str, int]):
+        self._semaphores = {stage: threading.BoundedSemaphore(n) for stage, n in limits.items() if n > 0}
+
+    def gate(self, stage: str):
+        semaphore = self._semaphores.get(stage)
+        return semaphore if semaphore is not None else nullcontext()
+
+
+_current_limits: ContextVar[Optional[StageLimits]] = ContextVar("stage_limits", default=None)
+
+
+def stage_gate(stage: str):
+    """Context manager pembatas stage aktif; tanpa batas di luar batch job."""
+    limits = _current_limits.get()
+    return limits.gate(stage) if limits is not None else nullcontext()
+
+
+@contextmanager
+def use_stage_limits(limits: StageLimits):
+    token = _current_limits.set(limits)
+    try:
+        yield
+    finally:
+        _current_limits.reset(token)
@@ -1,6 +1,10 @@
 import os
 from typing import Dict, Any
 
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.utils.tracing import set_attributes
+
 try:
     import google.generativeai as genai  # type: ignore
     genai.configure(api_key=os.getenv("GEMINI_API_KEY"))  # type: ignore
@@ -33,4 +37,20 @@ def merge_usage(existing: Dict[str, Any], add: Dict[str, Any]) -> Dict[str, Any]
     merged = {**existing}
     for k, v in add.items():
         merged[k] = merged.get(k, 0) + v
-    return merged
\ No newline at end of file
+    return merged
+
+
+class SpanTokenUsageCallback(BaseCallbackHandler):
+    """Mencatat token usage dari response LLM OpenAI-compatible (OpenRouter) ke span aktif."""
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            set_attributes(**{
+                "llm.input_tokens": usage.get("prompt_tokens"),
+                "llm.output_tokens": usage.get("completion_tokens"),
+                "llm.total_tokens": usage.get("total_tokens"),
+            })
+
+
+SPAN_TOKEN_USAGE_CALLBACK = SpanTokenUsageCallback()
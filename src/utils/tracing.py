@@ -0,0 +1,313 @@
+import atexit
+import functools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+from src.utils import metrics
+
+load_dotenv()
+
+# Tracing per request (span per stage pipeline) dan log JSON terstruktur dengan trace id.
+# Span dan log hanya dimasukkan ke antrean terbatas (put_nowait); serialisasi dan I/O dilakukan thread exporter,
+# sehingga logging tidak pernah menambah latensi request. Jika antrean penuh, item dibuang (metrik tracing.dropped).
+# Span diekspor dalam format OTLP/JSON (ExportTraceServiceRequest) per baris ke TRACE_EXPORT_PATH (opt-in; file
+# dirotasi sekali setelah TRACE_EXPORT_MAX_BYTES), dan/atau dikirim ke collector OTLP/HTTP di TRACE_OTLP_ENDPOINT
+# (mis. http://localhost:4318/v1/traces).
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "nl-to-sql-service")
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_EXPORT_MAX_BYTES = int(os.getenv("TRACE_EXPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
+TRACE_QUEUE_MAX = int(os.getenv("TRACE_QUEUE_MAX", "10000"))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "256"))
+TRACE_FLUSH_INTERVAL_S = float(os.getenv("TRACE_FLUSH_INTERVAL_S", "1"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").lower()
+# Batas panjang atribut/field string (mis. SQL, pertanyaan)
+TRACE_MAX_ATTRIBUTE_CHARS = int(os.getenv("TRACE_MAX_ATTRIBUTE_CHARS", "2000"))
+
+_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+_MIN_LEVEL = _LEVELS.get(LOG_LEVEL, 20)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+
+T = TypeVar("T")
+
+
+def _random_id(n_bytes: int) -> str:
+    return os.urandom(n_bytes).hex()
+
+
+def _clip(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > TRACE_MAX_ATTRIBUTE_CHARS:
+        return value[:TRACE_MAX_ATTRIBUTE_CHARS] + "…"
+    return value
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: int, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = _random_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = {k: _clip(v) for k, v in attributes.items() if v is not None}
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> "Span":
+        for key, value in attributes.items():
+            if value is not None:
+                self.attributes[key] = _clip(value)
+        return self
+
+    def set_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+# ======================================================================
+# ========== EXPORTER (THREAD LATAR BELAKANG) ==========
+# ======================================================================
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    payload = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        payload["parentSpanId"] = span.parent_id
+    return payload
+
+
+def _otlp_request(spans: List[Span]) -> Dict[str, Any]:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [
+            {"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}},
+            {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+        ]},
+        "scopeSpans": [{"scope": {"name": "src.utils.tracing"}, "spans": [_otlp_span(s) for s in spans]}],
+    }]}
+
+
+class _Exporter:
+    """Antrean terbatas + satu thread yang menulis log ke stdout dan span ke file/collector OTLP."""
+
+    def __init__(self):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=TRACE_QUEUE_MAX)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._http = None
+
+    def submit(self, item):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            metrics.incr("tracing.dropped")
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _drain(self, timeout: float) -> List[Any]:
+        items = []
+        try:
+            items.append(self._queue.get(timeout=timeout))
+            while len(items) < TRACE_BATCH_SIZE:
+                items.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return items
+
+    def _run(self):
+        while True:
+            self._export(self._drain(TRACE_FLUSH_INTERVAL_S))
+
+    def flush(self, timeout: float = 2.0):
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            self._export(self._drain(0))
+
+    def _export(self, items: List[Any]):
+        if not items:
+            return
+        spans = [item for item in items if isinstance(item, Span)]
+        lines = [json.dumps(item, ensure_ascii=False, default=str) for item in items if isinstance(item, dict)]
+        try:
+            if lines:
+                sys.stdout.write("\n".join(lines) + "\n")
+                sys.stdout.flush()
+            if spans:
+                self._export_spans(spans)
+        except Exception as e:
+            metrics.incr("tracing.export_errors")
+            sys.stderr.write(f"❌ Gagal mengekspor trace/log: {e}\n")
+
+    def _export_spans(self, spans: List[Span]):
+        payload = _otlp_request(spans)
+        if TRACE_EXPORT_PATH:
+            path = os.path.abspath(TRACE_EXPORT_PATH)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) > TRACE_EXPORT_MAX_BYTES:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(payload, ensure_ascii=False, default=str) + "\n")
+        if TRACE_OTLP_ENDPOINT:
+            if self._http is None:
+                import httpx
+                self._http = httpx.Client(timeout=5)
+            self._http.post(TRACE_OTLP_ENDPOINT, json=payload).raise_for_status()
+        metrics.incr("tracing.spans_exported", len(spans))
+
+
+_exporter = _Exporter()
+atexit.register(_exporter.flush)
+
+
+# ======================================================================
+# ========== API SPAN ==========
+# ======================================================================
+def _end(span: Span, token):
+    span.end_ns = time.time_ns()
+    _current_span.reset(token)
+    _exporter.submit(span)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Span anak dari span aktif (atau root trace baru). Yield None jika tracing nonaktif."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(name, parent.trace_id if parent else _random_id(16), parent.span_id if parent else None,
+                   SPAN_KIND_INTERNAL, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(e)
+        raise
+    finally:
+        _end(current, token)
+
+
+def traced(name: str, **attributes: Any):
+    """Decorator: seluruh pemanggilan fungsi menjadi satu span."""
+    def decorator(fn: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_attributes(**attributes: Any):
+    """Menambahkan atribut ke span aktif (no-op jika tidak ada)."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
+
+
+def parse_traceparent(header: str):
+    """W3C traceparent `00-<trace_id>-<span_id>-<flags>` -> (trace_id, parent_span_id) atau (None, None)."""
+    parts = header.strip().split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16 and parts[1] != "0" * 32:
+        return parts[1].lower(), parts[2].lower()
+    return None, None
+
+
+def start_server_span(name: str, traceparent: str = "", **attributes: Any):
+    """Root span request (dipakai middleware); kembalikan (span, token reset) atau (None, None)."""
+    if not TRACING_ENABLED:
+        return None, None
+    trace_id, parent_id = parse_traceparent(traceparent) if traceparent else (None, None)
+    current = Span(name, trace_id or _random_id(16), parent_id, SPAN_KIND_SERVER, attributes)
+    return current, _current_span.set(current)
+
+
+def end_server_span(current: Optional[Span], token):
+    if current is not None:
+        _end(current, token)
+
+
+def bind_context(call: Callable[..., T]) -> Callable[..., T]:
+    """Menjalankan callable di thread lain dengan contextvars saat ini (span aktif ikut terbawa)."""
+    return functools.partial(copy_context().run, call)
+
+
+# ======================================================================
+# ========== LOG JSON TERSTRUKTUR ==========
+# ======================================================================
+class Logger:
+    """Log JSON satu baris dengan trace_id/span_id; formatting dan penulisan dilakukan thread exporter."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _log(self, level: str, message: str, fields: Dict[str, Any]):
+        if _LEVELS[level] < _MIN_LEVEL:
+            return
+        # Field pemanggil lebih dulu: key baku (ts, level, message, trace_id, ...) tidak bisa tertimpa
+        record = {k: _clip(v) for k, v in fields.items()} if fields else {}
+        record.update({"ts": time.time(), "level": level, "logger": self.name, "message": message})
+        current = _current_span.get()
+        if current is not None:
+            record["trace_id"] = current.trace_id
+            record["span_id"] = current.span_id
+        _exporter.submit(record)
+
+    def debug(self, message: str, **fields: Any):
+        self._log("debug", message, fields)
+
+    def info(self, message: str, **fields: Any):
+        self._log("info", message, fields)
+
+    def warning(self, message: str, **fields: Any):
+        self._log("warning", message, fields)
+
+    def error(self, message: str, **fields: Any):
+        self._log("error", message, fields)
+
+
+def get_logger(name: str) -> Logger:
+    return Logger(name)
@@ -1,5 +1,7 @@
 """Validation package for SQL and request validators."""
 
 from .query_validator import is_safe_select_query, sanitize_sql_output
+from .schema_validator import is_schema_valid_query
+from .literal_repair import repair_sql_literals
 
-__all__ = ["is_safe_select_query", "sanitize_sql_output"]
+__all__ = ["is_safe_select_query", "sanitize_sql_output", "is_schema_valid_query", "repair_sql_literals"]
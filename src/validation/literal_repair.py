@@ -0,0 +1,127 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import sqlparse
+from dotenv import load_dotenv
+from sqlparse.tokens import Comment, Keyword, Name, Newline, Operator, Punctuation, String, Whitespace
+
+from src.search.entity_index import EntityValueIndex, fold, get_entity_index
+from src.utils import metrics
+from src.utils.tracing import get_logger, set_attributes, traced
+
+load_dotenv()
+
+logger = get_logger("literal_repair")
+
+# Literal string pada filter kolom kategorikal (`Nama_Unit = '...'`, `Program_Strategis IN ('...', ...)`) yang tidak
+# sama persis dengan nilai di drauk_unit diganti nilai kanonik terdekat dari index trigram, supaya query tidak
+# mengembalikan hasil kosong hanya karena salah ketik / beda kapitalisasi. Hanya diganti jika skor >= threshold
+# dan jelas lebih baik dari kandidat kedua; pola LIKE tidak disentuh.
+ENTITY_REPAIR_ENABLED = os.getenv("ENTITY_REPAIR_ENABLED", "true").lower() == "true"
+ENTITY_REPAIR_THRESHOLD = float(os.getenv("ENTITY_REPAIR_THRESHOLD", "0.6"))
+ENTITY_REPAIR_MARGIN = float(os.getenv("ENTITY_REPAIR_MARGIN", "0.1"))
+# Kandidat yang hanya menambah kata utuh ke literal ('Peningkatan Mutu' -> 'Peningkatan Mutu Pendidikan') bukan salah
+# ketik: pengguna bisa saja memang memfilter nilai yang lebih pendek, jadi butuh skor yang jauh lebih tinggi
+ENTITY_REPAIR_PREFIX_THRESHOLD = float(os.getenv("ENTITY_REPAIR_PREFIX_THRESHOLD", "0.85"))
+
+_EQUALITY = {"=", "<>", "!="}
+_SKIPPED = (Whitespace, Newline, Comment)
+
+
+def _literal_value(token) -> str:
+    return token.value[1:-1].replace("''", "'").replace("\\'", "'")
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def _filtered_column(tokens, position: int) -> Optional[str]:
+    """Nama kolom untuk literal di `tokens[position]` pada pola `kolom = 'x'` atau `kolom [NOT] IN ('x', ...)`."""
+    previous = position - 1
+    if previous >= 1 and tokens[previous].ttype in Operator.Comparison and tokens[previous].value in _EQUALITY:
+        return tokens[previous - 1].value if tokens[previous - 1].ttype in Name else None
+
+    # Mundur melewati literal lain di daftar IN sampai kurung buka
+    while previous >= 0 and (tokens[previous].ttype in String.Single or
+                             (tokens[previous].ttype in Punctuation and tokens[previous].value == ",")):
+        previous -= 1
+    if previous < 2 or tokens[previous].ttype not in Punctuation or tokens[previous].value != "(":
+        return None
+    keyword = tokens[previous - 1]
+    if keyword.ttype not in Keyword or keyword.value.upper() != "IN":
+        return None
+    column = tokens[previous - 2]
+    if column.ttype in Keyword and column.value.upper() == "NOT" and previous >= 3:
+        column = tokens[previous - 3]
+    return column.value if column.ttype in Name else None
+
+
+def _extends_literal(value: str, literal: str) -> bool:
+    """True jika `value` sama dengan `literal` ditambah kata utuh di depan/belakang (bukan perbaikan salah ketik)."""
+    folded, padded = fold(literal), f" {fold(value)} "
+    return bool(folded) and fold(value) != folded and f" {folded} " in padded
+
+
+def _best_value(index: EntityValueIndex, column: str, literal: str) -> Optional[Tuple[str, float]]:
+    exact = index.exact(column, literal)
+    if exact is not None:
+        return exact, 1.0
+    matches = index.search(literal, column=column, limit=2, threshold=ENTITY_REPAIR_THRESHOLD)
+    if not matches:
+        return None
+    if len(matches) > 1 and matches[0].score - matches[1].score < ENTITY_REPAIR_MARGIN:
+        metrics.incr("literal_repair.ambiguous")
+        return None
+    best = matches[0]
+    if best.score < ENTITY_REPAIR_PREFIX_THRESHOLD and _extends_literal(best.value, literal):
+        metrics.incr("literal_repair.prefix_skipped")
+        return None
+    return best.value, best.score
+
+
+@traced("validate", **{"validate.check": "literal_repair"})
+def repair_sql_literals(query: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    (SQL dengan literal kategorikal diganti nilai kanonik, daftar perbaikan {column, original, repaired, score}).
+    SQL dikembalikan apa adanya jika tidak ada yang perlu/bisa diperbaiki.
+    """
+    if not ENTITY_REPAIR_ENABLED:
+        return query, []
+    try:
+        index = get_entity_index()
+        if not len(index):
+            return query, []
+        flat = [token for statement in sqlparse.parse(query) for token in statement.flatten()]
+    except Exception as e:
+        logger.warning("Perbaikan literal SQL dilewati", error=str(e))
+        return query, []
+
+    significant = [i for i, token in enumerate(flat) if token.ttype not in _SKIPPED]
+    tokens = [flat[i] for i in significant]
+    replacements: Dict[int, str] = {}
+    repairs: List[Dict[str, Any]] = []
+    for position, token in enumerate(tokens):
+        if token.ttype not in String.Single:
+            continue
+        name = _filtered_column(tokens, position)
+        column = index.resolve_column(name) if name else None
+        if column is None:
+            continue
+        literal = _literal_value(token)
+        if index.exact(column, literal) == literal:
+            continue
+        best = _best_value(index, column, literal)
+        if best is None:
+            metrics.incr("literal_repair.unmatched")
+            continue
+        value, score = best
+        replacements[significant[position]] = _quote(value)
+        repairs.append({"column": column, "original": literal, "repaired": value, "score": round(score, 3)})
+
+    if not repairs:
+        return query, []
+    metrics.incr("literal_repair.repaired", len(repairs))
+    set_attributes(**{"validate.literal_repairs": len(repairs)})
+    logger.info("Literal SQL diperbaiki", repairs=repairs)
+    return "".join(replacements.get(i, token.value) for i, token in enumerate(flat)), repairs
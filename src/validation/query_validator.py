@@ -3,6 +3,10 @@ from sqlparse.sql import IdentifierList, Identifier
 from sqlparse.tokens import Keyword, DML
 import re
 
+from src.utils.tracing import get_logger, set_attributes, traced
+
+logger = get_logger("query_validator")
+
 # --- DAFTAR HITAM (BLACKLIST) ---
 BLACKLISTED_FUNCTIONS = {
     'SLEEP',
@@ -30,6 +34,7 @@ def sanitize_sql_output(sql_string: str) -> str:
         return match.group(1).strip()
     return sql_string.strip()
 
+@traced("validate", **{"validate.check": "safety"})
 def is_safe_select_query(query: str) -> bool:
     """
     Memvalidasi sebuah string query SQL untuk memastikan itu adalah
@@ -40,18 +45,18 @@ def is_safe_select_query(query: str) -> bool:
         return False
 
     if len(parsed) > 1:
-        print("Validasi Gagal: Terdeteksi lebih dari satu statement SQL.")
+        _reject("Terdeteksi lebih dari satu statement SQL.")
         return False
         
     statement = parsed[0]
     
     if statement.get_type() != 'SELECT':
-        print(f"Validasi Gagal: Tipe statement bukan SELECT, melainkan {statement.get_type()}.")
+        _reject(f"Tipe statement bukan SELECT, melainkan {statement.get_type()}.")
         return False
         
     for token in statement.flatten():
         if token.ttype is Keyword and token.normalized in BLACKLISTED_KEYWORDS:
-            print(f"Validasi Gagal: Terdeteksi kata kunci berbahaya '{token.normalized}'.")
+            _reject(f"Terdeteksi kata kunci berbahaya '{token.normalized}'.")
             return False
 
         if isinstance(token, Identifier):
@@ -59,8 +64,13 @@ def is_safe_select_query(query: str) -> bool:
             if is_function_call:
                 function_name = token.get_name()
                 if function_name and function_name.upper() in BLACKLISTED_FUNCTIONS:
-                    print(f"Validasi Gagal: Terdeteksi pemanggilan fungsi berbahaya '{function_name.upper()}'.")
+                    _reject(f"Terdeteksi pemanggilan fungsi berbahaya '{function_name.upper()}'.")
                     return False
     
-    print("Validasi query SELECT berhasil.")
+    set_attributes(**{"validate.valid": True})
     return True
+
+
+def _reject(reason: str):
+    set_attributes(**{"validate.valid": False, "validate.reason": reason})
+    logger.warning("Validasi query gagal", reason=reason)
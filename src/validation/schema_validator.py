@@ -0,0 +1,83 @@
+import re
+from typing import Optional, Set
+
+import sqlparse
+from sqlparse.tokens import Name, Punctuation, Whitespace, Newline
+
+from src.utils.schema_spec import get_column_names, get_table_names
+from src.utils.tracing import get_logger, set_attributes, traced
+
+logger = get_logger("schema_validator")
+
+_COLUMN_ALIAS = re.compile(r"\bAS\s+[`\"]?(\w+)[`\"]?", re.IGNORECASE)
+_TABLE_REF = re.compile(
+    r"\b(?:FROM|JOIN)\s+[`\"]?(\w+)[`\"]?(?:\s+(?:AS\s+)?[`\"]?(\w+)[`\"]?)?",
+    re.IGNORECASE,
+)
+_NOT_ALIAS = {
+    "WHERE", "GROUP", "ORDER", "LIMIT", "HAVING", "JOIN", "INNER", "LEFT", "RIGHT",
+    "CROSS", "ON", "UNION", "AS", "USING", "NATURAL", "OUTER", "WINDOW",
+}
+
+
+def _strip(name: str) -> str:
+    return name.strip("`\"").lower()
+
+
+def extract_identifiers(query: str) -> Set[str]:
+    """Nama (kolom/tabel/alias) yang dirujuk query, tanpa nama fungsi, huruf kecil."""
+    names = set()
+    for statement in sqlparse.parse(query):
+        tokens = [t for t in statement.flatten() if t.ttype not in (Whitespace, Newline)]
+        for index, token in enumerate(tokens):
+            if token.ttype not in Name:
+                continue
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            if following is not None and following.ttype in Punctuation and following.value == "(":
+                continue  # pemanggilan fungsi, mis. SUM(
+            names.add(_strip(token.value))
+    return names
+
+
+def extract_tables(query: str) -> Set[str]:
+    return {_strip(match.group(1)) for match in _TABLE_REF.finditer(query)}
+
+
+def find_unknown_identifiers(query: str, known_columns: Optional[Set[str]] = None) -> Set[str]:
+    """Identifier yang bukan kolom/tabel di skema YAML dan bukan alias yang didefinisikan query."""
+    known_tables = {t.lower() for t in get_table_names()}
+    if known_columns is None:
+        known_columns = {c.lower() for c in get_column_names()}
+
+    aliases = {_strip(m.group(1)) for m in _COLUMN_ALIAS.finditer(query)}
+    for match in _TABLE_REF.finditer(query):
+        alias = match.group(2)
+        if alias and alias.upper() not in _NOT_ALIAS:
+            aliases.add(_strip(alias))
+
+    return extract_identifiers(query) - known_columns - known_tables - aliases
+
+
+@traced("validate", **{"validate.check": "schema"})
+def is_schema_valid_query(query: str) -> bool:
+    """
+    Memvalidasi query terhadap skema di schema_description.yml:
+    semua tabel harus dikenal dan semua kolom harus ada di whitelist.
+    """
+    known_tables = {t.lower() for t in get_table_names()}
+    unknown_tables = extract_tables(query) - known_tables
+    if unknown_tables:
+        _reject(f"tabel tidak dikenal {sorted(unknown_tables)}")
+        return False
+
+    unknown = find_unknown_identifiers(query)
+    if unknown:
+        _reject(f"kolom tidak dikenal {sorted(unknown)}")
+        return False
+    set_attributes(**{"validate.valid": True})
+    return True
+
+
+def _reject(reason: str):
+    set_attributes(**{"validate.valid": False, "validate.reason": reason})
+    logger.warning("Validasi skema gagal", reason=reason)